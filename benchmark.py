@@ -0,0 +1,296 @@
+"""
+Throughput benchmark: drives the full main.run pipeline against mock_cloudflare.py and mock_mongo.py.
+
+    python benchmark.py                                   # 1k / 10k / 100k zones, dry run
+    python benchmark.py --sizes 1000 --apply --latency 0.05 --jitter 0.05 --throttle-rate 0.01
+    python benchmark.py --policy 200000                   # dns_logic micro-benchmark only
+
+Each size runs against a fresh mock server process and in a fresh pipeline process (so peak RSS
+belongs to that run alone), then zones/sec, p50/p99 request latency and peak RSS are printed.
+MAX_WORKERS / MAX_IN_FLIGHT / RATE_LIMIT_* from the environment are passed through, so the same
+command can be used to compare tuning settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_for_port(port, proc, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("mock server exited during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"mock server did not start on port {port}")
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# --- policy micro-benchmark ----------------------------------------------------------------
+
+def _reference_spf(raw_spf):
+    """dns_logic.generate_updated_spf before precompiled patterns / memoization (output reference)."""
+    if not raw_spf or str(raw_spf).strip().lower() == "missing":
+        return "v=spf1 a mx ~all"
+    return re.sub(r'-all|\?all', '~all', raw_spf.strip())
+
+def _reference_dmarc(raw_dmarc, domain):
+    """dns_logic.generate_updated_dmarc before precompiled patterns / memoization (output reference)."""
+    def ensure_mailto(val):
+        parts = [p.strip() for p in val.split(',') if p.strip()]
+        return ", ".join(p if p.lower().startswith('mailto:') else f"mailto:{p}" for p in parts)
+
+    def has_syntax_error(record):
+        for pattern in (r'rua=([^;]+)', r'ruf=([^;]+)'):
+            m = re.search(pattern, record, re.IGNORECASE)
+            if m and any(not p.lower().startswith('mailto:') for p in (p.strip() for p in m.group(1).split(',')) if p):
+                return True
+        return False
+
+    if not raw_dmarc or str(raw_dmarc).strip().lower() == "missing":
+        raw_dmarc = None
+    if raw_dmarc:
+        is_already_strict = 'p=reject' in raw_dmarc or ('p=quarantine' in raw_dmarc and 'pct=100' in raw_dmarc)
+        if is_already_strict and 'p=none' not in raw_dmarc and not has_syntax_error(raw_dmarc):
+            return raw_dmarc
+    rua = f"mailto:dmarc-reports@{domain}"
+    ruf_str = ""
+    if raw_dmarc:
+        m_rua = re.search(r'rua=([^;]+)', raw_dmarc, re.IGNORECASE)
+        if m_rua:
+            rua = ensure_mailto(m_rua.group(1))
+        m_ruf = re.search(r'ruf=([^;]+)', raw_dmarc, re.IGNORECASE)
+        if m_ruf:
+            ruf_str = f" ruf={ensure_mailto(m_ruf.group(1))};"
+    return f"v=DMARC1; p=reject; sp=reject; pct=100; rua={rua};{ruf_str} adkim=r; aspf=r;"
+
+def _policy_corpus(zones, unique_share=0.2, seed=0):
+    """(raw_spf, raw_dmarc, domain) per zone: mostly shared values, `unique_share` with a zone-specific rua."""
+    from mock_cloudflare import SPF_VARIANTS, DMARC_VARIANTS
+    rnd = random.Random(seed)
+    spfs = [v for v in SPF_VARIANTS if isinstance(v, str)] + ["Missing", "v=spf1 include:spf.protection.outlook.com -all"]
+    dmarcs = [v or "Missing" for v in DMARC_VARIANTS] + ["v=DMARC1; p=none; rua=a@x.net, mailto:b@x.net; ruf=c@x.net"]
+    corpus = []
+    for i in range(zones):
+        domain = f"zone-{i:07d}.example"
+        dmarc = rnd.choice(dmarcs)
+        if rnd.random() < unique_share:
+            dmarc = f"v=DMARC1; p=none; rua=reports+{i}@{domain}"
+        corpus.append((rnd.choice(spfs), dmarc, domain))
+    return corpus
+
+def run_policy_benchmark(zones):
+    """Reference vs current dns_logic on one corpus; fails loudly if any output differs."""
+    sys.path.insert(0, HERE)
+    import dns_logic
+    corpus = _policy_corpus(zones)
+
+    def timed(fn):
+        started = time.perf_counter()
+        out = fn()
+        return out, time.perf_counter() - started
+
+    reference, ref_s = timed(lambda: [(_reference_spf(s), _reference_dmarc(d, dom)) for s, d, dom in corpus])
+    dns_logic.generate_updated_spf.cache_clear()
+    dns_logic._dmarc_plan.cache_clear()
+    cold, cold_s = timed(lambda: dns_logic.evaluate_records(corpus))
+    warm, warm_s = timed(lambda: dns_logic.evaluate_records(corpus))
+    if cold != reference or warm != reference:
+        mismatch = next(i for i, (a, b) in enumerate(zip(reference, cold)) if a != b)
+        raise SystemExit(f"❌ Output differs from the reference for {corpus[mismatch]}")
+
+    print(f"{'policy evaluation':<22} {'secs':>8} {'zones/s':>12} {'speedup':>8}")
+    for label, secs in (("reference", ref_s), ("cached (cold)", cold_s), ("cached (warm)", warm_s)):
+        print(f"{label:<22} {secs:>8.3f} {zones / secs:>12,.0f} {ref_s / secs:>7.1f}x")
+    print(f"✅ {zones} zones byte-identical to the reference; {dns_logic.policy_cache_info()}")
+
+def check_user_mapping(report_csv, mongo):
+    """Fail the run when the Mongo user-mapping path was not exercised or reported errors."""
+    import csv
+    if not mongo.collection.queries:
+        raise SystemExit("❌ User mapping never queried the Mongo stub")
+    with open(report_csv, encoding="utf-8", newline="") as f:
+        errors = sum(1 for row in csv.DictReader(f) if row.get("mapped user") == "Error")
+    if errors:
+        raise SystemExit(f"❌ User mapping failed for {errors} zones")
+
+def run_worker(args):
+    """Child process: one full pipeline run with request timing; writes a JSON result file."""
+    import aiohttp
+    import main
+    from config import config
+    from cloudflare_client import CloudflareClient
+    from mock_mongo import MockMongoClient, synthetic_docs
+
+    latencies = []
+
+    async def on_request_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        latencies.append(time.perf_counter() - ctx.started)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+
+    cli = ["--full", "--report-name", os.path.join(args.workdir, "report.xlsx")]
+    if args.apply:
+        cli.append("--apply")
+    pipeline_args = main.build_parser().parse_args(cli)
+
+    cf_client = CloudflareClient(config.CLOUDFLARE_API_TOKEN, trace_configs=[trace])
+    mongo = MockMongoClient(synthetic_docs(args.zones))
+
+    started = time.perf_counter()
+    handled = asyncio.run(main.run(pipeline_args, cf_client, mongo))
+    elapsed = time.perf_counter() - started
+    check_user_mapping(os.path.join(args.workdir, "report.csv"), mongo)
+
+    latencies.sort()
+    result = {
+        "zones": args.zones,
+        "handled": handled or 0,
+        "elapsed_s": round(elapsed, 2),
+        "zones_per_s": round((handled or 0) / elapsed, 1) if elapsed else 0.0,
+        "requests": len(latencies),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": _peak_rss_mb(),
+        "limiter": cf_client.limiter.stats(),
+    }
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+def run_size(zones, args):
+    port = _free_port()
+    mock_cmd = [
+        sys.executable, os.path.join(HERE, "mock_cloudflare.py"), "--zones", str(zones), "--port", str(port),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+        "--throttle-rate", str(args.throttle_rate), "--consistency-delay", str(args.consistency_delay),
+    ]
+    if args.rate_limit:
+        mock_cmd += ["--rate-limit", str(args.rate_limit), "--rate-window", str(args.rate_window)]
+
+    with tempfile.TemporaryDirectory(prefix="cf-bench-") as workdir:
+        mock = subprocess.Popen(mock_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_for_port(port, mock)
+            env = dict(os.environ)
+            env.update({
+                "CLOUDFLARE_API_BASE_URL": f"http://127.0.0.1:{port}/client/v4",
+                "CLOUDFLARE_API_TOKEN": "benchmark",
+                "SPF_ANALYSIS": "true",
+                "SPF_RESOLVER_URL": f"http://127.0.0.1:{port}/dns-query",
+                "STATE_DB_PATH": os.path.join(workdir, "state.db"),
+                "TRACKING_CSV_PATH": os.path.join(workdir, "processed_domains.csv"),
+                "REPORTS_DIR": workdir,
+                "LOG_FILE_PATH": os.path.join(workdir, "automation.log"),
+            })
+            # Unless a budget is being emulated, don't let the client-side limiter be the bottleneck
+            env.setdefault("RATE_LIMIT_REQUESTS", str(args.rate_limit or 10 ** 9))
+            env.setdefault("RATE_LIMIT_WINDOW", str(args.rate_window if args.rate_limit else 1))
+            env.setdefault("RATE_LIMIT_BURST", "1000")
+
+            result_file = os.path.join(workdir, "result.json")
+            worker_cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--zones", str(zones),
+                          "--workdir", workdir, "--result-file", result_file]
+            if args.apply:
+                worker_cmd.append("--apply")
+            with open(os.path.join(workdir, "stdout.log"), "w", encoding="utf-8") as out:
+                code = subprocess.call(worker_cmd, env=env, cwd=workdir, stdout=out, stderr=subprocess.STDOUT)
+            if code != 0 or not os.path.exists(result_file):
+                with open(os.path.join(workdir, "stdout.log"), encoding="utf-8") as out:
+                    tail = out.read()[-2000:]
+                raise RuntimeError(f"pipeline run for {zones} zones failed (exit {code}):\n{tail}")
+            with open(result_file, encoding="utf-8") as f:
+                result = json.load(f)
+
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/__mock__/stats", timeout=10) as resp:
+                result["mock"] = json.load(resp)
+            return result
+        finally:
+            mock.terminate()
+            mock.wait()
+
+def print_table(results):
+    header = f"{'zones':>8} {'handled':>8} {'secs':>8} {'zones/s':>9} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak MB':>8} {'429s':>6} {'5xx':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        mock = r.get("mock", {})
+        rss = f"{r['peak_rss_mb']:.0f}" if r.get("peak_rss_mb") is not None else "n/a"
+        throttled = mock.get("429_injected", 0) + mock.get("429_budget", 0)
+        print(f"{r['zones']:>8} {r['handled']:>8} {r['elapsed_s']:>8} {r['zones_per_s']:>9} {r['requests']:>9} "
+              f"{r['p50_ms']:>8} {r['p99_ms']:>8} {rss:>8} {throttled:>6} {mock.get('5xx_injected', 0):>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the automation pipeline against the local mock API")
+    parser.add_argument("--sizes", type=str, default="1000,10000,100000", help="Comma-separated zone counts")
+    parser.add_argument("--apply", action="store_true", help="Benchmark live mode (writes + verification)")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--consistency-delay", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, help="Emulate a per-token budget of N requests per --rate-window")
+    parser.add_argument("--rate-window", type=int, default=300)
+    parser.add_argument("--json", type=str, help="Also write the raw results to this file")
+    parser.add_argument("--policy", type=int, metavar="ZONES", help="Only run the dns_logic micro-benchmark on N synthetic zones")
+    # Internal: the per-size pipeline process
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--zones", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, HERE)
+        run_worker(args)
+        return
+    if args.policy:
+        run_policy_benchmark(args.policy)
+        return
+
+    results = []
+    for zones in (int(z) for z in args.sizes.split(",") if z.strip()):
+        print(f"⏱️ Benchmarking {zones} zones...", flush=True)
+        results.append(run_size(zones, args))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import copy
+import hashlib
+import logging
+import time
+from dns_logic import POLICY_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean "look again next time" - never reuse a row that ended like this
+RETRY_MARKERS = ("Update Failed", "API Error", "Pending Verification", "Verification Failed")
+
+def fingerprint(spf_records, dmarc_records):
+    """Stable hash of the SPF/DMARC content the policy looked at (order-independent)."""
+    parts = sorted(f"spf:{r.name.lower()}:{r.content}" for r in spf_records)
+    parts += sorted(f"dmarc:{r.name.lower()}:{r.content}" for r in dmarc_records)
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def policy_version(**settings):
+    """Hash of dns_logic.POLICY_VERSION and the settings a result was computed under."""
+    parts = [f"policy:{POLICY_VERSION}"] + sorted(f"{k}:{v}" for k, v in settings.items())
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+class ChangeDetector:
+    """
+    Incremental re-runs on top of the state store's zone_scan table.
+    A zone's records are always fetched; if its SPF/DMARC fingerprint matches a scan younger than
+    `max_age` made under the same `policy` (see policy_version), the stored result is reused
+    without evaluating or writing. With `trust_modified_on`, a zone whose `modified_on` matches
+    the last scan is skipped before any API call - opt-in, since the zone's `modified_on` may not
+    move when its DNS records are edited.
+    """
+    def __init__(self, state, dry_run, enabled=True, max_age_hours=168, policy=None, trust_modified_on=False):
+        self.state = state
+        self.dry_run = dry_run
+        self.policy = policy
+        self.enabled = enabled
+        self.trust_modified_on = trust_modified_on
+        self.max_age = max_age_hours * 3600
+        self.reused_unfetched = 0
+        self.reused_unchanged = 0
+
+    def _usable(self, scan):
+        if not self.enabled or scan is None or scan["dry_run"] != self.dry_run:
+            return False
+        if scan["policy_version"] != self.policy:
+            return False
+        if time.time() - scan["scanned_at"] > self.max_age:
+            return False
+        statuses = (scan["result"].get('spf status', ''), scan["result"].get('dmarc status', ''))
+        return not any(marker in s for s in statuses for marker in RETRY_MARKERS)
+
+    def _reuse(self, scan, mapped_user):
+        row = copy.deepcopy(scan["result"])
+        # Mapping comes from Mongo and may have changed independently of DNS
+        row['mapped user'] = mapped_user
+        row['reused'] = True
+        return row
+
+    def before_fetch(self, zone, mapped_user):
+        """With `trust_modified_on`: previous result if the zone is untouched since the last scan, else None."""
+        if not self.enabled or not self.trust_modified_on or not zone.get('modified_on'):
+            return None
+        scan = self.state.get_scan(zone['id'])
+        if self._usable(scan) and scan["zone_modified_on"] == zone['modified_on']:
+            self.reused_unfetched += 1
+            return self._reuse(scan, mapped_user)
+        return None
+
+    def after_fetch(self, zone, fp, mapped_user):
+        """Previous result if the fetched SPF/DMARC content is identical to the last scan, else None."""
+        if not self.enabled:
+            return None
+        scan = self.state.get_scan(zone['id'])
+        if self._usable(scan) and scan["fingerprint"] == fp:
+            self.reused_unchanged += 1
+            # Content is unchanged, so just move the zone's modified_on forward
+            self.state.record_scan(zone['id'], zone['name'], zone.get('modified_on'), fp, self.dry_run, scan["result"],
+                                   self.policy)
+            return self._reuse(scan, mapped_user)
+        return None
+
+    def remember(self, zone_id, domain, zone_modified_on, fp, row):
+        if fp is None or any(marker in row.get(k, '') for k in ('spf status', 'dmarc status') for marker in RETRY_MARKERS):
+            return
+        self.state.record_scan(zone_id, domain, zone_modified_on, fp, self.dry_run, row, self.policy)
+
+    def stats(self):
+        return {"reused_unfetched": self.reused_unfetched, "reused_unchanged": self.reused_unchanged}
@@ -0,0 +1,194 @@
+"""
+Write-ahead change journal and rollback (`--rollback RUN_ID`).
+
+Every live run has a run ID; before a zone's batch write is sent, the journal gets one JSON line
+with the zone, every record touched and its content before and after (fsynced, so a crash
+mid-write still leaves the intent on disk), followed by the outcome once the call returns.
+Rolling a run back replays the inverse of each journaled change, but only where the record
+still holds what the run wrote: anything edited since, or already reverted, is left alone.
+Rollbacks are journaled under their own run ID, so they can be undone the same way.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime
+from config import config
+
+logger = logging.getLogger(__name__)
+
+ROLLBACK_COLUMNS = ['domain', 'record', 'journaled change', 'restored content', 'status', 'zone_id']
+DONE_STATUS = {"update": "Reverted", "delete": "Deleted", "create": "Re-created"}
+DRY_RUN_STATUS = {"update": "Dry Run: Would Revert", "delete": "Dry Run: Would Delete", "create": "Dry Run: Would Re-create"}
+
+def new_run_id():
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}"
+
+def journal_paths(path):
+    """`path` and its per-shard siblings (`journal.shard-i-of-N.jsonl`) that exist."""
+    base, ext = os.path.splitext(path)
+    return [p for p in [path] + sorted(glob.glob(f"{glob.escape(base)}.shard-*{ext}")) if os.path.exists(p)]
+
+def _entries(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue # torn last line of a crashed run
+
+class ChangeJournal:
+    """Append-only JSON-lines journal of one run's writes (opened on the first write)."""
+    def __init__(self, path, run_id):
+        self.path = path
+        self.run_id = run_id
+        self.writes = 0
+        self._file = None
+
+    def _append(self, entry, sync=False):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps({"run": self.run_id, "ts": round(time.time(), 3), **entry}) + "\n")
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def intent(self, zone_id, domain, changes):
+        """
+        Record the changes about to be sent for a zone; must be called before the write. Each change
+        is {"op": "update"|"create"|"delete", "type", "name", "record_id" (not for creates),
+        "before" (not for creates), "after" (not for deletes)}.
+        """
+        self._append({"event": "intent", "zone_id": zone_id, "domain": domain, "changes": changes}, sync=True)
+        self.writes += 1
+
+    def outcome(self, zone_id, applied, created=()):
+        # Not synced: rollback re-reads every record anyway, this only pins down created record ids
+        self._append({"event": "outcome", "zone_id": zone_id, "applied": applied, "created": list(created)})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def read_run(paths, run_id):
+    """{zone_id: {"domain", "changes", "created"}} for every write journaled under `run_id`."""
+    zones = {}
+    for entry in _entries(paths):
+        if entry.get("run") != run_id:
+            continue
+        zone = zones.setdefault(entry["zone_id"], {"domain": entry.get("domain"), "changes": [], "created": []})
+        if entry["event"] == "intent":
+            zone["domain"] = zone["domain"] or entry.get("domain")
+            zone["changes"].extend(entry["changes"])
+        else:
+            zone["created"].extend(entry.get("created") or [])
+    return {zone_id: zone for zone_id, zone in zones.items() if zone["changes"]}
+
+def list_runs(paths):
+    """[(run_id, started, zones written)] for every journaled run, oldest first."""
+    runs = {}
+    for entry in _entries(paths):
+        if entry.get("event") == "intent":
+            started, zones = runs.setdefault(entry["run"], (entry["ts"], set()))
+            zones.add(entry["zone_id"])
+    return [(run_id, started, len(zones)) for run_id, (started, zones) in runs.items()]
+
+def _merge_changes(changes):
+    """One change per record: a record written twice in a run goes back to its first `before`."""
+    merged = {}
+    for change in changes:
+        key = change.get("record_id") or (change["op"], change["name"], change.get("after"))
+        if key in merged and change["op"] == "update":
+            merged[key] = dict(merged[key], after=change["after"])
+        else:
+            merged[key] = change
+    return list(merged.values())
+
+async def _inverse(client, zone_id, change, created):
+    """(inverse change or None, skip status) for one journaled change, from the record as it is now."""
+    if change["op"] == "update":
+        record = await client.get_dns_record(zone_id, change["record_id"])
+        if record is None:
+            return None, "Skipped (Could Not Read Record)"
+        if record.content == change["before"]:
+            return None, "Skipped (Already Reverted)"
+        if record.content != change["after"]:
+            return None, "Skipped (Changed Since)"
+        return {"op": "update", "record_id": record.id, "type": record.type, "name": record.name,
+                "before": change["after"], "after": change["before"]}, None
+
+    content = change["after"] if change["op"] == "create" else change["before"]
+    found = await client.find_dns_records(zone_id, change["type"], change["name"], content)
+    if found is None:
+        return None, "Skipped (Could Not Read Record)"
+    if change["op"] == "delete":
+        if found:
+            return None, "Skipped (Already Re-created)"
+        return {"op": "create", "type": change["type"], "name": change["name"], "after": content}, None
+    # A created record is only removed while it still holds what the run wrote
+    found = [r for r in found if not created or r.id in created]
+    if not found:
+        return None, "Skipped (Not Found)"
+    return {"op": "delete", "record_id": found[0].id, "type": found[0].type, "name": found[0].name, "before": content}, None
+
+def _payload(inverse):
+    patches, deletes, posts = [], [], []
+    for change in inverse:
+        if change["op"] == "update":
+            patches.append({"id": change["record_id"], "content": change["after"], "comment": "Rolled back by Automation"})
+        elif change["op"] == "delete":
+            deletes.append({"id": change["record_id"]})
+        else:
+            posts.append({"type": change["type"], "name": change["name"], "content": change["after"], "ttl": 1,
+                          "comment": "Restored by Automation"})
+    return {"patches": patches, "deletes": deletes, "posts": posts}
+
+async def rollback_zone(client, zone_id, entry, dry_run=True, journal=None):
+    """
+    Undo one zone's journaled changes in a single batch; returns one report row per change.
+    The plan is re-read from the records before every attempt, so a batch that failed (even
+    ambiguously) is simply planned and sent once more.
+    """
+    for attempt in range(2):
+        rows, sent = await _rollback_once(client, zone_id, entry, dry_run, journal)
+        if sent is not False:
+            return rows
+        logger.warning(f"⚠️ Rollback batch for {entry['domain']} failed; re-reading its records to retry")
+        await asyncio.sleep(config.VERIFY_SETTLE_DELAY)
+    logger.error(f"❌ Rollback FAILED for {entry['domain']}")
+    return rows
+
+async def _rollback_once(client, zone_id, entry, dry_run, journal):
+    """(rows, True/False whether the batch went through, or None when there was nothing to send)."""
+    domain = entry["domain"]
+    changes = _merge_changes(entry["changes"])
+    planned = await asyncio.gather(*(_inverse(client, zone_id, c, set(entry["created"])) for c in changes))
+    rows, inverse = [], []
+    for change, (undo, skipped) in zip(changes, planned):
+        rows.append({
+            "domain": domain, "record": change["name"], "journaled change": change["op"],
+            "restored content": change.get("before") or "(removed)", "status": skipped, "zone_id": zone_id,
+        })
+        if undo:
+            inverse.append((rows[-1], undo))
+
+    if not inverse:
+        return rows, None
+    if dry_run:
+        for row, undo in inverse:
+            row["status"] = DRY_RUN_STATUS[undo["op"]]
+        return rows, None
+    undos = [undo for _, undo in inverse]
+    if journal:
+        journal.intent(zone_id, domain, undos)
+    result = await client.batch_dns_records(zone_id, **_payload(undos))
+    if journal:
+        journal.outcome(zone_id, result is not None, [r.get("id") for r in (result or {}).get("posts") or []])
+    for row, undo in inverse:
+        row["status"] = DONE_STATUS[undo["op"]] if result is not None else "Rollback Failed"
+    return rows, result is not None
@@ -0,0 +1,131 @@
+import csv
+import glob
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".checkpoint.json"
+SHARD_CHECKPOINT = re.compile(r"\.shard-\d+-of-\d+" + re.escape(SUFFIX) + "$")
+
+def checkpoint_path_for(report_path):
+    return os.path.splitext(report_path)[0] + SUFFIX
+
+def latest_checkpoint(reports_dir, suffix=""):
+    """
+    Most recently written checkpoint in `reports_dir` whose report name ends in `suffix` (a shard's
+    `.shard-i-of-N`), or None. Without a suffix, shard checkpoints are never picked.
+    """
+    paths = glob.glob(os.path.join(reports_dir, "*" + suffix + SUFFIX))
+    if not suffix:
+        paths = [p for p in paths if not SHARD_CHECKPOINT.search(p)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+class RunCheckpoint:
+    """
+    Resume point for a bulk run, saved next to the report as `<report>.checkpoint.json`.
+
+    The JSON file holds the run settings, the pagination cursor and the zones with a batch write
+    in flight; it is rewritten atomically (temp file + rename) after every finished zone and
+    around every write. Completed zones and their result rows are the report's CSV checkpoint,
+    which is flushed before each save, so the cursor never gets ahead of the rows on disk.
+
+    The cursor is a low watermark: it only moves past a batch of zones once every zone in it is
+    finished, and zones finished beyond it are skipped by id on resume. Zones with a write in
+    flight are simply re-read and re-evaluated, which converges because the policy output of an
+    already-updated record is "No Change Needed" (and a created DMARC record is found again).
+    """
+    def __init__(self, path, report, settings, cursor=None, in_flight=None, completed=None):
+        self.path = path
+        self.report = report
+        self.settings = settings
+        self.cursor = cursor
+        self.in_flight = in_flight or {}
+        self.completed = completed or set()
+        # Set once the whole zone list has been handed out (not on --limit)
+        self.listed = False
+        # cursor of each handed-out batch -> (zone ids of it still outstanding, next cursor), oldest first
+        self._batches = OrderedDict()
+        self._batch_of = {}
+
+    @classmethod
+    def load(cls, path, report):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        completed = set()
+        if os.path.exists(report.checkpoint_path):
+            with open(report.checkpoint_path, mode="r", encoding="utf-8", newline="") as f:
+                completed = {row['zone_id'] for row in csv.DictReader(f) if row.get('zone_id')}
+        checkpoint = cls(path, report, data.get("settings", {}), data.get("cursor"), data.get("in_flight"), completed)
+        logger.info(f"📂 Resuming from {path}: {len(completed)} zones done, cursor {checkpoint.cursor}, "
+                    f"{len(checkpoint.in_flight)} writes were in flight")
+        for zone_id, entry in checkpoint.in_flight.items():
+            logger.warning(f"⚠️ Write for {entry.get('domain')} ({zone_id}) was in flight when the run stopped; it will be re-checked")
+        return checkpoint
+
+    @staticmethod
+    def read_settings(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("settings", {})
+
+    def save(self):
+        self.report.flush()
+        data = {
+            "settings": self.settings,
+            "cursor": self.cursor,
+            "in_flight": self.in_flight,
+            "completed": len(self.completed),
+            "saved_at": time.time(),
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def begin_batch(self, cursor, next_cursor, zones):
+        """
+        Register a batch about to be queued (`cursor` re-lists it, `next_cursor` the one after it);
+        returns the zones of it not finished yet.
+        """
+        pending = [z for z in zones if z['id'] not in self.completed]
+        if not self._batches:
+            # Nothing older is outstanding, so this batch is where a resume would start
+            self.cursor = cursor if pending else next_cursor
+        if pending:
+            key = json.dumps(cursor)
+            self._batches[key] = ({z['id'] for z in pending}, next_cursor)
+            for z in pending:
+                self._batch_of[z['id']] = key
+        self.save()
+        return pending
+
+    def zone_done(self, zone_id):
+        self.completed.add(zone_id)
+        self.in_flight.pop(zone_id, None)
+        key = self._batch_of.pop(zone_id, None)
+        if key is not None:
+            self._batches[key][0].discard(zone_id)
+            # Advance the watermark over every leading batch that is now complete
+            while self._batches and not next(iter(self._batches.values()))[0]:
+                _, (_, next_cursor) = self._batches.popitem(last=False)
+                self.cursor = json.loads(next(iter(self._batches))) if self._batches else next_cursor
+        self.save()
+
+    def write_started(self, zone_id, domain, patches, posts):
+        self.in_flight[zone_id] = {"domain": domain, "patches": patches, "posts": posts, "started_at": time.time()}
+        self.save()
+
+    def write_finished(self, zone_id):
+        # Stays "in flight" until the zone's row is done (verification included); only the payload is dropped
+        if zone_id in self.in_flight:
+            self.in_flight[zone_id].update(patches=None, posts=None, applied=True)
+
+    def finish(self):
+        """Run completed: the checkpoint is no longer needed."""
+        for path in (self.path, self.path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from cloudflare_client import CloudflareClient
+
+logger = logging.getLogger(__name__)
+
+# Calls scoped to one zone (zone_id first), sent with the token that can reach that zone
+ZONE_METHODS = {
+    "get_zone", "list_dns_records", "get_dns_records", "get_policy_records", "get_dns_record",
+    "update_dns_record", "find_dns_records", "create_dns_record", "batch_dns_records",
+}
+
+class ClientPool:
+    """
+    Several API tokens (e.g. one per Cloudflare account) used as one client.
+
+    Each member is a full CloudflareClient with its own session, connection pool, rate limiter,
+    concurrency limits and circuit breaker, so N tokens bring N request budgets to one run.
+    Zone-scoped calls go to the token that listed the zone (or, for zones planned from the
+    inventory, the token recorded there); a zone seen by none of them is looked up on every
+    token once. Tokens are expected to cover different accounts; a zone reachable by several
+    is processed once, with whichever token listed it last.
+    """
+    def __init__(self, members):
+        self.members = members
+        self.routes = {} # zone_id -> member
+        self.inventory = None
+        self._by_token = {m.token_id: m for m in members}
+        for member in members:
+            member.metric_labels = {"token": member.token_id}
+
+    @classmethod
+    def from_tokens(cls, tokens, limiters=None, **kwargs):
+        limiters = limiters or [None] * len(tokens)
+        return cls([CloudflareClient(token, limiter=limiter, **kwargs) for token, limiter in zip(tokens, limiters)])
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        for member in self.members:
+            await member.open()
+
+    async def close(self):
+        await asyncio.gather(*(member.close() for member in self.members))
+
+    async def client_for(self, zone_id):
+        member = self.routes.get(zone_id)
+        if member is None and self.inventory is not None:
+            member = self._by_token.get(self.inventory.token_of(zone_id))
+        if member is None:
+            found = await asyncio.gather(*(m.get_zone(zone_id) for m in self.members))
+            member = next((m for m, zone in zip(self.members, found) if zone), None)
+        if member is not None:
+            self.routes[zone_id] = member
+        return member
+
+    def __getattr__(self, name):
+        if name not in ZONE_METHODS:
+            raise AttributeError(name)
+
+        async def call(zone_id, *args, **kwargs):
+            member = await self.client_for(zone_id)
+            if member is None:
+                # Same contract as the member methods: failures come back as None
+                logger.error(f"No API token can reach zone {zone_id}")
+                return None
+            return await getattr(member, name)(zone_id, *args, **kwargs)
+        return call
+
+    async def iter_zone_pages(self, start_page=1, retries=3, params=None):
+        """
+        Every token's /zones pages, one token after another, numbered as a single listing
+        (so a page number works as a resume point). Zones are routed to the token that listed them.
+        """
+        offset = 0
+        for member in self.members:
+            total_pages = None
+            async for page, zones, result_info in member.iter_zone_pages(max(1, start_page - offset), retries, params):
+                total_pages = result_info.get('total_pages', page)
+                for zone in zones:
+                    self.routes[zone['id']] = member
+                yield offset + page, zones, {k: v for k, v in result_info.items() if k != 'total_pages'}
+            if total_pages is None:
+                # Nothing listed (resumed past this token, or it failed): its page count is still needed
+                _, result_info = await member.fetch_page(f"{member.base_url}/zones", 1, params=params)
+                if result_info is None:
+                    logger.error(f"❌ Could not list zones for token {member.token_id}; stopping the pooled listing.")
+                    return
+                total_pages = result_info.get('total_pages', 0)
+            offset += total_pages
+
+    # Same logic as a single client, over the pooled listing / inventory
+    get_zones = CloudflareClient.get_zones
+    get_all_zones = CloudflareClient.get_all_zones
+
+    async def get_zone_by_name(self, name):
+        found = await asyncio.gather(*(m.get_zone_by_name(name) for m in self.members))
+        for member, zone in zip(self.members, found):
+            if zone:
+                self.routes[zone['id']] = member
+                return zone
+        return None
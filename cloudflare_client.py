@@ -1,132 +1,477 @@
-import requests
+import asyncio
+import hashlib
 import logging
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import aiohttp
+from typing import NamedTuple
 from config import config
+from metrics import metrics
+from rate_limiter import TokenBucket, parse_retry_after
+from concurrency import AimdLimiter
+from resilience import AmbiguousWrite, CircuitBreaker, DeadlineExceeded, RequestRejected, backoff_delay
 
 logger = logging.getLogger(__name__)
 
+# Statuses worth retrying during bulk updates (429 Too Many Requests is the critical one)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 10
+# Full-jitter exponential backoff: uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2^attempt)) seconds
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+def endpoint_label(method, url):
+    """Route template for metrics labels, e.g. `GET /zones/:id/dns_records` (keeps label cardinality fixed)."""
+    path = url.split("/client/v4", 1)[-1].split("?", 1)[0]
+    parts = path.strip("/").split("/")
+    for i in (1, 3):
+        if len(parts) > i and parts[i] != "batch":
+            parts[i] = ":id"
+    return f"{method} /{'/'.join(parts)}"
+
+def token_fingerprint(token):
+    return hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:8]
+
+class DnsRecord(NamedTuple):
+    """Compact view of a dns_records result; only the fields the policy logic needs."""
+    id: str
+    type: str
+    name: str
+    content: str
+    ttl: int = 1
+    modified_on: str = ""
+
+    @classmethod
+    def from_api(cls, r):
+        return cls(r['id'], r.get('type', 'TXT'), r['name'], r.get('content', ''), r.get('ttl', 1), r.get('modified_on', ''))
+
 class CloudflareClient:
-    def __init__(self, api_token):
+    """
+    Async Cloudflare API client.
+    Every request takes a token from the shared rate limiter and a slot from an account-wide
+    concurrency limit (one for reads, one for writes), so the request rate and the number of calls
+    in flight are bounded no matter how many zones are being processed at once. The concurrency
+    limits adapt (AIMD) to latency, 429s and 5xx unless ADAPTIVE_CONCURRENCY is off.
+    """
+    def __init__(self, api_token, max_in_flight=None, limiter=None, trace_configs=None):
         self.api_token = api_token
-        self.session = self._create_session()
-        self.base_url = "https://api.cloudflare.com/client/v4"
+        # Stable, non-secret name for the token (zone inventory, logs, metric labels in a ClientPool)
+        self.token_id = token_fingerprint(api_token)
+        self.metric_labels = {}
+        self.base_url = config.CLOUDFLARE_API_BASE_URL.rstrip("/")
+        self.max_in_flight = max_in_flight or config.MAX_IN_FLIGHT
+        self.limiter = limiter or TokenBucket(
+            config.RATE_LIMIT_REQUESTS,
+            config.RATE_LIMIT_WINDOW,
+            utilization=config.RATE_LIMIT_UTILIZATION,
+            burst=config.RATE_LIMIT_BURST
+        )
+        # aiohttp TraceConfig hooks (e.g. per-request latency in benchmark.py)
+        self.trace_configs = trace_configs
+        self.breaker = CircuitBreaker(
+            error_rate=config.BREAKER_ERROR_RATE,
+            min_calls=config.BREAKER_MIN_CALLS,
+            window=config.BREAKER_WINDOW,
+            open_seconds=config.BREAKER_OPEN_SECONDS
+        )
+        # Optional ZoneInventory; get_zones serves from it instead of paging /zones
+        self.inventory = None
+        self.session = None
+        adaptive = config.ADAPTIVE_CONCURRENCY
+        ceiling = config.AIMD_MAX_IN_FLIGHT if adaptive else self.max_in_flight
+        self.concurrency = {
+            "read": AimdLimiter("read", self.max_in_flight, config.AIMD_MIN_IN_FLIGHT, ceiling, adaptive=adaptive),
+            "write": AimdLimiter("write", self.max_in_flight, config.AIMD_MIN_IN_FLIGHT, ceiling, adaptive=adaptive),
+        }
+
+    @property
+    def members(self):
+        """The per-token clients behind this client (just itself; see ClientPool)."""
+        return [self]
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        # Created inside the running loop (asyncio primitives bind to it on Python < 3.10)
+        if self.session is None:
+            self.session = self._create_session()
+        for limiter in self.concurrency.values():
+            limiter.register_metrics(**self.metric_labels)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
 
     def _create_session(self):
-        session = requests.Session()
-        # Retrying on 429 (Too Many Requests) is critical for bulk updates
-        retry_strategy = Retry(
-            total=10, 
-            backoff_factor=2, # Exponential backoff: 2, 4, 8, 16...
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "OPTIONS", "PUT", "POST"]
+        connector = aiohttp.TCPConnector(limit=sum(c.maximum for c in self.concurrency.values()) + 10)
+        return aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=self.trace_configs,
+            headers={
+                "Authorization": f"Bearer {self.api_token}",
+                "Content-Type": "application/json"
+            }
         )
-        adapter = HTTPAdapter(
-            pool_connections=config.MAX_WORKERS + 5,
-            pool_maxsize=config.MAX_WORKERS + 10,
-            max_retries=retry_strategy
-        )
-        session.mount("https://", adapter)
-        session.headers.update({
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        })
-        return session
 
-    def fetch_page(self, url, page, per_page=50):
-        params = {'page': page, 'per_page': per_page}
+    async def _request(self, method, url, timeout=30, deadline=None, idempotent=None, **kwargs):
+        """
+        Send one API call and return the decoded JSON body.
+
+        Attempts and the jittered backoff between them share one time budget (`deadline`,
+        REQUEST_DEADLINE by default); waiting on the rate limiter or an open circuit breaker is
+        account-wide pacing and doesn't count against it. A 429 pauses the shared limiter for
+        Retry-After, so every worker backs off together. 5xx, timeouts and dropped connections
+        are retried only for idempotent calls (everything but POST unless `idempotent=True`);
+        for a POST they raise AmbiguousWrite so the caller can check what was applied instead of
+        creating duplicates. A POST that never reached the server (connect error, 429) is retried.
+        Sleeps happen outside the concurrency limit so a waiting call doesn't hold a slot.
+        """
+        idempotent = method != "POST" if idempotent is None else idempotent
+        deadline_at = time.monotonic() + (deadline or config.REQUEST_DEADLINE)
+        endpoint = endpoint_label(method, url)
+        concurrency = self.concurrency["read" if method == "GET" else "write"]
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                metrics.inc("api_retries_total", endpoint=endpoint)
+            retry_after = None
+            paced_from = time.monotonic()
+            probe = await self.breaker.wait()
+            try:
+                await self.limiter.acquire()
+                # Account-wide pacing: the budget only runs while this call could actually be sent
+                deadline_at += time.monotonic() - paced_from
+                await concurrency.acquire()
+            except BaseException:
+                # Cancelled (or timed out) before sending: a probe slot must not stay taken
+                if probe:
+                    self.breaker.abandon_probe()
+                raise
+            try:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    metrics.inc("api_deadline_exceeded_total", endpoint=endpoint)
+                    raise DeadlineExceeded(f"{endpoint} gave up after {attempt} attempts")
+                started = time.perf_counter()
+                client_timeout = aiohttp.ClientTimeout(total=min(timeout, remaining))
+                async with self.session.request(method, url, timeout=client_timeout, **kwargs) as resp:
+                    self.limiter.observe(resp.status, resp.headers)
+                    metrics.inc("api_requests_total", endpoint=endpoint, status=resp.status)
+                    if resp.status == 429:
+                        # Throttling says nothing about server health (the limiter handles it): not an
+                        # outcome for the error rate, and a throttled probe leaves the breaker half-open
+                        if probe:
+                            self.breaker.abandon_probe()
+                    else:
+                        self.breaker.record(resp.status >= 500, probe)
+                    probe = False # reported: later errors on this attempt are ordinary outcomes
+                    if resp.status in RETRY_STATUSES:
+                        concurrency.on_overload(str(resp.status))
+                    if resp.status == 429 and attempt < MAX_RETRIES:
+                        # Rejected before processing, so safe to resend; the limiter's pause does the waiting
+                        metrics.inc("api_throttled_total", endpoint=endpoint)
+                        continue
+                    if resp.status in RETRY_STATUSES and resp.status != 429:
+                        if not idempotent:
+                            raise AmbiguousWrite(f"{endpoint} failed with HTTP {resp.status}")
+                        retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                    if resp.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                        resp.raise_for_status()
+                        data = await resp.json()
+                        latency = time.perf_counter() - started
+                        concurrency.on_success(latency)
+                        metrics.observe("api_request_seconds", latency, endpoint=endpoint)
+                        return data
+            except aiohttp.ClientConnectorError:
+                # Never connected: nothing was sent, any method can be retried
+                metrics.inc("api_requests_total", endpoint=endpoint, status="error")
+                self.breaker.record(True, probe)
+                concurrency.on_overload("connection")
+                if attempt == MAX_RETRIES:
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                metrics.inc("api_requests_total", endpoint=endpoint, status="error")
+                self.breaker.record(True, probe)
+                concurrency.on_overload("timeout" if isinstance(e, asyncio.TimeoutError) else "connection")
+                if not idempotent:
+                    raise AmbiguousWrite(f"{endpoint} failed mid-request: {e!r}") from e
+                if attempt == MAX_RETRIES:
+                    raise
+            except BaseException:
+                if probe:
+                    self.breaker.abandon_probe()
+                raise
+            finally:
+                concurrency.release()
+
+            delay = backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP, retry_after)
+            if time.monotonic() + delay >= deadline_at:
+                metrics.inc("api_deadline_exceeded_total", endpoint=endpoint)
+                raise DeadlineExceeded(f"{endpoint} gave up after {attempt + 1} attempts")
+            await asyncio.sleep(delay)
+
+    async def fetch_page(self, url, page, per_page=50, params=None):
+        """(zones, result_info); (None, None) on a failure worth retrying. Raises RequestRejected on a 4xx."""
+        params = dict(params or {}, page=page, per_page=per_page)
         try:
             # Long-running timeouts for reliability
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            data = await self._request("GET", url, params=params, timeout=30)
             if data.get('success'):
                 return data.get('result', []), data.get('result_info', {})
             logger.error(f"API Error on page {page}: {data.get('errors')}")
+        except aiohttp.ClientResponseError as e:
+            if 400 <= e.status < 500 and e.status != 429:
+                raise RequestRejected(f"HTTP {e.status} listing page {page} with {params}") from e
+            logger.error(f"Error fetching page {page}: {e}")
+            return None, None
         except Exception as e:
             logger.error(f"Error fetching page {page}: {e}")
             return None, None # Return None to indicate ERROR, not just empty
         return [], {}
 
-    def get_zones(self, limit=None, processed_set=None):
+    async def iter_zone_pages(self, start_page=1, retries=3, params=None):
         """
-        Fetch zones from Cloudflare. 
-        If limit is provided, it will stop fetching pages once the limit is satisfied.
+        Async generator yielding (page, zones, result_info) for every /zones page (`params` adds
+        filters/ordering). A page that keeps failing after `retries` attempts stops pagination safely;
+        one the API refuses outright raises RequestRejected without retrying.
         """
         url = f"{self.base_url}/zones"
-        all_zones = []
-        page = 1
-        
+        page = start_page
         while True:
-            logger.info(f"Fetching zones page {page}...")
-            results, result_info = self.fetch_page(url, page)
-            if not results:
-                break
-            
+            zones, result_info = None, None
+            for attempt in range(retries):
+                zones, result_info = await self.fetch_page(url, page, params=params)
+                if zones is not None:
+                    break
+                logger.warning(f"⚠️ Page {page} fetch failed. Retrying ({attempt + 1}/{retries})...")
+                await asyncio.sleep(5) # Wait before retry
+
+            if zones is None:
+                logger.error(f"❌ Failed to fetch page {page} after {retries} attempts. Stopping pagination safely.")
+                return
+            if not zones:
+                # Empty list means we reached the end
+                return
+
+            yield page, zones, result_info
+
+            if page >= result_info.get('total_pages', 0):
+                return
+            page += 1
+
+    async def get_zones(self, limit=None, processed_set=None):
+        """
+        Fetch zones from Cloudflare (or from the local inventory, after a delta refresh, when set).
+        If limit is provided, it will stop fetching pages once the limit is satisfied.
+        """
+        if self.inventory is not None:
+            await self.inventory.refresh(self)
+            zones = (z for z in self.inventory.zones() if processed_set is None or z['name'] not in processed_set)
+            return [z for _, z in zip(range(limit), zones)] if limit else list(zones)
+
+        all_zones = []
+        async for page, results, _ in self.iter_zone_pages():
+            logger.info(f"Fetched zones page {page}...")
             if processed_set is not None:
                 # Only add domains not in processed_set
                 filtered = [z for z in results if z['name'].lower() not in processed_set]
                 all_zones.extend(filtered)
             else:
                 all_zones.extend(results)
-            
+
             if limit and len(all_zones) >= limit:
                 logger.info(f"Reached limit of {limit} domains.")
                 return all_zones[:limit]
-            
-            total_pages = result_info.get('total_pages', 0)
-            if page >= total_pages:
-                break
-            page += 1
-            
+
         return all_zones
 
-    def get_all_zones(self):
+    async def get_all_zones(self):
         # Backward compatibility
-        return self.get_zones()
+        return await self.get_zones()
 
-    def get_dns_records(self, zone_id, record_type=None):
+    async def get_zone_by_name(self, name):
+        url = f"{self.base_url}/zones"
+        try:
+            data = await self._request("GET", url, params={"name": name}, timeout=30)
+            zones = data.get('result', [])
+            return zones[0] if zones else None
+        except Exception as e:
+            logger.error(f"Error looking up zone {name}: {e}")
+            return None
+
+    async def get_zone(self, zone_id):
+        """The zone if this token can reach it, else None."""
+        try:
+            data = await self._request("GET", f"{self.base_url}/zones/{zone_id}", timeout=30)
+            return data.get('result') if data.get('success') else None
+        except aiohttp.ClientResponseError as e:
+            # 403/404: the zone belongs to another token's account
+            if e.status not in (403, 404):
+                logger.error(f"Error looking up zone {zone_id}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error looking up zone {zone_id}: {e}")
+            return None
+
+    async def list_dns_records(self, zone_id, params=None):
+        """
+        Every dns_records page for `params`, parsed into DnsRecord.
+        Returns None if any page fails, so a partial listing is never mistaken for a complete one.
+        """
         url = f"{self.base_url}/zones/{zone_id}/dns_records"
-        params = {"type": record_type, "per_page": 100} if record_type else {"per_page": 100}
+        params = dict(params or {}, per_page=config.DNS_RECORDS_PER_PAGE)
+        records = []
+        page = 1
         try:
-            resp = self.session.get(url, params=params, timeout=30)
-            resp.raise_for_status()
-            return resp.json().get('result', [])
+            while True:
+                params['page'] = page
+                data = await self._request("GET", url, params=params, timeout=30)
+                records.extend(DnsRecord.from_api(r) for r in data.get('result', []))
+                if page >= (data.get('result_info') or {}).get('total_pages', 1):
+                    return records
+                page += 1
         except Exception as e:
             logger.error(f"Error fetching DNS records for {zone_id}: {e}")
             return None # Return None to indicate FETCH FAILURE (distinguish from empty list)
 
-    def update_dns_record(self, zone_id, record_id, record_type, name, content, ttl=1, comment=""):
+    async def get_dns_records(self, zone_id, record_type=None):
+        return await self.list_dns_records(zone_id, {"type": record_type} if record_type else None)
+
+    async def get_policy_records(self, zone_id, domain):
+        """
+        Only the records the SPF/DMARC policy looks at: anything containing `v=spf1` plus
+        whatever lives at `_dmarc.<domain>`, in one filtered (OR-matched) listing.
+        Callers still check type/name, since `match=any` also ORs those filters.
+        """
+        return await self.list_dns_records(zone_id, {
+            "match": "any",
+            "content.contains": "v=spf1",
+            "name.exact": f"_dmarc.{domain}",
+        })
+
+    async def get_dns_record(self, zone_id, record_id):
+        url = f"{self.base_url}/zones/{zone_id}/dns_records/{record_id}"
+        try:
+            data = await self._request("GET", url, timeout=30)
+            return DnsRecord.from_api(data['result'])
+        except Exception as e:
+            logger.error(f"Error fetching DNS record {record_id} in {zone_id}: {e}")
+            return None
+
+    async def update_dns_record(self, zone_id, record_id, record_type, name, content, ttl=1, comment=""):
         url = f"{self.base_url}/zones/{zone_id}/dns_records/{record_id}"
         payload = {
-            "type": record_type, 
-            "name": name, 
-            "content": content, 
+            "type": record_type,
+            "name": name,
+            "content": content,
             "ttl": ttl,
             "comment": comment
         }
         try:
-            resp = self.session.put(url, json=payload, timeout=10)
-            resp.raise_for_status()
-            return resp.json().get('success', False)
+            data = await self._request("PUT", url, json=payload, timeout=10)
+            return data.get('success', False)
         except Exception as e:
             logger.error(f"Error updating DNS record {record_id} in {zone_id}: {e}")
             return False
 
-    def create_dns_record(self, zone_id, record_type, name, content, ttl=1, comment=""):
+    async def find_dns_records(self, zone_id, record_type, name, content):
+        """Records matching type, name and content exactly (used to reconcile ambiguous creates), or None on error."""
+        records = await self.list_dns_records(zone_id, {"type": record_type, "name.exact": name, "content.exact": content})
+        if records is None:
+            return None
+        return [r for r in records if r.type == record_type and r.name.lower() == name.lower() and r.content == content]
+
+    async def create_dns_record(self, zone_id, record_type, name, content, ttl=1, comment=""):
         url = f"{self.base_url}/zones/{zone_id}/dns_records"
         payload = {
-            "type": record_type, 
-            "name": name, 
-            "content": content, 
+            "type": record_type,
+            "name": name,
+            "content": content,
             "ttl": ttl,
             "comment": comment
         }
-        try:
-            resp = self.session.post(url, json=payload, timeout=10)
-            resp.raise_for_status()
-            return resp.json().get('success', False)
-        except Exception as e:
-            logger.error(f"Error creating DNS record in {zone_id}: {e}")
-            return False
+        # A create is only re-sent once a read shows the first attempt didn't land (no duplicates)
+        for attempt in range(2):
+            try:
+                data = await self._request("POST", url, json=payload, timeout=10)
+                return data.get('success', False)
+            except AmbiguousWrite as e:
+                logger.warning(f"⚠️ {e}; checking whether {name} was created before retrying")
+                await asyncio.sleep(config.VERIFY_SETTLE_DELAY)
+                existing = await self.find_dns_records(zone_id, record_type, name, content)
+                if existing is None:
+                    logger.error(f"Could not confirm whether {name} was created in {zone_id}; not retrying")
+                    return False
+                if existing:
+                    return True
+            except Exception as e:
+                logger.error(f"Error creating DNS record in {zone_id}: {e}")
+                return False
+        return False
+
+    async def _batch_outcome(self, zone_id, patches, puts, posts):
+        """
+        After an ambiguous batch call: the per-operation result if every change is visible, {} if
+        none is (safe to resend - batches are atomic), None if it can't be told.
+        """
+        await asyncio.sleep(config.VERIFY_SETTLE_DELAY)
+        result = {"patches": [], "puts": [], "posts": []}
+        seen = []
+        for key, ops in (("patches", patches or []), ("puts", puts or [])):
+            for op in ops:
+                record = await self.get_dns_record(zone_id, op["id"])
+                if record is None:
+                    return None
+                seen.append(record.content == op["content"])
+                result[key].append({"id": record.id, "content": record.content})
+        for op in posts or []:
+            found = await self.find_dns_records(zone_id, op.get("type", "TXT"), op["name"], op["content"])
+            if found is None:
+                return None
+            seen.append(bool(found))
+            result["posts"].append({"id": found[0].id, "content": found[0].content} if found else {})
+        if all(seen):
+            return result
+        if not any(seen):
+            return {}
+        return None
+
+    async def batch_dns_records(self, zone_id, deletes=None, patches=None, puts=None, posts=None):
+        """
+        Apply several record changes in one atomic call (executed as deletes, patches, puts, posts).
+        Returns the per-operation results ({"posts": [...], "patches": [...], ...}) or None on failure,
+        in which case none of the changes were applied.
+        If the call fails ambiguously (5xx, timeout), the records are re-read: an applied batch is
+        reported as applied, an unapplied one is re-sent once, never both.
+        """
+        url = f"{self.base_url}/zones/{zone_id}/dns_records/batch"
+        payload = {}
+        for key, ops in (("deletes", deletes), ("patches", patches), ("puts", puts), ("posts", posts)):
+            if ops:
+                payload[key] = ops
+        for attempt in range(2):
+            try:
+                data = await self._request("POST", url, json=payload, timeout=30)
+                if data.get('success'):
+                    return data.get('result') or {}
+                logger.error(f"Batch DNS update rejected for {zone_id}: {data.get('errors')}")
+                return None
+            except AmbiguousWrite as e:
+                if deletes:
+                    logger.error(f"Batch DNS update for {zone_id} may or may not have been applied: {e}")
+                    return None
+                logger.warning(f"⚠️ {e}; checking whether the batch for {zone_id} was applied")
+                outcome = await self._batch_outcome(zone_id, patches, puts, posts)
+                if outcome:
+                    return outcome
+                if outcome is None:
+                    logger.error(f"Could not tell whether the batch for {zone_id} was applied; not retrying")
+                    return None
+            except Exception as e:
+                logger.error(f"Error applying batch DNS update in {zone_id}: {e}")
+                return None
+        return None
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class AimdLimiter:
+    """
+    Concurrency limit that follows the API's real capacity (additive increase, multiplicative decrease).
+
+    Every successful call whose latency stays within `latency_factor` x the observed baseline
+    grows the limit by `1 / limit` (about +1 per round of calls); a 429, 5xx, timeout or
+    connection error multiplies it by `decrease`, at most once per `cooldown` seconds so one
+    burst of failures counts as one congestion signal. With `adaptive=False` it is a plain
+    fixed-size semaphore.
+    """
+    def __init__(self, name, initial, minimum=1, maximum=64, decrease=0.5, latency_factor=3.0,
+                 cooldown=2.0, adaptive=True):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.baseline = None
+        self._last_decrease = 0.0
+        self._waiters = deque()
+
+    def register_metrics(self, **labels):
+        metrics.gauge_fn("concurrency_limit", lambda: int(self.limit), kind=self.name, **labels)
+        metrics.gauge_fn("in_flight", lambda: self.in_flight, kind=self.name, **labels)
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass on a wake-up this waiter can no longer use
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_success(self, latency):
+        if not self.adaptive:
+            return
+        # Baseline = lowest recent latency, drifting up 1% per call so it tracks slow changes
+        self.baseline = latency if self.baseline is None else min(latency, self.baseline * 1.01)
+        if latency > self.baseline * self.latency_factor or self.limit >= self.maximum:
+            return
+        before = int(self.limit)
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+        if int(self.limit) > before and int(self.limit) % 5 == 0:
+            logger.info(f"📈 {self.name} concurrency raised to {int(self.limit)}")
+
+    def on_overload(self, reason):
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        before = int(self.limit)
+        self.limit = max(float(self.minimum), self.limit * self.decrease)
+        metrics.inc("concurrency_decreases_total", kind=self.name, reason=reason)
+        logger.warning(f"📉 {self.name} concurrency cut {before} -> {int(self.limit)} ({reason})")
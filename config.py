@@ -6,18 +6,101 @@ load_dotenv()
 class Config:
     # Cloudflare API Configuration
     CLOUDFLARE_API_TOKEN = os.getenv("CLOUDFLARE_API_TOKEN")
+    # Comma-separated tokens (e.g. one per account) are pooled in one run, each with its own session and rate budget
+    CLOUDFLARE_API_TOKENS = [t.strip() for t in os.getenv("CLOUDFLARE_API_TOKENS", "").split(",") if t.strip()] \
+        or ([CLOUDFLARE_API_TOKEN] if CLOUDFLARE_API_TOKEN else [])
+    # Point at mock_cloudflare.py (e.g. http://127.0.0.1:8787/client/v4) to run fully offline
+    CLOUDFLARE_API_BASE_URL = os.getenv("CLOUDFLARE_API_BASE_URL", "https://api.cloudflare.com/client/v4")
 
     # MongoDB Configuration
     MONGODB_URI = os.getenv("MONGODB_URI")
     DB_NAME = "vercel"
     COLLECTION_NAME = "dfyinfrasetups"
+    # Load every domain mapping once up front (bulk runs); otherwise resolve one page of zones per query
+    USER_MAPPING_PRELOAD = os.getenv("USER_MAPPING_PRELOAD", "true").lower() in ("1", "true", "yes")
 
+    # Legacy tracking CSV, imported once into the state store
     TRACKING_CSV_PATH = os.getenv("TRACKING_CSV_PATH", "processed_domains.csv")
+    STATE_DB_PATH = os.getenv("STATE_DB_PATH", "automation_state.db")
+    STATE_FLUSH_SIZE = int(os.getenv("STATE_FLUSH_SIZE", "50"))
+    # Incremental runs re-read a zone at least this often even if it looks untouched (--full forces it)
+    INCREMENTAL_MAX_AGE_HOURS = float(os.getenv("INCREMENTAL_MAX_AGE_HOURS", "168"))
+    # Skip zones whose modified_on matches the last scan without reading their records (--trust-modified-on).
+    # Off by default: a zone's modified_on may not change when its DNS records are edited
+    TRUST_ZONE_MODIFIED_ON = os.getenv("TRUST_ZONE_MODIFIED_ON", "false").lower() in ("1", "true", "yes")
+    # Plan bulk runs from a local zone inventory (in STATE_DB_PATH) refreshed by delta listings;
+    # a full /zones listing (which also drops deleted zones) happens every INVENTORY_FULL_REFRESH_HOURS
+    ZONE_INVENTORY = os.getenv("ZONE_INVENTORY", "true").lower() in ("1", "true", "yes")
+    INVENTORY_FULL_REFRESH_HOURS = float(os.getenv("INVENTORY_FULL_REFRESH_HOURS", "24"))
     REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+    # Write-ahead journal of every live write (before/after content per record), replayed by --rollback RUN_ID
+    CHANGE_JOURNAL_PATH = os.getenv("CHANGE_JOURNAL_PATH", "change_journal.jsonl")
+    # Run ID to journal under (default: a new one per run; --shards hands one to all its shards)
+    RUN_ID = os.getenv("RUN_ID") or None
     LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "automation.log")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    # Level for per-zone lines (processing / update / verification); e.g. WARNING keeps bulk runs quiet
+    LOG_ZONE_LEVEL = os.getenv("LOG_ZONE_LEVEL", "INFO").upper()
+    # Optional JSON-lines log (one object per record, with zone_id / domain / stage) for post-run analysis
+    LOG_JSON_PATH = os.getenv("LOG_JSON_PATH") or None
     MAX_WORKERS = int(os.getenv("MAX_WORKERS", "6"))
+    # Account-wide cap on concurrent Cloudflare API calls (shared by all workers)
+    MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "10"))
+    # AIMD: start reads and writes at MAX_IN_FLIGHT each, grow while latency is healthy, halve on 429/5xx/timeouts
+    ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() in ("1", "true", "yes")
+    AIMD_MIN_IN_FLIGHT = int(os.getenv("AIMD_MIN_IN_FLIGHT", "1"))
+    AIMD_MAX_IN_FLIGHT = int(os.getenv("AIMD_MAX_IN_FLIGHT", "50"))
+    # Bulk runs are a staged pipeline (listing -> fetch -> user mapping -> evaluate -> write), each stage with its
+    # own workers (per API token; 0 = the default above) and a bounded input queue (0 = twice its workers)
+    FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "0"))
+    EVALUATE_WORKERS = int(os.getenv("EVALUATE_WORKERS", "0"))
+    WRITE_WORKERS = int(os.getenv("WRITE_WORKERS", "0")) # 0 = MAX_WORKERS
+    USER_MAPPING_BATCH = int(os.getenv("USER_MAPPING_BATCH", "100"))
+    STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "0")) or None
+    # Log per-stage throughput / queue depth / busy workers every N seconds during bulk runs (0 = off)
+    PIPELINE_PROGRESS_INTERVAL = float(os.getenv("PIPELINE_PROGRESS_INTERVAL", "30"))
+    DNS_RECORDS_PER_PAGE = int(os.getenv("DNS_RECORDS_PER_PAGE", "100"))
+    # "targeted" asks the API only for SPF/_dmarc records; "full" lists every TXT record in the zone
+    DNS_FETCH_MODE = os.getenv("DNS_FETCH_MODE", "targeted")
+    # Post-update verification: wait VERIFY_SETTLE_DELAY seconds after a write, re-read up to VERIFY_ATTEMPTS times
+    VERIFY_SETTLE_DELAY = float(os.getenv("VERIFY_SETTLE_DELAY", "2"))
+    VERIFY_ATTEMPTS = int(os.getenv("VERIFY_ATTEMPTS", "3"))
+    VERIFY_CONCURRENCY = int(os.getenv("VERIFY_CONCURRENCY", "4"))
+    # Zones waiting on verification at once; the write stage blocks beyond that (keep >= write rate * settle delay)
+    VERIFY_QUEUE_SIZE = int(os.getenv("VERIFY_QUEUE_SIZE", "500"))
+    # Create `_dmarc.<domain>` when it is missing instead of skipping the zone
+    CREATE_MISSING_DMARC = os.getenv("CREATE_MISSING_DMARC", "true").lower() in ("1", "true", "yes")
     BATCH_SIZE = int(os.getenv("BATCH_SIZE", "100"))
-    COOLDOWN_SLEEP = int(os.getenv("COOLDOWN_SLEEP", "15"))
+    # SPF include-chain analysis (RFC 7208 lookup / void-lookup limits), resolved over DNS-over-HTTPS.
+    # Opt-in: it sends every zone's SPF names (and their includes) to SPF_RESOLVER_URL, a third party by
+    # default; point it at your own resolver, or at mock_cloudflare.py (http://127.0.0.1:8787/dns-query) offline
+    SPF_ANALYSIS = os.getenv("SPF_ANALYSIS", "false").lower() in ("1", "true", "yes")
+    SPF_RESOLVER_URL = os.getenv("SPF_RESOLVER_URL", "https://cloudflare-dns.com/dns-query")
+    SPF_RESOLVER_CONCURRENCY = int(os.getenv("SPF_RESOLVER_CONCURRENCY", "20"))
+    SPF_RESOLVER_TIMEOUT = float(os.getenv("SPF_RESOLVER_TIMEOUT", "5"))
+    # Worker processes parsing zone exports in --offline mode (0 = one per CPU)
+    AUDIT_WORKERS = int(os.getenv("AUDIT_WORKERS", "0")) or None
+
+    # Total time budget per API call (attempts + backoff); waits on the rate limiter / circuit breaker don't count
+    REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "120"))
+    # Circuit breaker: pause all dispatch for BREAKER_OPEN_SECONDS (doubling on repeat trips) once more than
+    # BREAKER_ERROR_RATE of at least BREAKER_MIN_CALLS calls in the last BREAKER_WINDOW seconds failed server-side
+    BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+    BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+    BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+    BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "15"))
+
+    # Cloudflare API budget: 1200 requests per 5 minutes per token
+    RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "1200"))
+    RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "300"))
+    RATE_LIMIT_UTILIZATION = float(os.getenv("RATE_LIMIT_UTILIZATION", "0.95"))
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+
+    # Metrics: serve Prometheus text on http://0.0.0.0:METRICS_PORT/metrics and/or rewrite METRICS_TEXTFILE
+    # every METRICS_INTERVAL seconds (node_exporter textfile collector); both off by default
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None
+    METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE") or None
+    METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
     
     @classmethod
     def get_report_path(cls):
@@ -28,8 +111,8 @@ class Config:
 
     @classmethod
     def validate(cls):
-        if not cls.CLOUDFLARE_API_TOKEN:
-            raise ValueError("CLOUDFLARE_API_TOKEN is not set in .env")
+        if not cls.CLOUDFLARE_API_TOKENS:
+            raise ValueError("CLOUDFLARE_API_TOKEN (or CLOUDFLARE_API_TOKENS) is not set in .env")
         # No error if CSV doesn't exist, we will create it.
 
 config = Config()
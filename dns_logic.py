@@ -1,73 +1,153 @@
 import re
+from functools import lru_cache
+from typing import NamedTuple
 
+# Bump whenever a change here can give an existing zone a different verdict: incremental runs
+# never reuse a result computed under another version
+POLICY_VERSION = 1
+
+# Distinct SPF / DMARC values remembered by the policy functions; zones share few distinct values
+POLICY_CACHE_SIZE = 65536
+
+DEFAULT_SPF = "v=spf1 a mx ~all"
+SPF_ALL = re.compile(r'-all|\?all')
+DMARC_RUA = re.compile(r'rua=([^;]+)', re.IGNORECASE)
+DMARC_RUF = re.compile(r'ruf=([^;]+)', re.IGNORECASE)
+
+def _is_missing(raw):
+    return not raw or str(raw).strip().lower() == "missing"
+
+@lru_cache(maxsize=POLICY_CACHE_SIZE)
 def generate_updated_spf(raw_spf):
     """
     Ported logic from BulkResultsTable.tsx:
     const generateUpdatedSpf = (raw: string | null) => raw ? raw.replace(/-all|\?all/g, '~all') : 'v=spf1 a mx ~all';
     """
-    if not raw_spf or str(raw_spf).strip().lower() == "missing":
-        return "v=spf1 a mx ~all"
+    if _is_missing(raw_spf):
+        return DEFAULT_SPF
     
     # EXACT logic from TS: Replace -all or ?all with ~all
     # Using regex to match the global replace behavior
-    updated = re.sub(r'-all|\?all', '~all', raw_spf.strip())
-    return updated
+    return SPF_ALL.sub('~all', raw_spf.strip())
+
+def _mailto_parts(val):
+    return [p.strip() for p in val.split(',') if p.strip()]
+
+def ensure_mailto(val):
+    # TS: return val.split(',').map(p => p.trim()).map(p => p.toLowerCase().startsWith('mailto:') ? p : `mailto:${p}`).join(', ');
+    return ", ".join(p if p.lower().startswith('mailto:') else f"mailto:{p}" for p in _mailto_parts(val))
+
+class DmarcTags(NamedTuple):
+    """What the policy needs from one DMARC value, parsed once (rua/ruf: first tag value, or None)."""
+    rua: str
+    ruf: str
+    strict: bool
+    syntax_error: bool
+
+    @classmethod
+    def parse(cls, raw):
+        m_rua = DMARC_RUA.search(raw)
+        m_ruf = DMARC_RUF.search(raw)
+        rua = m_rua.group(1) if m_rua else None
+        ruf = m_ruf.group(1) if m_ruf else None
+        # TS: rua and ruf addresses must all carry the mailto: prefix
+        syntax_error = any(
+            not p.lower().startswith('mailto:') for tag in (rua, ruf) if tag for p in _mailto_parts(tag)
+        )
+        strict = 'p=reject' in raw or ('p=quarantine' in raw and 'pct=100' in raw)
+        return cls(rua, ruf, strict, syntax_error)
+
+@lru_cache(maxsize=POLICY_CACHE_SIZE)
+def _dmarc_plan(raw_dmarc):
+    """
+    Domain-independent part of the DMARC policy for one value: (kept value or None, rua or None
+    for the per-domain default, ruf fragment).
+    """
+    if _is_missing(raw_dmarc):
+        return None, None, ""
+    tags = DmarcTags.parse(raw_dmarc)
+    # TS: if (isAlreadyStrict && !raw?.includes('p=none') && !syntaxError) return raw || '';
+    if tags.strict and 'p=none' not in raw_dmarc and not tags.syntax_error:
+        return raw_dmarc, None, ""
+    rua = ensure_mailto(tags.rua) if tags.rua else None
+    ruf_str = f" ruf={ensure_mailto(tags.ruf)};" if tags.ruf else ""
+    return None, rua, ruf_str
 
 def generate_updated_dmarc(raw_dmarc, domain):
     """
     Ported logic from BulkResultsTable.tsx:
     Identical logic for ensureMailto, hasSyntaxError, and strict record checks.
+    Only the default rua depends on the domain, so the parsed value is memoized on its own.
     """
-    def ensure_mailto(val):
-        # TS: return val.split(',').map(p => p.trim()).map(p => p.toLowerCase().startsWith('mailto:') ? p : `mailto:${p}`).join(', ');
-        parts = [p.strip() for p in val.split(',') if p.strip()]
-        fixed_parts = []
-        for p in parts:
-            if p.lower().startswith('mailto:'):
-                fixed_parts.append(p)
-            else:
-                fixed_parts.append(f"mailto:{p}")
-        return ", ".join(fixed_parts)
-
-    def has_syntax_error(record):
-        # TS: Checks rua and ruf for mailto prefix
-        m_rua = re.search(r'rua=([^;]+)', record, re.IGNORECASE)
-        if m_rua:
-            parts = [p.strip() for p in m_rua.group(1).split(',') if p.strip()]
-            if any(p and not p.lower().startswith('mailto:') for p in parts):
-                return True
-        m_ruf = re.search(r'ruf=([^;]+)', record, re.IGNORECASE)
-        if m_ruf:
-            parts = [p.strip() for p in m_ruf.group(1).split(',') if p.strip()]
-            if any(p and not p.lower().startswith('mailto:') for p in parts):
-                return True
-        return False
-
-    if not raw_dmarc or str(raw_dmarc).strip().lower() == "missing":
-        raw_dmarc = None
-
-    # TS logic: If already strict and no syntax error, keep existing
-    is_already_strict = False
-    if raw_dmarc:
-        is_already_strict = 'p=reject' in raw_dmarc or ('p=quarantine' in raw_dmarc and 'pct=100' in raw_dmarc)
-        syntax_error = has_syntax_error(raw_dmarc)
-        
-        # TS: if (isAlreadyStrict && !raw?.includes('p=none') && !syntaxError) return raw || '';
-        if is_already_strict and 'p=none' not in raw_dmarc and not syntax_error:
-            return raw_dmarc
-
+    kept, rua, ruf_str = _dmarc_plan(raw_dmarc)
+    if kept is not None:
+        return kept
     # Default values from TS
-    rua = f"mailto:dmarc-reports@{domain}"
-    ruf_str = ""
-    
-    if raw_dmarc:
-        m_rua = re.search(r'rua=([^;]+)', raw_dmarc, re.IGNORECASE)
-        if m_rua:
-            rua = ensure_mailto(m_rua.group(1))
-            
-        m_ruf = re.search(r'ruf=([^;]+)', raw_dmarc, re.IGNORECASE)
-        if m_ruf:
-            ruf_str = f" ruf={ensure_mailto(m_ruf.group(1))};"
-
+    if rua is None:
+        rua = f"mailto:dmarc-reports@{domain}"
     # EXACT template from TS
     return f"v=DMARC1; p=reject; sp=reject; pct=100; rua={rua};{ruf_str} adkim=r; aspf=r;"
+
+def evaluate_records(items):
+    """
+    Batch form: (raw_spf, raw_dmarc, domain) triples -> [(new_spf, new_dmarc)], in order.
+    Values repeated across the batch (and earlier calls) are computed once.
+    """
+    return [(generate_updated_spf(raw_spf), generate_updated_dmarc(raw_dmarc, domain))
+            for raw_spf, raw_dmarc, domain in items]
+
+def policy_cache_info():
+    """Hit/miss counters of the SPF and DMARC memo caches."""
+    return {"spf": generate_updated_spf.cache_info(), "dmarc": _dmarc_plan.cache_info()}
+
+# Report status of a change a dry run (or offline audit) would make
+DRY_RUN_STATUS = {"update": "Dry Run: Would Update", "create": "Dry Run: Would Create"}
+
+def select_policy_records(domain, records):
+    """Apex SPF and `_dmarc.<domain>` TXT records (anything with .type/.name/.content)."""
+    apex = domain.lower()
+    dmarc_name = f"_dmarc.{apex}"
+    txt_records = [r for r in records if r.type == "TXT"]
+    spf_records = [r for r in txt_records if r.name.lower() == apex and "v=spf1" in r.content]
+    dmarc_records = [r for r in txt_records if r.name.lower() == dmarc_name]
+    return spf_records, dmarc_records
+
+def evaluate_zone(domain, spf_records, dmarc_records, create_missing_dmarc=True):
+    """
+    Risk classification and target SPF/DMARC for one zone, shared by live runs and the offline audit.
+    Returns (report fields, spf action, dmarc action); an action is None when nothing is to be
+    done (or the change is skipped as risky, with the status already set), else "update"/"create".
+    """
+    risk_list = []
+    if not spf_records: risk_list.append("Missing SPF")
+    elif len(spf_records) > 1: risk_list.append(f"Multiple SPF ({len(spf_records)})")
+    if not dmarc_records: risk_list.append("Missing DMARC")
+    elif len(dmarc_records) > 1: risk_list.append(f"Multiple DMARC ({len(dmarc_records)})")
+
+    raw_spf = spf_records[0].content if spf_records else "Missing"
+    raw_dmarc = dmarc_records[0].content if dmarc_records else "Missing"
+    new_spf = generate_updated_spf(raw_spf)
+    new_dmarc = generate_updated_dmarc(raw_dmarc, domain)
+    fields = {
+        "risk": ", ".join(risk_list) if risk_list else "None",
+        "previous spf": raw_spf, "new spf[updated]": new_spf,
+        "previous dmarc": raw_dmarc, "new dmarc[updated]": new_dmarc,
+        "spf status": "No Change Needed", "dmarc status": "No Change Needed",
+    }
+
+    spf_action = dmarc_action = None
+    if new_spf != raw_spf:
+        spf_risk = [r for r in risk_list if "SPF" in r]
+        if spf_risk:
+            fields['spf status'] = f"Skipped ({spf_risk[0]})"
+        else:
+            spf_action = "update"
+    if new_dmarc != raw_dmarc:
+        # A missing DMARC record is created rather than skipped (unless disabled)
+        create_dmarc = not dmarc_records and create_missing_dmarc
+        dmarc_risk = [r for r in risk_list if "DMARC" in r and not create_dmarc]
+        if dmarc_risk:
+            fields['dmarc status'] = f"Skipped ({dmarc_risk[0]})"
+        else:
+            dmarc_action = "create" if create_dmarc else "update"
+    return fields, spf_action, dmarc_action
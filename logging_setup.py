@@ -0,0 +1,91 @@
+"""
+Non-blocking logging: every logger call only enqueues the record; a QueueListener thread formats
+it and writes the text log, the console and (optionally) a JSON-lines log.
+
+Per-zone lines go to the "zones" logger (`zone_logger`), whose level (LOG_ZONE_LEVEL) can be
+raised to keep bulk runs quiet without hiding run-level messages. `log_context` attaches
+zone_id / domain / stage to every record logged inside it (including from the API client),
+via contextvars, so each asyncio task carries its own fields.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+CONTEXT_FIELDS = ("zone_id", "domain", "stage")
+
+_context = contextvars.ContextVar("log_context", default={})
+_listener = None
+
+zone_logger = logging.getLogger("zones")
+
+@contextmanager
+def log_context(**fields):
+    """Add `fields` (zone_id, domain, stage) to every record logged inside this block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """Captures the logging context in the caller, leaves all formatting to the listener thread."""
+    def prepare(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return record
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, the context fields and any exception."""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_logging(log_path, level="INFO", zone_level="INFO", json_path=None):
+    """Route the root logger through a queue to the text file, stdout and optional JSON-lines file."""
+    global _listener
+    if _listener is not None:
+        return
+    text = logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.FileHandler(log_path, encoding='utf-8'), logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(text)
+    if json_path:
+        json_handler = logging.FileHandler(json_path, encoding='utf-8')
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [_ContextQueueHandler(records)]
+    root.setLevel(level)
+    zone_logger.setLevel(zone_level)
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Drain the queue and stop the writer thread (also runs at exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,27 +1,32 @@
 import logging
 import argparse
-import pandas as pd
 import os
 import sys
-import csv
+import asyncio
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pymongo import MongoClient
 
 # Local imports
 from config import config
 from cloudflare_client import CloudflareClient
-from dns_logic import generate_updated_spf, generate_updated_dmarc
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(config.LOG_FILE_PATH, encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from client_pool import ClientPool
+from scheduler import Stage, StagedPipeline, ZoneScheduler
+from user_mapping import UserMapping
+from verifier import Verifier, VerifyCheck
+from state_store import StateStore
+from zone_inventory import ZoneInventory
+from report_writer import ReportWriter, merge_reports
+from change_detection import ChangeDetector, fingerprint, policy_version
+from dns_logic import DRY_RUN_STATUS, evaluate_zone, select_policy_records
+from metrics import metrics, MetricsExporter
+from rate_limiter import TokenBucket
+from sharding import parse_shard, shard_path, run_local_shards
+from checkpoint import RunCheckpoint, checkpoint_path_for, latest_checkpoint
+from logging_setup import setup_logging, log_context, zone_logger
+from spf_analysis import NOT_ANALYZED, DohResolver, SpfAnalyzer
+from change_journal import ChangeJournal, ROLLBACK_COLUMNS, journal_paths, list_runs, new_run_id, read_run, rollback_zone
+
+# Setup logging (queued: callers never wait on file or terminal I/O)
+setup_logging(config.LOG_FILE_PATH, config.LOG_LEVEL, config.LOG_ZONE_LEVEL, config.LOG_JSON_PATH)
 logger = logging.getLogger(__name__)
 
 def get_mongo_client():
@@ -29,6 +34,8 @@ def get_mongo_client():
         logger.warning("⚠️ MONGODB_URI not found in environment. User mapping will be skipped.")
         return None
     try:
+        # pymongo is slow to import; runs without MongoDB never load it
+        from pymongo import MongoClient
         client = MongoClient(config.MONGODB_URI, serverSelectionTimeoutMS=5000)
         client.server_info()
         return client
@@ -36,349 +43,650 @@ def get_mongo_client():
         logger.error(f"❌ Failed to connect to MongoDB: {e}")
         return None
 
-def fetch_user_mapping(mongo_client, domain):
-    if not mongo_client:
-        return "N/A (No MongoDB)"
-    try:
-        db = mongo_client[config.DB_NAME]
-        collection = db[config.COLLECTION_NAME]
-        doc = collection.find_one({"domain": {"$regex": f"^{domain}$", "$options": "i"}})
-        if doc:
-            user = doc.get("user")
-            if user: return str(user)
-            contacts = doc.get("contactDetails", [])
-            if contacts and isinstance(contacts, list) and len(contacts) > 0:
-                return str(contacts[0].get("email", "Unknown Email"))
-            return "Domain Found (No User Info)"
-        return "Not Found"
-    except Exception as e:
-        return "Error"
-
-def load_processed_domains():
-    if os.path.exists(config.TRACKING_CSV_PATH):
-        try:
-            with open(config.TRACKING_CSV_PATH, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                return {row['domain'].strip().lower() for row in reader if row.get('domain')}
-        except Exception as e:
-            logger.error(f"Error loading tracking CSV: {e}")
-            return set()
-    return set()
-
-def save_processed_domain(domain):
-    try:
-        file_exists = os.path.exists(config.TRACKING_CSV_PATH)
-        with open(config.TRACKING_CSV_PATH, mode='a', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['domain'])
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow({'domain': domain})
-    except Exception as e:
-        logger.error(f"Error saving processed domain {domain}: {e}")
+async def fetch_policy_records(client, zone_id, domain):
+    if config.DNS_FETCH_MODE == "full":
+        return await client.get_dns_records(zone_id, "TXT")
+    return await client.get_policy_records(zone_id, domain)
 
-def generate_report(results_list, report_path):
-    if not results_list:
-        logger.info("No results to report.")
-        return
+class ZoneJob:
+    """One zone on its way through the stages; `row` is its result, `plan` the writes still to send."""
+    def __init__(self, zone):
+        self.zone = zone
+        self.mapped_user = None
+        self.spf_records = self.dmarc_records = None
+        self.fp = None
+        self.row = None
+        self.plan = None
 
-    try:
-        df = pd.DataFrame(results_list)
-        desired_order = [
-            'domain', 'mapped user', 'risk', 'previous spf', 'new spf[updated]',
-            'previous dmarc', 'new dmarc[updated]', 'spf status', 'dmarc status', 'zone_id'
-        ]
-        available_cols = [col for col in desired_order if col in df.columns]
-        df = df[available_cols]
-        
-        with pd.ExcelWriter(report_path, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Update Report')
-            worksheet = writer.sheets['Update Report']
-            for col in worksheet.columns:
-                max_length = 0
-                column = col[0].column_letter
-                for cell in col:
-                    try:
-                        if cell.value and len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except: pass
-                worksheet.column_dimensions[column].width = min(max_length + 2, 60)
-
-        logger.info(f"📊 Detailed report generated: {report_path}")
-    except Exception as e:
-        logger.error(f"Error generating Excel report: {e}")
+class ZoneProcessor:
+    """
+    The per-zone steps of a run: fetch, user mapping, evaluate and write. Bulk runs use them as
+    separate pipeline stages (see StagedPipeline); `process` chains them for a single zone.
+    Rows with pending writes are handed to `verifier` and delivered through its callback.
+    """
+    def __init__(self, client, processed_set, user_mapping=None, dry_run=True, verifier=None, changes=None,
+                 checkpoint=None, spf_analyzer=None, journal=None):
+        self.client = client
+        self.processed_set = processed_set
+        self.user_mapping = user_mapping
+        self.dry_run = dry_run
+        self.verifier = verifier
+        self.changes = changes
+        self.checkpoint = checkpoint
+        self.spf_analyzer = spf_analyzer
+        self.journal = journal
 
-def process_domain(client, zone, processed_set, mongo_client=None, dry_run=True):
-    domain = zone['name']
-    zone_id = zone['id']
-    
-    if domain.lower() in processed_set:
-        return None
-    
-    logger.info(f"{'🔍 [DRY RUN]' if dry_run else '🔄'} Processing: {domain}")
-    
-    records = client.get_dns_records(zone_id, "TXT")
-    mapped_user = fetch_user_mapping(mongo_client, domain)
-    
-    # If fetch failed (None), don't say "Missing", say "API Error"
-    if records is None:
+    async def process(self, zone):
+        """Every step for one zone; returns the result row, or None (already done / pending verification)."""
+        job = await self.fetch(zone)
+        if job is None:
+            return None
+        self._set_mapped_user(job)
+        return await self.write(await self.evaluate(job))
+
+    async def fetch(self, zone):
+        """A ZoneJob with the zone's SPF/DMARC records, or with a reused / API error row; None if already done."""
+        domain = zone['name']
+        if domain.lower() in self.processed_set:
+            return None
+        job = ZoneJob(zone)
+        with log_context(zone_id=zone['id'], domain=domain):
+            zone_logger.info("%s Processing: %s", '🔍 [DRY RUN]' if self.dry_run else '🔄', domain)
+
+            # Incremental mode: zone untouched since the last scan -> reuse that result without any API call
+            job.row = self.changes.before_fetch(zone, None) if self.changes else None
+            if job.row:
+                return job
+
+            with metrics.timer("stage_seconds", stage="fetch"), log_context(stage="fetch"):
+                records = await fetch_policy_records(self.client, zone['id'], domain)
+
+            # If fetch failed (None), don't say "Missing", say "API Error"
+            if records is None:
+                job.row = {
+                    "domain": domain, "risk": "API Fetch Error",
+                    "previous spf": "Error", "new spf[updated]": "N/A",
+                    "previous dmarc": "Error", "new dmarc[updated]": "N/A",
+                    "spf status": "Skipped (API Error)", "dmarc status": "Skipped (API Error)", "zone_id": zone['id']
+                }
+                return job
+
+            job.spf_records, job.dmarc_records = select_policy_records(domain, records)
+            job.fp = fingerprint(job.spf_records, job.dmarc_records)
+            job.row = self.changes.after_fetch(zone, job.fp, None) if self.changes else None
+            return job
+
+    def failed(self, item, error):
+        """Error row for a zone (or ZoneJob) whose step raised, so it is reported and can be retried."""
+        job = item if isinstance(item, ZoneJob) else None
+        zone = job.zone if job else item
         return {
-            "domain": domain, "mapped user": mapped_user, "risk": "API Fetch Error",
+            "domain": zone['name'], "mapped user": job.mapped_user if job else None,
+            "risk": f"Unhandled Error: {error}",
             "previous spf": "Error", "new spf[updated]": "N/A",
             "previous dmarc": "Error", "new dmarc[updated]": "N/A",
-            "spf status": "Skipped (API Error)", "dmarc status": "Skipped (API Error)", "zone_id": zone_id
+            "spf status": "Skipped (Unhandled Error)", "dmarc status": "Skipped (Unhandled Error)", "zone_id": zone['id']
         }
 
-    spf_records = [r for r in records if "v=spf1" in r['content']]
-    dmarc_records = [r for r in records if r['content'].startswith("v=DMARC1") or r['name'].startswith("_dmarc")]
-    
-    raw_spf = spf_records[0]['content'] if spf_records else "Missing"
-    raw_dmarc = dmarc_records[0]['content'] if dmarc_records else "Missing"
-    
-    risk_list = []
-    if not spf_records: risk_list.append("Missing SPF")
-    elif len(spf_records) > 1: risk_list.append(f"Multiple SPF ({len(spf_records)})")
-    if not dmarc_records: risk_list.append("Missing DMARC")
-    elif len(dmarc_records) > 1: risk_list.append(f"Multiple DMARC ({len(dmarc_records)})")
-    
-    risk_msg = ", ".join(risk_list) if risk_list else "None"
-    new_spf = generate_updated_spf(raw_spf)
-    new_dmarc = generate_updated_dmarc(raw_dmarc, domain)
-    
-    res_details = {
-        "domain": domain, "mapped user": mapped_user, "risk": risk_msg,
-        "previous spf": raw_spf, "new spf[updated]": new_spf,
-        "previous dmarc": raw_dmarc, "new dmarc[updated]": new_dmarc,
-        "spf status": "No Change Needed", "dmarc status": "No Change Needed", "zone_id": zone_id
-    }
-    
-    # Apply SPF Update with Verification and Tagging
-    if new_spf != raw_spf:
-        spf_risk = [r for r in risk_list if "SPF" in r]
-        if spf_risk:
-            res_details['spf status'] = f"Skipped ({spf_risk[0]})"
-        elif dry_run:
-            res_details['spf status'] = "Dry Run: Would Update"
-        else:
-            existing_id = spf_records[0]['id']
-            existing_name = spf_records[0]['name']
-            logger.info(f"📤 Updating SPF for {domain}: {raw_spf} -> {new_spf}")
-            success = client.update_dns_record(
-                zone_id, 
-                existing_id, 
-                "TXT", 
-                existing_name, 
-                new_spf, 
-                comment="Updated by Automation"
-            )
-            if success:
-                # IMMEDIATE VERIFICATION WITH RETRY
-                verified = False
-                for attempt in range(3):
-                    time.sleep(2) # Wait for propagation
-                    verification_records = client.get_dns_records(zone_id, "TXT")
-                    if verification_records:
-                        match = next((r for r in verification_records if r['id'] == existing_id), None)
-                        if match and match['content'] == new_spf:
-                            res_details['spf status'] = "Updated"
-                            logger.info(f"✅ SPF Verified and Tagged for {domain}")
-                            verified = True
-                            break
-                    logger.warning(f"⚠️ SPF Verification attempt {attempt+1} failed for {domain}...")
-                
-                if not verified:
-                    if verification_records is None:
-                        res_details['spf status'] = "Updated (Verification Failed - API Timeout)"
-                        logger.warning(f"⚠️ SPF Verification skipped for {domain} due to API Timeout.")
-                    else:
-                        res_details['spf status'] = "Update Failed (Verification Failed)"
-                        logger.error(f"❌ SPF Verification FAILED for {domain} - Content unchanged after update.")
+    def _set_mapped_user(self, job):
+        job.mapped_user = self.user_mapping.get(job.zone['name']) if self.user_mapping else "N/A (No MongoDB)"
+        if job.row is not None:
+            job.row['mapped user'] = job.mapped_user
+
+    async def map_users(self, jobs):
+        """Mapped users for a batch of zones: one Mongo query (none when preloaded), off the event loop."""
+        if self.user_mapping:
+            with metrics.timer("stage_seconds", stage="user_mapping"):
+                await asyncio.get_event_loop().run_in_executor(
+                    None, self.user_mapping.prefetch, [job.zone['name'] for job in jobs])
+        for job in jobs:
+            self._set_mapped_user(job)
+        return jobs
+
+    async def evaluate(self, job):
+        """Policy, risk and SPF lookup analysis; sets the row, plus the write plan when records need changing."""
+        if job.row is not None:
+            return job
+        zone, spf_records, dmarc_records = job.zone, job.spf_records, job.dmarc_records
+        domain, zone_id = zone['name'], zone['id']
+        with log_context(zone_id=zone_id, domain=domain):
+            with metrics.timer("stage_seconds", stage="evaluate"), log_context(stage="evaluate"):
+                policy, spf_action, dmarc_action = evaluate_zone(domain, spf_records, dmarc_records, config.CREATE_MISSING_DMARC)
+            new_spf, new_dmarc = policy['new spf[updated]'], policy['new dmarc[updated]']
+
+            res_details = {
+                "domain": domain, "mapped user": job.mapped_user, **policy, "zone_id": zone_id,
+                # Not report columns; kept for the state store
+                "spf_record_id": spf_records[0].id if spf_records else None,
+                "dmarc_record_id": dmarc_records[0].id if dmarc_records else None,
+                "fingerprint": job.fp, "zone_modified_on": zone.get('modified_on'),
+            }
+            if self.spf_analyzer and len(spf_records) == 1:
+                # Shared include cache: the common provider chains are resolved once per run
+                with metrics.timer("stage_seconds", stage="spf_analysis"), log_context(stage="spf_analysis"):
+                    res_details.update((await self.spf_analyzer.analyze(domain, spf_records[0].content)).report_fields())
             else:
-                res_details['spf status'] = "Update Failed"
-                logger.error(f"❌ SPF Update FAILED for {domain}")
-    
-    # Apply DMARC Update with Verification and Tagging
-    if new_dmarc != raw_dmarc:
-        dmarc_risk = [r for r in risk_list if "DMARC" in r]
-        if dmarc_risk:
-            res_details['dmarc status'] = f"Skipped ({dmarc_risk[0]})"
-        elif dry_run:
-            res_details['dmarc status'] = "Dry Run: Would Update"
+                res_details.update(NOT_ANALYZED)
+            job.row = res_details
+            # SPF and DMARC changes for the zone go out together in one atomic batch request
+            patches, posts, planned = [], [], []
+            # Before/after of every record touched, for the change journal
+            journaled = []
+
+            if spf_action:
+                if self.dry_run:
+                    res_details['spf status'] = DRY_RUN_STATUS[spf_action]
+                else:
+                    zone_logger.info("📤 Updating SPF for %s: %s -> %s", domain, policy['previous spf'], new_spf)
+                    patches.append({"id": spf_records[0].id, "content": new_spf, "comment": "Updated by Automation"})
+                    journaled.append({"op": "update", "record_id": spf_records[0].id, "type": "TXT", "name": spf_records[0].name,
+                                      "before": policy['previous spf'], "after": new_spf})
+                    planned.append(("spf status", "SPF", "patches", len(patches) - 1, new_spf))
+
+            if dmarc_action:
+                if self.dry_run:
+                    res_details['dmarc status'] = DRY_RUN_STATUS[dmarc_action]
+                elif dmarc_action == "create":
+                    zone_logger.info("📤 Creating DMARC for %s: %s", domain, new_dmarc)
+                    posts.append({"type": "TXT", "name": f"_dmarc.{domain}", "content": new_dmarc, "ttl": 1, "comment": "Created by Automation"})
+                    journaled.append({"op": "create", "type": "TXT", "name": f"_dmarc.{domain}", "after": new_dmarc})
+                    planned.append(("dmarc status", "DMARC", "posts", len(posts) - 1, new_dmarc))
+                else:
+                    zone_logger.info("📤 Updating DMARC for %s: %s -> %s", domain, policy['previous dmarc'], new_dmarc)
+                    patches.append({"id": dmarc_records[0].id, "content": new_dmarc, "comment": "Updated by Automation"})
+                    journaled.append({"op": "update", "record_id": dmarc_records[0].id, "type": "TXT", "name": dmarc_records[0].name,
+                                      "before": policy['previous dmarc'], "after": new_dmarc})
+                    planned.append(("dmarc status", "DMARC", "patches", len(patches) - 1, new_dmarc))
+            if planned:
+                job.plan = (patches, posts, planned, journaled)
+        return job
+
+    async def write(self, job):
+        """Send the planned writes; returns the row, or None once it is handed to the verifier."""
+        if not job.plan:
+            return job.row
+        patches, posts, planned, journaled = job.plan
+        res_details, domain, zone_id = job.row, job.zone['name'], job.zone['id']
+        with log_context(zone_id=zone_id, domain=domain):
+            if self.checkpoint:
+                self.checkpoint.write_started(zone_id, domain, patches, posts)
+            if self.journal:
+                # Write-ahead: the intent is on disk before the request goes out
+                self.journal.intent(zone_id, domain, journaled)
+            with metrics.timer("stage_seconds", stage="write"), log_context(stage="write"):
+                result = await self.client.batch_dns_records(zone_id, patches=patches, posts=posts)
+            if self.journal:
+                self.journal.outcome(zone_id, result is not None, [p.get('id') for p in (result or {}).get('posts') or []])
+            if self.checkpoint:
+                self.checkpoint.write_finished(zone_id)
+
+            checks = []
+            for status_key, label, op, index, expected in planned:
+                applied = (result or {}).get(op) or []
+                if index < len(applied) and applied[index].get('id'):
+                    if op == "posts":
+                        res_details['dmarc_record_id'] = applied[index]['id']
+                    # Verified later by the Verifier stage so this worker can move on
+                    res_details[status_key] = "Pending Verification"
+                    checks.append(VerifyCheck(status_key, applied[index]['id'], expected, label,
+                                              "Created" if op == "posts" else "Updated"))
+                else:
+                    res_details[status_key] = "Update Failed"
+                    zone_logger.error("❌ %s Update FAILED for %s", label, domain)
+
+        if checks:
+            await self.verifier.submit(domain, zone_id, res_details, checks)
+            return None
+        return res_details
+
+def worker_count(tokens=1):
+    # With adaptive concurrency the API limit is the real throttle, so keep enough zones in progress to reach its ceiling
+    if config.ADAPTIVE_CONCURRENCY:
+        return max(config.MAX_WORKERS, config.AIMD_MAX_IN_FLIGHT) * tokens
+    return config.MAX_WORKERS * tokens
+
+def build_pipeline(processor, tokens=1):
+    """
+    Bulk runs: one stage per step, each with its own workers and bounded input queue, so reads can
+    use the whole read budget while writes stay at a few in flight.
+    """
+    workers = worker_count(tokens)
+    return StagedPipeline([
+        Stage("fetch", processor.fetch, config.FETCH_WORKERS * tokens if config.FETCH_WORKERS else workers),
+        # pymongo blocks a thread per query, so one worker resolves a whole batch at a time
+        Stage("user_mapping", processor.map_users, 1, batch=config.USER_MAPPING_BATCH),
+        Stage("evaluate", processor.evaluate, config.EVALUATE_WORKERS * tokens if config.EVALUATE_WORKERS else workers),
+        Stage("write", processor.write, (config.WRITE_WORKERS or config.MAX_WORKERS) * tokens),
+    ], queue_size=config.STAGE_QUEUE_SIZE, progress_interval=config.PIPELINE_PROGRESS_INTERVAL)
+
+def build_client(shard=None):
+    """A client for CLOUDFLARE_API_TOKEN, or a ClientPool when several tokens are configured."""
+    # No token at all only happens off the CLI (validate() requires one); keep the single-client behaviour
+    tokens = config.CLOUDFLARE_API_TOKENS or [config.CLOUDFLARE_API_TOKEN]
+    limiters = []
+    for _ in tokens:
+        limiter = None
+        if shard:
+            # Shards are assumed to share the tokens, so each paces itself at 1/N of every budget
+            limiter = TokenBucket(config.RATE_LIMIT_REQUESTS / shard.count, config.RATE_LIMIT_WINDOW,
+                                  utilization=config.RATE_LIMIT_UTILIZATION, burst=config.RATE_LIMIT_BURST)
+        limiters.append(limiter)
+    if len(tokens) > 1:
+        logger.info(f"🔑 Pooling {len(tokens)} API tokens")
+        return ClientPool.from_tokens(tokens, limiters)
+    return CloudflareClient(tokens[0], limiter=limiters[0])
+
+def build_spf_analyzer():
+    if not config.SPF_ANALYSIS:
+        return None
+    return SpfAnalyzer(DohResolver(config.SPF_RESOLVER_URL, timeout=config.SPF_RESOLVER_TIMEOUT,
+                                   concurrency=config.SPF_RESOLVER_CONCURRENCY))
+
+def find_checkpoint(args):
+    """Checkpoint to resume: the one for --report-name if given, else the newest in REPORTS_DIR."""
+    if args.report_name:
+        path = checkpoint_path_for(shard_path(args.report_name, args.shard))
+        return path if os.path.exists(path) else None
+    return latest_checkpoint(config.REPORTS_DIR, args.shard.suffix if args.shard else "")
+
+def is_trackable(res):
+    # Track if either record was Updated OR No Change Needed (meaning we checked it and it's done)
+    # We avoid tracking 'Skipped' or 'Error' statuses so they can be retried.
+    trackable_statuses = ["Updated", "Created", "No Change Needed"]
+    return res.get('spf status') in trackable_statuses or res.get('dmarc status') in trackable_statuses
+
+def res_outcome(res):
+    """Coarse label for the zones_processed_total metric."""
+    if res.get('reused'):
+        return "reused"
+    if res.get('risk') == "API Fetch Error":
+        return "api_error"
+    if res.get('risk', '').startswith("Unhandled Error"):
+        return "error"
+    statuses = (res.get('spf status', ''), res.get('dmarc status', ''))
+    if any(s in ("Updated", "Created") for s in statuses):
+        return "changed"
+    if any("Failed" in s for s in statuses):
+        return "failed"
+    return "checked"
+
+def read_domain_names(path):
+    """Domain names from `path` ("-" for stdin): whitespace/comma separated, `#` comments, duplicates dropped."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        names = {}
+        for line in f:
+            for name in line.split("#", 1)[0].replace(",", " ").split():
+                names.setdefault(name.lower().rstrip("."), None)
+        return list(names)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+async def resolve_zones(cf_client, names, concurrency):
+    """Look up the zones named in `names`, `concurrency` at a time; returns (zones, names not found)."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(name):
+        async with semaphore:
+            return await cf_client.get_zone_by_name(name)
+
+    with metrics.timer("stage_seconds", stage="resolve"):
+        found = await asyncio.gather(*(lookup(name) for name in names))
+    return [zone for zone in found if zone], [name for name, zone in zip(names, found) if not zone]
+
+async def listed_pages(cf_client, state, shard=None, cursor=None):
+    """
+    Unprocessed zones (of this shard, if any) straight from /zones, one API page at a time,
+    as (cursor, next_cursor, zones) batches.
+    """
+    start_page = (cursor or {}).get('page', 1)
+    async for page, zones_on_page, result_info in cf_client.iter_zone_pages(start_page=start_page):
+        if shard:
+            zones_on_page = [z for z in zones_on_page if shard.owns(z['id'])]
+        # Filter out already processed domains (one indexed query per page)
+        done = state.done_among(z['name'] for z in zones_on_page)
+        batch_to_process = [z for z in zones_on_page if z['name'].lower() not in done]
+        if not batch_to_process:
+            logger.info(f"⏭️ Skipping page {page} - all domains already processed.")
+            continue
+        logger.info(f"📦 Queueing Page {page}/{result_info.get('total_pages', '?')}: {len(batch_to_process)} domains")
+        yield {'page': page}, {'page': page + 1}, batch_to_process
+
+async def inventory_pages(inventory, shard=None, cursor=None):
+    """Unprocessed zones planned from the local zone inventory (no /zones calls)."""
+    after = (cursor or {}).get('after', "")
+    for batch, (batch_after, next_after, zones) in enumerate(inventory.pending_pages(shard, after=after), start=1):
+        logger.info(f"📦 Queueing Batch {batch}: {len(zones)} domains")
+        yield {'after': batch_after}, {'after': next_after}, zones
+
+async def iter_pending_zones(pages, limit=None, checkpoint=None):
+    """
+    Streams zones from `pages` ((cursor, next_cursor, zones) batches), stopping once `limit`
+    zones have been handed out. With a checkpoint, zones finished by an earlier attempt are skipped.
+    """
+    handed_out = 0
+    async for cursor, next_cursor, batch_to_process in pages:
+        if checkpoint:
+            batch_to_process = checkpoint.begin_batch(cursor, next_cursor, batch_to_process)
+            if not batch_to_process:
+                continue
+        for zone in batch_to_process:
+            yield zone
+            handed_out += 1
+            if limit and handed_out >= limit:
+                logger.info(f"🛑 Reached total limit of {limit} domains.")
+                return
+    if checkpoint:
+        checkpoint.listed = True
+
+async def run(args, cf_client=None, mongo_client=None):
+    """Run the pipeline; `cf_client` / `mongo_client` can be injected (benchmark.py, mocks)."""
+    dry_run = not args.apply
+    shard = args.shard
+    targeted = bool(args.domain or args.domains_file)
+    bulk = not (targeted or args.retry_status)
+    checkpoint_file = find_checkpoint(args) if args.resume and bulk else None
+    if checkpoint_file:
+        settings = RunCheckpoint.read_settings(checkpoint_file)
+        if settings.get('dry_run') != dry_run:
+            logger.warning(f"⚠️ Resuming a {'DRY RUN' if settings.get('dry_run') else 'LIVE'} run; --apply is taken from the checkpoint.")
+            dry_run = settings.get('dry_run')
+        base_report = settings['report_path']
+        run_id = settings.get('run_id') or config.RUN_ID or new_run_id()
+    else:
+        if args.resume and bulk:
+            logger.warning("⚠️ No checkpoint found to resume; starting a new run.")
+        # Use custom name if provided, else generate timestamped one in reports/ folder
+        base_report = args.report_name if args.report_name else config.get_report_path()
+        run_id = config.RUN_ID or new_run_id()
+    # Each shard owns its report and tracking database, so shards never touch each other's files
+    report_path = shard_path(base_report, shard)
+    if shard:
+        logger.info(f"🧩 Shard {shard}: report {report_path}, state {shard_path(config.STATE_DB_PATH, shard)}")
+
+    if cf_client is None:
+        cf_client = build_client(shard)
+    workers = worker_count(len(cf_client.members))
+    mongo_client = mongo_client if mongo_client is not None else get_mongo_client()
+    user_mapping = UserMapping(mongo_client)
+    state = StateStore(shard_path(config.STATE_DB_PATH, shard), flush_size=config.STATE_FLUSH_SIZE)
+    report = ReportWriter(report_path, flush_every=config.BATCH_SIZE, append=bool(checkpoint_file))
+    checkpoint = None
+    if checkpoint_file:
+        checkpoint = RunCheckpoint.load(checkpoint_file, report)
+    elif bulk:
+        checkpoint = RunCheckpoint(checkpoint_path_for(report_path), report,
+                                   {"report_path": base_report, "dry_run": dry_run, "run_id": run_id})
+    changes = ChangeDetector(state, dry_run, enabled=not args.full, max_age_hours=config.INCREMENTAL_MAX_AGE_HOURS,
+                             policy=policy_version(create_missing_dmarc=config.CREATE_MISSING_DMARC,
+                                                   spf_analysis=config.SPF_ANALYSIS),
+                             trust_modified_on=args.trust_modified_on or config.TRUST_ZONE_MODIFIED_ON)
+    metrics.reset()
+    for member in cf_client.members:
+        metrics.gauge_fn("rate_limiter_wait_seconds", lambda m=member: m.limiter.wait_seconds, **member.metric_labels)
+        metrics.gauge_fn("rate_limiter_tokens_spent", lambda m=member: m.limiter.tokens_spent, **member.metric_labels)
+    spf_analyzer = build_spf_analyzer()
+    journal = None if dry_run else ChangeJournal(shard_path(config.CHANGE_JOURNAL_PATH, shard), run_id)
+    if journal:
+        logger.info(f"🧾 Run ID {run_id}: writes are journaled to {journal.path}")
+    exporter = MetricsExporter(metrics, port=config.METRICS_PORT, textfile=config.METRICS_TEXTFILE, interval=config.METRICS_INTERVAL)
+    loop = asyncio.get_event_loop()
+
+    try:
+        await cf_client.open()
+        if spf_analyzer:
+            await spf_analyzer.open()
+        await exporter.start()
+        state.import_csv(config.TRACKING_CSV_PATH)
+
+        def should_track(res):
+            if targeted:
+                # Targeted runs only record domains that were actually changed
+                return res.get('spf status') == "Updated" or res.get('dmarc status') in ("Updated", "Created")
+            return is_trackable(res)
+
+        def on_result(res):
+            # Rows stream straight to the report checkpoint; nothing is kept in memory
+            report.write(res)
+            metrics.inc("zones_processed_total", outcome=res_outcome(res))
+            if checkpoint:
+                checkpoint.zone_done(res['zone_id'])
+            if res.get('reused') or args.no_track:
+                return
+            changes.remember(res['zone_id'], res['domain'], res.get('zone_modified_on'), res.get('fingerprint'), res)
+            if not dry_run:
+                state.record(res, done=should_track(res))
+
+        # Rows with pending writes reach on_result through the verifier once their checks settle
+        verifier = Verifier(cf_client, on_result)
+        verifier.start()
+
+        if targeted:
+            # Named domains: resolve every zone concurrently, then process them like any other batch
+            names = [args.domain] if args.domain else read_domain_names(args.domains_file)
+            if args.limit:
+                names = names[:args.limit]
+            zones, missing = await resolve_zones(cf_client, names, workers)
+            for name in missing:
+                logger.error(f"❌ Domain {name} not found.")
+            if not zones:
+                return
+
+            logger.info(f"📦 Processing {len(zones)} targeted domain(s)" + (f" ({len(missing)} not found)" if missing else ""))
+            await loop.run_in_executor(None, user_mapping.prefetch, [z['name'] for z in zones])
+            processor = ZoneProcessor(cf_client, state, user_mapping, dry_run, verifier, changes,
+                                      spf_analyzer=spf_analyzer, journal=journal)
+            scheduler = ZoneScheduler(workers)
+            await scheduler.run(zones, processor.process, on_result, processor.failed)
+
+        elif args.retry_status:
+            # Re-run only domains whose last recorded SPF or DMARC status matches
+            targets = [{'id': zone_id, 'name': domain} for domain, zone_id in state.with_status(args.retry_status) if zone_id]
+            logger.info(f"🔁 Retrying {len(targets)} domains with status '{args.retry_status}'")
+            await loop.run_in_executor(None, user_mapping.prefetch, [z['name'] for z in targets])
+            # Explicit retries ignore the done flag (a zone is "done" once either record is settled) and previous scans
+            processor = ZoneProcessor(cf_client, set(), user_mapping, dry_run, verifier,
+                                      spf_analyzer=spf_analyzer, journal=journal)
+            scheduler = ZoneScheduler(workers)
+            await scheduler.run(targets[:args.limit] if args.limit else targets, processor.process, on_result,
+                                processor.failed)
+
         else:
-            existing_id = dmarc_records[0]['id']
-            existing_name = dmarc_records[0]['name']
-            logger.info(f"📤 Updating DMARC for {domain}: {raw_dmarc} -> {new_dmarc}")
-            success = client.update_dns_record(
-                zone_id, 
-                existing_id, 
-                "TXT", 
-                existing_name, 
-                new_dmarc, 
-                comment="Updated by Automation"
-            )
-            if success:
-                # IMMEDIATE VERIFICATION WITH RETRY
-                verified = False
-                for attempt in range(3):
-                    time.sleep(2) # Wait for propagation
-                    verification_records = client.get_dns_records(zone_id, "TXT")
-                    if verification_records:
-                        match = next((r for r in verification_records if r['id'] == existing_id), None)
-                        if match and match['content'] == new_dmarc:
-                            res_details['dmarc status'] = "Updated"
-                            logger.info(f"✅ DMARC Verified and Tagged for {domain}")
-                            verified = True
-                            break
-                    logger.warning(f"⚠️ DMARC Verification attempt {attempt+1} failed for {domain}...")
-
-                if not verified:
-                    if verification_records is None:
-                        res_details['dmarc status'] = "Updated (Verification Failed - API Timeout)"
-                        logger.warning(f"⚠️ DMARC Verification skipped for {domain} due to API Timeout.")
-                    else:
-                        res_details['dmarc status'] = "Update Failed (Verification Failed)"
-                        logger.error(f"❌ DMARC Verification FAILED for {domain} - Content unchanged after update.")
+            # Multi-domain bulk processing: listing -> fetch -> user mapping -> evaluate -> write (-> verifier)
+            if config.USER_MAPPING_PRELOAD:
+                await loop.run_in_executor(None, user_mapping.load_all)
+
+            if config.ZONE_INVENTORY:
+                # Plan the run from the local zone index; only zones changed since the last run are listed
+                inventory = ZoneInventory(state, full_refresh_hours=config.INVENTORY_FULL_REFRESH_HOURS)
+                cf_client.inventory = inventory
+                await inventory.refresh(cf_client, full=args.refresh_inventory)
+                logger.info(f"🗂️ Zone inventory: {len(inventory)} zones, {inventory.pending_count()} not yet done")
+                pages = inventory_pages(inventory, shard, checkpoint.cursor)
             else:
-                res_details['dmarc status'] = "Update Failed"
-                logger.error(f"❌ DMARC Update FAILED for {domain}")
-        
-    return res_details
+                pages = listed_pages(cf_client, state, shard, checkpoint.cursor)
 
-import time
+            logger.info("📡 Starting streaming zone fetch and process cycle...")
+            processor = ZoneProcessor(cf_client, state, user_mapping, dry_run, verifier, changes, checkpoint,
+                                      spf_analyzer, journal)
+            pipeline = build_pipeline(processor, len(cf_client.members))
+            await pipeline.run(iter_pending_zones(pages, args.limit, checkpoint), on_result, processor.failed)
 
-def main():
+        await verifier.join()
+
+        report.close()
+        if checkpoint and checkpoint.listed:
+            checkpoint.finish()
+        elif checkpoint:
+            logger.info(f"📌 Run stopped before the end of the zone list; continue it with --resume ({checkpoint.path})")
+        logger.info(f"✨ Process complete. Total domains handled in this run: {report.rows}")
+        for member in cf_client.members:
+            token = f" (token {member.token_id})" if len(cf_client.members) > 1 else ""
+            logger.info(f"⏱️ Rate limiter{token}: {member.limiter.stats()}")
+            logger.info(f"🎚️ Concurrency{token}: " + ", ".join(f"{name}={int(c.limit)}" for name, c in member.concurrency.items()))
+        if changes.enabled:
+            logger.info(f"♻️ Incremental: {changes.stats()}")
+        if spf_analyzer:
+            logger.info(f"🔗 SPF analysis: {spf_analyzer.stats()}")
+        if journal and journal.writes:
+            logger.info(f"🧾 {journal.writes} zone writes journaled; undo them with: python main.py --rollback {run_id} --apply")
+        logger.info("📈 Run metrics:\n" + metrics.summary())
+        return report.rows
+
+    finally:
+        await exporter.stop()
+        await cf_client.close()
+        if spf_analyzer:
+            await spf_analyzer.close()
+        if journal:
+            journal.close()
+        # No-op after a clean finish; otherwise still turns the checkpoint into a report
+        report.close()
+        state.close()
+        if mongo_client: mongo_client.close()
+
+def run_offline(args, mongo_client=None):
+    """Audit zone exports in `args.offline` into the usual report (no API calls, no state changes)."""
+    from offline_audit import audit_exports
+    report_path = args.report_name if args.report_name else config.get_report_path()
+    mongo_client = mongo_client if mongo_client is not None else get_mongo_client()
+    user_mapping = UserMapping(mongo_client)
+    report = ReportWriter(report_path, flush_every=config.BATCH_SIZE)
+    metrics.reset()
+    try:
+        if config.USER_MAPPING_PRELOAD:
+            user_mapping.load_all()
+        with metrics.timer("stage_seconds", stage="offline_audit"):
+            handled = audit_exports(
+                args.offline, report, user_mapping, workers=config.AUDIT_WORKERS, limit=args.limit,
+                create_missing_dmarc=config.CREATE_MISSING_DMARC, batch_size=config.BATCH_SIZE,
+                on_row=lambda res: metrics.inc("zones_processed_total", outcome=res_outcome(res))
+            )
+        report.close()
+        logger.info(f"✨ Offline audit complete. Total domains handled: {handled}")
+        logger.info("📈 Run metrics:\n" + metrics.summary())
+        return handled
+    finally:
+        report.close()
+        if mongo_client: mongo_client.close()
+
+async def run_rollback(args, cf_client=None):
+    """Undo the journaled writes of run `args.rollback` (a dry run unless --apply); returns the rows reported."""
+    dry_run = not args.apply
+    zones = read_run(journal_paths(config.CHANGE_JOURNAL_PATH), args.rollback)
+    if not zones:
+        logger.error(f"❌ No writes journaled for run {args.rollback} in {config.CHANGE_JOURNAL_PATH}")
+        for run_id, started, count in list_runs(journal_paths(config.CHANGE_JOURNAL_PATH))[-10:]:
+            logger.info(f"   run {run_id}: {count} zones, started {datetime.fromtimestamp(started):%Y-%m-%d %H:%M:%S}")
+        return 0
+    logger.info(f"⏪ {'[DRY RUN] ' if dry_run else ''}Rolling back run {args.rollback}: {len(zones)} zones")
+
+    os.makedirs(config.REPORTS_DIR, exist_ok=True)
+    report_path = args.report_name or os.path.join(config.REPORTS_DIR, f"rollback_{args.rollback}.xlsx")
+    if cf_client is None:
+        cf_client = build_client()
+    # The rollback's own writes are journaled under a fresh run ID (never RUN_ID, which would merge them
+    # into a forward run of that ID), so it can be undone in turn
+    journal = None if dry_run else ChangeJournal(config.CHANGE_JOURNAL_PATH, new_run_id())
+    report = ReportWriter(report_path, columns=ROLLBACK_COLUMNS, flush_every=config.BATCH_SIZE)
+    metrics.reset()
+
+    def on_result(rows):
+        for row in rows:
+            report.write(row)
+            metrics.inc("rollback_changes_total", status=row['status'].split(" (")[0])
+
+    try:
+        await cf_client.open()
+        targets = [{'id': zone_id, 'name': entry['domain'], 'entry': entry} for zone_id, entry in zones.items()]
+        scheduler = ZoneScheduler(worker_count(len(cf_client.members)))
+        await scheduler.run(
+            targets[:args.limit] if args.limit else targets,
+            lambda zone: rollback_zone(cf_client, zone['id'], zone['entry'], dry_run, journal),
+            on_result
+        )
+        report.close()
+        logger.info(f"✨ Rollback complete: {report.rows} changes reviewed")
+        if journal and journal.writes:
+            logger.info(f"🧾 Rollback writes journaled as run {journal.run_id}")
+        logger.info("📈 Run metrics:\n" + metrics.summary())
+        return report.rows
+    finally:
+        await cf_client.close()
+        report.close()
+        if journal:
+            journal.close()
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Cloudflare DNS Automation Pipeline")
     parser.add_argument("--apply", action="store_true", help="Apply changes to Cloudflare")
     parser.add_argument("--limit", type=int, help="Limit total processing to N domains")
     parser.add_argument("--report-name", type=str, help="Custom report filename (Excel)")
-    parser.add_argument("--no-track", action="store_true", help="Do not update the tracking CSV")
+    parser.add_argument("--no-track", action="store_true", help="Do not update the tracking state store")
     parser.add_argument("--domain", type=str, help="Process only this specific domain")
-    args = parser.parse_args()
-    
-    dry_run = not args.apply
-    # Use custom name if provided, else generate timestamped one in reports/ folder
-    report_path = args.report_name if args.report_name else config.get_report_path()
-    
-    logger.info(f"🚀 Starting automation in {'DRY RUN' if dry_run else 'LIVE'} mode...")
+    parser.add_argument("--domains-file", type=str, metavar="PATH", help="Process only the domains listed in PATH ('-' reads stdin)")
+    parser.add_argument("--full", action="store_true", help="Ignore previous scans and re-evaluate every zone")
+    parser.add_argument("--trust-modified-on", action="store_true",
+                        help="Reuse the last result of zones whose modified_on is unchanged without reading their records "
+                             "(zone modified_on may not change when DNS records are edited, so this can hide record edits)")
+    parser.add_argument("--retry-status", type=str, help="Re-process domains whose last SPF/DMARC status was this (e.g. 'Update Failed')")
+    parser.add_argument("--resume", action="store_true", help="Continue the last interrupted bulk run (or the one for --report-name) from its checkpoint")
+    parser.add_argument("--refresh-inventory", action="store_true", help="Re-list every zone instead of a delta refresh of the local zone inventory")
+    parser.add_argument("--shard", type=_shard_arg, help="Process only shard i of N (e.g. 2/4); state and report get a .shard-i-of-N suffix")
+    parser.add_argument("--shards", type=int, help="Run N shards as local processes, then merge their reports (--limit applies per shard)")
+    parser.add_argument("--merge", nargs="+", metavar="REPORT", help="Merge shard reports into --report-name and exit")
+    parser.add_argument("--rollback", type=str, metavar="RUN_ID", help="Undo the journaled writes of a run (dry run unless --apply)")
+    parser.add_argument("--offline", type=str, metavar="DIR", help="Audit BIND/JSON zone exports in DIR without any API calls")
+    return parser
+
+def _shard_arg(value):
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def main():
+    args = build_parser().parse_args()
+
+    if args.merge:
+        merge_reports(args.merge, args.report_name or config.get_report_path())
+        return
+
+    if args.offline:
+        if args.apply:
+            logger.error("--offline only audits; it can't be combined with --apply"); return
+        logger.info(f"📴 Starting offline audit of {args.offline}...")
+        run_offline(args)
+        return
+
+    logger.info(f"🚀 Starting automation in {'DRY RUN' if not args.apply else 'LIVE'} mode...")
     if args.domain: logger.info(f"🎯 Target domain: {args.domain}")
+    if args.domains_file: logger.info(f"🎯 Target domains from {'stdin' if args.domains_file == '-' else args.domains_file}")
 
     try: config.validate()
     except ValueError as e:
         logger.error(f"Config error: {e}"); return
 
-    cf_client = CloudflareClient(config.CLOUDFLARE_API_TOKEN)
-    mongo_client = get_mongo_client()
-    
-    try:
-        processed_domains = load_processed_domains()
-        total_processed_in_run = 0
-        all_results = []
-        
-        if args.domain:
-            # Single domain processing
-            url = f"{cf_client.base_url}/zones"
-            params = {"name": args.domain}
-            resp = cf_client.session.get(url, params=params)
-            resp.raise_for_status()
-            zones = resp.json().get('result', [])
-            if not zones:
-                logger.error(f"❌ Domain {args.domain} not found.")
-                return
-            
-            logger.info(f"📦 Processing Single Domain: {args.domain}")
-            # Execute immediately for single domain
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(process_domain, cf_client, zones[0], processed_domains, mongo_client, dry_run)
-                res = future.result()
-                if res:
-                    all_results.append(res)
-                    if not dry_run and not args.no_track and (res.get('spf status') == "Updated" or res.get('dmarc status') == "Updated"):
-                        save_processed_domain(res['domain'])
-                        processed_domains.add(res['domain'].lower())
-
-        else:
-            # Multi-domain bulk processing
-            logger.info("📡 Starting paginated zone fetch and process cycle...")
-            page = 1
-            while True:
-                # Fetch a page of zones (default 50 per page from Cloudflare)
-                # Retry logic for page fetching
-                retries = 3
-                zones_on_page = None
-                result_info = None
-
-                for attempt in range(retries):
-                    zones_on_page, result_info = cf_client.fetch_page(f"{cf_client.base_url}/zones", page)
-                    if zones_on_page is not None:
-                        break
-                    logger.warning(f"⚠️ Page {page} fetch failed. Retrying ({attempt + 1}/{retries})...")
-                    time.sleep(5) # Wait before retry
-                
-                if zones_on_page is None:
-                    logger.error(f"❌ Failed to fetch page {page} after {retries} attempts. Stopping pagination safely.")
-                    break
-
-                if not zones_on_page:
-                    # Empty list means we reached the end
-                    break
-                
-                # Filter out already processed domains
-                batch_to_process = [z for z in zones_on_page if z['name'].lower() not in processed_domains]
-                
-                if batch_to_process:
-                    logger.info(f"📦 Processing Batch (Page {page}): {len(batch_to_process)} domains")
-                    
-                    batch_results = []
-                    with ThreadPoolExecutor(max_workers=config.MAX_WORKERS) as executor:
-                        futures = {executor.submit(process_domain, cf_client, zone, processed_domains, mongo_client, dry_run): zone for zone in batch_to_process}
-                        for future in as_completed(futures):
-                            res = future.result()
-                            if res:
-                                batch_results.append(res)
-                                # Global tracking
-                                spf_final = res.get('spf status', '')
-                                dmarc_final = res.get('dmarc status', '')
-                                trackable_statuses = ["Updated", "No Change Needed"]
-                                
-                                if not dry_run and not args.no_track:
-                                    # Track if either record was Updated OR No Change Needed (meaning we checked it and it's done)
-                                    # We avoid tracking 'Skipped' or 'Error' statuses so they can be retried.
-                                    if (spf_final in trackable_statuses or dmarc_final in trackable_statuses):
-                                        save_processed_domain(res['domain'])
-                                        processed_domains.add(res['domain'].lower())
-                    
-                    all_results.extend(batch_results)
-                    total_processed_in_run += len(batch_to_process)
-                    
-                    # SAVE REPORT INCREMENTALLY
-                    if all_results:
-                        try:
-                            generate_report(all_results, report_path)
-                            logger.info(f"💾 Report saved (Partial): {len(all_results)} updates -> {report_path}")
-                        except Exception as e:
-                            logger.error(f"Error saving incremental report: {e}")
-
-                    # Check limit
-                    if args.limit and total_processed_in_run >= args.limit:
-                        logger.info(f"🛑 Reached total limit of {args.limit} domains.")
-                        break
-                    
-                    # Cooldown between batches if not the last page
-                    if page < result_info.get('total_pages', 0):
-                        logger.info(f"😴 Batch complete. Cooling down for {config.COOLDOWN_SLEEP}s...")
-                        time.sleep(config.COOLDOWN_SLEEP)
-                else:
-                    logger.info(f"⏭️ Skipping page {page} - all domains already processed.")
+    if args.rollback:
+        asyncio.run(run_rollback(args))
+        return
 
-                if page >= result_info.get('total_pages', 0):
-                    break
-                page += 1
+    if args.shards and args.shards > 1 and not args.shard:
+        if args.resume and not args.report_name:
+            logger.error("--resume with --shards needs the original --report-name"); return
+        # Children share one report name; each writes its own .shard-i-of-N report, merged here
+        report_path = args.report_name or config.get_report_path()
+        # One run ID for the whole sharded run, so a single --rollback undoes every shard
+        os.environ.setdefault("RUN_ID", new_run_id())
+        reports, failed = run_local_shards(args.shards, sys.argv[1:], report_path)
+        # Whatever the finished shards produced is still merged, but the run as a whole failed
+        merge_reports(reports, report_path)
+        if failed:
+            sys.exit(1)
+        return
 
-        if all_results:
-            generate_report(all_results, report_path)
-        logger.info(f"✨ Process complete. Total domains handled in this run: {len(all_results)}")
-        
-    finally:
-        if mongo_client: mongo_client.close()
+    asyncio.run(run(args))
 
 if __name__ == "__main__":
     main()
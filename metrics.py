@@ -0,0 +1,224 @@
+import asyncio
+import bisect
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; Prometheus defaults plus a couple of slow buckets for retried API calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PREFIX = "cf_automation_"
+
+def _key(name, labels):
+    # Label values are stringified so keys stay sortable (status=200 next to status="error")
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in labels)
+    return "{" + inner + "}"
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Bucket upper bound containing quantile q (what Prometheus' histogram_quantile approximates)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+class Metrics:
+    """
+    Minimal in-process metrics registry (counters, gauges, histograms with labels) that renders
+    the Prometheus text format. Everything runs on the event loop thread, so no locking.
+    """
+    def __init__(self):
+        self.help = {}
+        self.reset()
+
+    def reset(self):
+        """Start a fresh run (zones/sec is measured from here)."""
+        self.counters = {}
+        self.gauges = {}
+        self.gauge_fns = {}
+        self.histograms = {}
+        self.started_at = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[_key(name, labels)] = value
+
+    def gauge_fn(self, name, fn, **labels):
+        """Gauge sampled at export time (queue depths, busy workers)."""
+        self.gauge_fns[_key(name, labels)] = fn
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _key(name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = _Histogram(buckets)
+        hist.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def counter_total(self, name):
+        return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self.help:
+                lines.append(f"# HELP {PREFIX}{name} {self.help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_label_str(labels)} {value}")
+
+        gauges = dict(self.gauges)
+        for key, fn in self.gauge_fns.items():
+            try:
+                gauges[key] = fn()
+            except Exception:
+                continue
+        elapsed = time.monotonic() - self.started_at
+        gauges[("zones_per_second", ())] = self.counter_total("zones_processed_total") / elapsed if elapsed else 0.0
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{PREFIX}{name}{_label_str(labels)} {value}")
+
+        for (name, labels), hist in sorted(self.histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                cumulative += count
+                le = labels + (("le", str(bound)),)
+                lines.append(f"{PREFIX}{name}_bucket{_label_str(le)} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_label_str(labels)} {hist.sum}")
+            lines.append(f"{PREFIX}{name}_count{_label_str(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Atomic write for node_exporter's textfile collector."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def summary(self):
+        """Human-readable end-of-run table: per-histogram count / mean / p50 / p99, then counters."""
+        width = 72
+        rows = [f"{'metric':<{width}} {'count':>8} {'mean':>9} {'p50<=':>8} {'p99<=':>8}"]
+        for (name, labels), hist in sorted(self.histograms.items()):
+            label = name + _label_str(labels)
+            mean = hist.sum / hist.count if hist.count else 0.0
+            rows.append(f"{label[:width]:<{width}} {hist.count:>8} {mean:>9.3f} {hist.quantile(0.5):>8} {hist.quantile(0.99):>8}")
+        for (name, labels), value in sorted(self.counters.items()):
+            value = round(value, 2) if isinstance(value, float) else value
+            rows.append(f"{(name + _label_str(labels))[:width]:<{width}} {value:>8}")
+        elapsed = time.monotonic() - self.started_at
+        for (name, labels), workers in sorted(self.gauges.items()):
+            if name == "workers_total" and elapsed and workers:
+                busy = self.counters.get(("worker_busy_seconds_total", labels), 0)
+                rows.append(f"{'worker utilization' + _label_str(labels):<{width}} {busy / (elapsed * workers):>8.0%}")
+        for (name, labels), value in sorted(self.counters.items()):
+            if name == "stage_items_total" and elapsed:
+                rows.append(f"{'throughput/sec' + _label_str(labels):<{width}} {value / elapsed:>8.2f}")
+        zones = self.counter_total("zones_processed_total")
+        rows.append(f"{'zones/sec':<{width}} {zones / elapsed if elapsed else 0.0:>8.2f}")
+        return "\n".join(rows)
+
+class MetricsExporter:
+    """Serves /metrics over HTTP and/or rewrites a textfile every `interval` seconds during a run."""
+    def __init__(self, registry, port=None, textfile=None, interval=15):
+        self.registry = registry
+        self.port = port
+        self.textfile = textfile
+        self.interval = interval
+        self._runner = None
+        self._task = None
+
+    async def start(self):
+        if self.port:
+            from aiohttp import web
+
+            async def handle(request):
+                return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+            app = web.Application()
+            app.router.add_get("/metrics", handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, "0.0.0.0", self.port).start()
+            logger.info(f"📈 Metrics available on http://0.0.0.0:{self.port}/metrics")
+        if self.textfile:
+            self._task = asyncio.ensure_future(self._write_loop())
+
+    async def _write_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self._write()
+
+    def _write(self):
+        try:
+            self.registry.write_textfile(self.textfile)
+        except OSError as e:
+            logger.error(f"Error writing metrics textfile {self.textfile}: {e}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self.textfile:
+            self._write()
+        if self._runner:
+            await self._runner.cleanup()
+
+metrics = Metrics()
+metrics.describe("api_request_seconds", "Cloudflare API call latency by endpoint (successful attempts)")
+metrics.describe("api_requests_total", "Cloudflare API attempts by endpoint and HTTP status")
+metrics.describe("api_retries_total", "Retried Cloudflare API attempts by endpoint")
+metrics.describe("api_throttled_total", "429 responses by endpoint")
+metrics.describe("stage_seconds", "Time spent per pipeline stage")
+metrics.describe("queue_depth", "Items waiting in a pipeline queue")
+metrics.describe("worker_busy_seconds_total", "Seconds workers spent handling zones (utilization = rate / workers_total)")
+metrics.describe("workers_busy", "Workers currently handling a zone")
+metrics.describe("zones_processed_total", "Zones with a final result, by outcome")
+metrics.describe("zones_per_second", "Average zone throughput since the start of the run")
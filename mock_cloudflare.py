@@ -0,0 +1,437 @@
+"""
+Local stand-in for the parts of the Cloudflare v4 API this tool uses, for offline testing and
+benchmarking (see benchmark.py).
+
+    python mock_cloudflare.py --zones 1000 --port 8787 --latency 0.05 --jitter 0.05 --throttle-rate 0.01
+    CLOUDFLARE_API_BASE_URL=http://127.0.0.1:8787/client/v4 CLOUDFLARE_API_TOKEN=mock python main.py --apply
+
+Besides the data endpoints it can add per-request latency/jitter, inject 429s (with Retry-After)
+and 5xx errors, enforce a per-token request budget, and serve stale reads for a while after
+writes (eventual consistency). It also answers DNS-over-HTTPS JSON queries on /dns-query for
+the synthetic zones and the providers their SPF records include (SPF_RESOLVER_URL). `--export DIR` instead writes the synthetic zones as BIND or
+JSON exports for `main.py --offline DIR`.
+"""
+import argparse
+import asyncio
+import collections
+import copy
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/client/v4"
+# Synthetic zones are stable across mock restarts, so incremental runs can be exercised too
+SEED_TIME = "2024-01-01T00:00:00.000000Z"
+
+# Record mixes cycled across synthetic zones so every policy branch gets exercised
+SPF_VARIANTS = ["v=spf1 include:_spf.google.com -all", "v=spf1 a mx ~all", "v=spf1 ?all", None,
+                ["v=spf1 -all", "v=spf1 include:mailgun.org ~all"]]
+# Public DNS behind the includes above (served on /dns-query)
+PROVIDER_TXT = {
+    "_spf.google.com": "v=spf1 include:_netblocks.google.com include:_netblocks2.google.com include:_netblocks3.google.com ~all",
+    "_netblocks.google.com": "v=spf1 ip4:35.190.247.0/24 ip4:64.233.160.0/19 ip4:66.102.0.0/20 ~all",
+    "_netblocks2.google.com": "v=spf1 ip6:2001:4860:4000::/36 ip6:2404:6800:4000::/36 ~all",
+    "_netblocks3.google.com": "v=spf1 ip4:172.217.0.0/19 ip4:172.217.32.0/20 ~all",
+    "mailgun.org": "v=spf1 include:_spf.mailgun.org ~all",
+    "_spf.mailgun.org": "v=spf1 ip4:209.61.151.0/24 ip4:166.78.68.0/22 ~all",
+}
+DNS_TTL = 300
+DMARC_VARIANTS = ["v=DMARC1; p=none; rua=reports@example.net", "v=DMARC1; p=reject; rua=mailto:d@example.net",
+                  None, "v=DMARC1; p=quarantine; pct=50"]
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def _envelope(result, result_info=None, success=True, errors=None, status=200):
+    body = {"success": success, "errors": errors or [], "messages": [], "result": result}
+    if result_info is not None:
+        body["result_info"] = result_info
+    return web.json_response(body, status=status)
+
+def _error(status, message):
+    return _envelope(None, success=False, errors=[{"code": status, "message": message}], status=status)
+
+def _bind_txt(content):
+    """TXT content as quoted BIND character-strings (255 bytes max each)."""
+    escaped = [content[i:i + 255].replace("\\", "\\\\").replace('"', '\\"') for i in range(0, max(len(content), 1), 255)]
+    return " ".join(f'"{chunk}"' for chunk in escaped)
+
+def _paginate(items, query, default_per_page):
+    page = max(1, int(query.get("page", 1)))
+    per_page = max(1, int(query.get("per_page", default_per_page)))
+    total_pages = (len(items) + per_page - 1) // per_page
+    chunk = items[(page - 1) * per_page: page * per_page]
+    return chunk, {"page": page, "per_page": per_page, "count": len(chunk),
+                   "total_count": len(items), "total_pages": total_pages}
+
+class MockCloudflare:
+    """In-memory account with synthetic zones; `make_app()` serves it over the v4 API shapes."""
+    def __init__(self, zone_count=100, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, consistency_delay=0.0, rate_limit=None, rate_window=300, lost_response_rate=0.0,
+                 accounts=1, seed=0, reject_zone_order=False):
+        self._ids = itertools.count(1)
+        self.zones = []
+        self.records = {}
+        # Zones are spread round-robin over `accounts`; a token containing "account-<k>" only sees account k
+        self.accounts = accounts
+        self.zone_account = {}
+        self.zone_by_name = {}
+        # Apex A / MX answers on /dns-query; every 7th zone has none (void lookups for `a` / `mx`)
+        self.hosts = {}
+        for i in range(zone_count):
+            self._add_zone(i)
+
+        # Fault injection / realism knobs
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.consistency_delay = consistency_delay
+        # Writes that are applied but answered with a 502 (the response got lost on the way back)
+        self.lost_response_rate = lost_response_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        # Answer /zones?order=... with a 400, like an API that doesn't support the ordering
+        self.reject_zone_order = reject_zone_order
+        self._random = random.Random(seed)
+        self._token_hits = collections.defaultdict(collections.deque)
+        # record_id -> (pre-write snapshot or None for a new record, visible_at)
+        self._stale = {}
+        self.stats = collections.Counter()
+
+    def _new_id(self):
+        return f"{next(self._ids):032x}"
+
+    def _record(self, name, content, record_type="TXT"):
+        now = _now()
+        return {"id": self._new_id(), "type": record_type, "name": name, "content": content,
+                "ttl": 1, "comment": None, "created_on": now, "modified_on": now}
+
+    def _add_zone(self, i):
+        name = f"zone-{i:06d}.example"
+        account = f"account-{i % self.accounts + 1}"
+        zone = {"id": self._new_id(), "name": name, "status": "active", "modified_on": SEED_TIME,
+                "account": {"id": account, "name": account}}
+        records = [self._record(f"google._domainkey.{name}", "v=DKIM1; k=rsa; p=MIGf"),
+                   self._record(name, f"site-verification={i}")]
+
+        spf = SPF_VARIANTS[i % len(SPF_VARIANTS)]
+        for content in (spf if isinstance(spf, list) else [spf] if spf else []):
+            records.append(self._record(name, content))
+        dmarc = DMARC_VARIANTS[i % len(DMARC_VARIANTS)]
+        if dmarc:
+            records.append(self._record(f"_dmarc.{name}", dmarc))
+
+        self.zones.append(zone)
+        self.records[zone["id"]] = {r["id"]: r for r in records}
+        self.zone_account[zone["id"]] = account
+        self.zone_by_name[name] = zone["id"]
+        if i % 7:
+            self.hosts[name] = f"192.0.2.{i % 250 + 1}"
+
+    # --- query helpers -------------------------------------------------------------------
+
+    @staticmethod
+    def _matches(record, query):
+        checks = []
+        if "type" in query:
+            checks.append(record["type"] == query["type"])
+        for key in ("name", "name.exact"):
+            if key in query:
+                checks.append(record["name"].lower() == query[key].lower())
+        if "content.contains" in query:
+            checks.append(query["content.contains"].lower() in record["content"].lower())
+        if "content.exact" in query:
+            checks.append(record["content"] == query["content.exact"])
+        if "content.startswith" in query:
+            checks.append(record["content"].lower().startswith(query["content.startswith"].lower()))
+        if not checks:
+            return True
+        return any(checks) if query.get("match") == "any" else all(checks)
+
+    def _visible(self, record):
+        """The version of `record` a reader sees right now (None while a created record is still invisible)."""
+        stale = self._stale.get(record["id"])
+        if stale is None:
+            return record
+        snapshot, visible_at = stale
+        if time.monotonic() >= visible_at:
+            del self._stale[record["id"]]
+            return record
+        return snapshot
+
+    def _before_write(self, record_id, snapshot):
+        if self.consistency_delay > 0:
+            visible_at = time.monotonic() + self.consistency_delay
+            # Keep the oldest snapshot when the same record is written twice inside the window
+            previous = self._stale.get(record_id)
+            self._stale[record_id] = (previous[0] if previous else copy.deepcopy(snapshot), visible_at)
+
+    def _over_budget(self, request):
+        """Sliding-window request budget per Authorization header; returns (limited, remaining, reset)."""
+        hits = self._token_hits[request.headers.get("Authorization", "")]
+        now = time.monotonic()
+        while hits and now - hits[0] >= self.rate_window:
+            hits.popleft()
+        if len(hits) >= self.rate_limit:
+            return True, 0, int(self.rate_window - (now - hits[0])) + 1
+        hits.append(now)
+        reset = int(self.rate_window - (now - hits[0])) + 1
+        return False, self.rate_limit - len(hits), reset
+
+    @web.middleware
+    async def _realism(self, request, handler):
+        if request.path.startswith("/__mock__"):
+            return await handler(request)
+        resource = request.match_info.route.resource
+        self.stats["requests"] += 1
+        self.stats[f"{request.method} {resource.canonical if resource else request.path}"] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+        rate_headers = {}
+        if self.rate_limit and request.path.startswith(API_PREFIX):
+            limited, remaining, reset = self._over_budget(request)
+            rate_headers = {"Ratelimit": f'"default";r={remaining};t={reset}',
+                            "Ratelimit-Policy": f'"default";q={self.rate_limit};w={self.rate_window}'}
+            if limited:
+                self.stats["429_budget"] += 1
+                return self._fault(429, "Rate limited", dict(rate_headers, **{"Retry-After": str(reset)}))
+
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.stats["429_injected"] += 1
+            return self._fault(429, "Rate limited", {"Retry-After": str(self.retry_after)})
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["5xx_injected"] += 1
+            return self._fault(self._random.choice([500, 502, 503]), "Injected server error")
+
+        response = await handler(request)
+        if request.method != "GET" and self.lost_response_rate and self._random.random() < self.lost_response_rate:
+            self.stats["lost_responses"] += 1
+            return self._fault(502, "Bad gateway (write applied)")
+        response.headers.update(rate_headers)
+        return response
+
+    @staticmethod
+    def _fault(status, message, headers=None):
+        response = _error(status, message)
+        response.headers.update(headers or {})
+        return response
+
+    def _token_account(self, request):
+        """Account the request's token is scoped to (None: every account)."""
+        token = request.headers.get("Authorization", "")
+        for k in range(1, self.accounts + 1):
+            if token.endswith(f"account-{k}"):
+                return f"account-{k}"
+        return None
+
+    def _can_see(self, request, zone_id):
+        scope = self._token_account(request)
+        return scope is None or self.zone_account.get(zone_id) == scope
+
+    def _zone_records(self, request):
+        records = self.records.get(request.match_info["zone_id"])
+        if records is None or not self._can_see(request, request.match_info["zone_id"]):
+            raise web.HTTPNotFound(text="zone not found")
+        return records
+
+    # --- handlers ------------------------------------------------------------------------
+
+    async def list_zones(self, request):
+        zones = [z for z in self.zones if self._can_see(request, z["id"])]
+        if "name" in request.query:
+            zones = [z for z in zones if z["name"] == request.query["name"].lower()]
+        if self.reject_zone_order and "order" in request.query:
+            return _error(400, "Invalid order parameter")
+        if request.query.get("order") in ("name", "status", "modified_on"):
+            key = request.query["order"]
+            zones = sorted(zones, key=lambda z: (z[key], z["id"]), reverse=request.query.get("direction") == "desc")
+        chunk, info = _paginate(zones, request.query, 20)
+        return _envelope(chunk, info)
+
+    async def get_zone(self, request):
+        zone_id = request.match_info["zone_id"]
+        zone = next((z for z in self.zones if z["id"] == zone_id), None)
+        if zone is None or not self._can_see(request, zone_id):
+            return _error(404, "Zone not found")
+        return _envelope(zone)
+
+    async def list_records(self, request):
+        visible = (self._visible(r) for r in list(self._zone_records(request).values()))
+        records = [r for r in visible if r is not None and self._matches(r, request.query)]
+        chunk, info = _paginate(records, request.query, 100)
+        return _envelope(chunk, info)
+
+    async def get_record(self, request):
+        record = self._zone_records(request).get(request.match_info["record_id"])
+        record = self._visible(record) if record is not None else None
+        if record is None:
+            return _error(404, "Record not found")
+        return _envelope(record)
+
+    async def create_record(self, request):
+        records = self._zone_records(request)
+        body = await request.json()
+        record = self._record(body["name"], body["content"], body.get("type", "TXT"))
+        record["comment"] = body.get("comment")
+        self._before_write(record["id"], None)
+        records[record["id"]] = record
+        return _envelope(record)
+
+    async def update_record(self, request):
+        records = self._zone_records(request)
+        record = records.get(request.match_info["record_id"])
+        if record is None:
+            return _error(404, "Record not found")
+        body = await request.json()
+        self._before_write(record["id"], record)
+        if request.method == "PUT":
+            record.update(type=body.get("type", record["type"]), name=body.get("name", record["name"]))
+        record.update(content=body.get("content", record["content"]), comment=body.get("comment"),
+                      modified_on=_now())
+        return _envelope(record)
+
+    async def batch_records(self, request):
+        """deletes -> patches -> puts -> posts, all-or-nothing like the real endpoint."""
+        records = self._zone_records(request)
+        body = await request.json()
+        for key in ("deletes", "patches", "puts"):
+            for op in body.get(key) or []:
+                if op.get("id") not in records:
+                    return _error(400, f"{key}: record {op.get('id')} not found")
+
+        result = {"deletes": [], "patches": [], "puts": [], "posts": []}
+        for op in body.get("deletes") or []:
+            result["deletes"].append(records.pop(op["id"]))
+        for key in ("patches", "puts"):
+            for op in body.get(key) or []:
+                record = records[op["id"]]
+                self._before_write(record["id"], record)
+                record.update({k: v for k, v in op.items() if k != "id"}, modified_on=_now())
+                result[key].append(dict(record))
+        for op in body.get("posts") or []:
+            record = self._record(op["name"], op["content"], op.get("type", "TXT"))
+            record["comment"] = op.get("comment")
+            self._before_write(record["id"], None)
+            records[record["id"]] = record
+            result["posts"].append(dict(record))
+        return _envelope(result)
+
+    def _dns_answers(self, name, rtype):
+        """Record data for (name, type), or None when the name doesn't exist at all."""
+        zone_name = name[len("_dmarc."):] if name.startswith("_dmarc.") else name
+        zone_id = self.zone_by_name.get(zone_name)
+        if zone_id is not None:
+            if rtype == "TXT":
+                records = (self._visible(r) for r in list(self.records[zone_id].values()))
+                return [_bind_txt(r["content"]) for r in records if r and r["type"] == "TXT" and r["name"] == name]
+            if name != zone_name or name not in self.hosts:
+                return []
+            return [self.hosts[name]] if rtype == "A" else [f"10 mx.{name}."] if rtype == "MX" else []
+        if name in PROVIDER_TXT:
+            return [_bind_txt(PROVIDER_TXT[name])] if rtype == "TXT" else []
+        return None
+
+    async def dns_query(self, request):
+        """DNS-over-HTTPS JSON (the format of cloudflare-dns.com/dns-query) for the mock's names."""
+        name = request.query.get("name", "").rstrip(".").lower()
+        rtype = request.query.get("type", "A").upper()
+        type_code = {"A": 1, "MX": 15, "TXT": 16}.get(rtype)
+        answers = self._dns_answers(name, rtype) if type_code else []
+        body = {"Status": 3 if answers is None else 0, "Question": [{"name": f"{name}.", "type": type_code}]}
+        if answers:
+            body["Answer"] = [{"name": f"{name}.", "type": type_code, "TTL": DNS_TTL, "data": data} for data in answers]
+        else:
+            body["Authority"] = [{"name": "example.", "type": 6, "TTL": DNS_TTL, "data": "ns1.example.net. dns.example.net. 1 10000 2400 604800 300"}]
+        return web.json_response(body, content_type="application/dns-json")
+
+    async def mock_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    def export_zones(self, directory, fmt="bind"):
+        """Write every zone as a Cloudflare-style export: a BIND zone file or a dns_records JSON response."""
+        os.makedirs(directory, exist_ok=True)
+        for zone in self.zones:
+            records = list(self.records[zone["id"]].values())
+            if fmt == "json":
+                result = [dict(r, zone_id=zone["id"], zone_name=zone["name"]) for r in records]
+                with open(os.path.join(directory, f"{zone['name']}.json"), "w", encoding="utf-8") as f:
+                    json.dump({"success": True, "errors": [], "messages": [], "result": result}, f)
+                continue
+            lines = [f";; Domain:     {zone['name']}.", f";; Exported:   {_now()}", "", ";; SOA Record",
+                     f"{zone['name']}.\t3600\tIN\tSOA\tns1.example.net. dns.example.net. 1 10000 2400 604800 3600",
+                     "", ";; TXT Records"]
+            lines += [f"{r['name']}.\t{r['ttl']}\tIN\tTXT\t{_bind_txt(r['content'])}" for r in records if r["type"] == "TXT"]
+            with open(os.path.join(directory, f"{zone['name']}.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def make_app(self):
+        app = web.Application(middlewares=[self._realism])
+        app.router.add_get("/__mock__/stats", self.mock_stats)
+        app.router.add_get("/dns-query", self.dns_query)
+        app.router.add_get(f"{API_PREFIX}/zones", self.list_zones)
+        app.router.add_get(f"{API_PREFIX}/zones/{{zone_id}}", self.get_zone)
+        app.router.add_get(f"{API_PREFIX}/zones/{{zone_id}}/dns_records", self.list_records)
+        app.router.add_post(f"{API_PREFIX}/zones/{{zone_id}}/dns_records", self.create_record)
+        app.router.add_post(f"{API_PREFIX}/zones/{{zone_id}}/dns_records/batch", self.batch_records)
+        app.router.add_get(f"{API_PREFIX}/zones/{{zone_id}}/dns_records/{{record_id}}", self.get_record)
+        app.router.add_put(f"{API_PREFIX}/zones/{{zone_id}}/dns_records/{{record_id}}", self.update_record)
+        app.router.add_patch(f"{API_PREFIX}/zones/{{zone_id}}/dns_records/{{record_id}}", self.update_record)
+        return app
+
+async def start_mock(mock, host="127.0.0.1", port=8787):
+    """Serve `mock` in the running loop; returns the AppRunner (call `await runner.cleanup()`)."""
+    runner = web.AppRunner(mock.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"🧪 Mock Cloudflare API on http://{host}:{port}{API_PREFIX} ({len(mock.zones)} zones)")
+    return runner
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Cloudflare v4 API")
+    parser.add_argument("--zones", type=int, default=100, help="Number of synthetic zones")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Base latency per request (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 5xx")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--consistency-delay", type=float, default=0.0, help="Seconds writes stay invisible to reads")
+    parser.add_argument("--lost-response-rate", type=float, default=0.0,
+                        help="Fraction of writes applied but answered with 502")
+    parser.add_argument("--accounts", type=int, default=1,
+                        help="Spread zones over N accounts; a token ending in account-<k> only sees account k")
+    parser.add_argument("--rate-limit", type=int, help="Requests allowed per token per --rate-window")
+    parser.add_argument("--rate-window", type=int, default=300)
+    parser.add_argument("--reject-zone-order", action="store_true", help="Refuse ordered /zones listings with a 400")
+    parser.add_argument("--export", type=str, metavar="DIR", help="Write the zones as exports to DIR and exit")
+    parser.add_argument("--export-format", choices=["bind", "json"], default="bind")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    mock = MockCloudflare(
+        args.zones, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+        consistency_delay=args.consistency_delay, rate_limit=args.rate_limit, rate_window=args.rate_window,
+        lost_response_rate=args.lost_response_rate, accounts=args.accounts, reject_zone_order=args.reject_zone_order
+    )
+    if args.export:
+        mock.export_zones(args.export, args.export_format)
+        print(f"🧪 Exported {args.zones} zones to {args.export} ({args.export_format})")
+        return
+    print(f"🧪 Mock Cloudflare API on http://{args.host}:{args.port}{API_PREFIX} ({args.zones} zones)")
+    web.run_app(mock.make_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
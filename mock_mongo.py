@@ -0,0 +1,74 @@
+"""
+In-memory stand-in for the slice of pymongo that UserMapping uses (`client[db][coll].find`),
+seeded to match mock_cloudflare.py's synthetic zones. Used by benchmark.py.
+"""
+import time
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    out = {}
+    for key, include in projection.items():
+        if not include or key == "_id":
+            continue
+        top, _, sub = key.partition(".")
+        if top not in doc:
+            continue
+        if sub and isinstance(doc[top], list):
+            out[top] = [{sub: d[sub]} for d in doc[top] if isinstance(d, dict) and sub in d]
+        else:
+            out[top] = doc[top]
+    return out
+
+class MockCollection:
+    def __init__(self, docs, latency=0.0):
+        self.docs = docs
+        self.latency = latency
+        self.queries = 0
+
+    def find(self, filter=None, projection=None, collation=None):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        domain_filter = (filter or {}).get("domain")
+        if isinstance(domain_filter, dict) and "$in" in domain_filter:
+            # Case-insensitive like the collation UserMapping passes
+            wanted = {d.lower() for d in domain_filter["$in"]}
+            docs = (d for d in self.docs if str(d.get("domain", "")).lower() in wanted)
+        else:
+            docs = iter(self.docs)
+        return [_project(d, projection) for d in docs]
+
+class MockDatabase:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getitem__(self, name):
+        return self.collection
+
+class MockMongoClient:
+    """`MockMongoClient(docs)[db_name][collection_name]` always returns the same collection."""
+    def __init__(self, docs, latency=0.0):
+        self.collection = MockCollection(docs, latency)
+
+    def __getitem__(self, name):
+        return MockDatabase(self.collection)
+
+    def server_info(self):
+        return {"version": "mock"}
+
+    def close(self):
+        pass
+
+def synthetic_docs(zone_count):
+    """One mapping document per synthetic zone, cycling through the user/contact/no-info shapes."""
+    docs = []
+    for i in range(zone_count):
+        domain = f"zone-{i:06d}.example"
+        if i % 3 == 0:
+            docs.append({"domain": domain, "user": f"user-{i % 97}@customers.example"})
+        elif i % 3 == 1:
+            docs.append({"domain": domain.upper(), "contactDetails": [{"email": f"ops-{i % 31}@customers.example"}]})
+        elif i % 7:
+            docs.append({"domain": domain})
+    return docs
@@ -0,0 +1,298 @@
+"""
+Offline audit (`--offline DIR`): evaluate Cloudflare zone exports without any API call.
+
+Reads BIND zone files (Cloudflare's "Export DNS records", `*.txt` / `*.zone` / `*.bind` / `*.db`)
+and JSON dumps of `dns_records` (`*.json`: an API response or a list of records; `*.jsonl`: one
+record per line). Records carrying `zone_id` / `zone_name` may cover many zones in one file.
+Files are parsed line by line, keeping only SPF and `_dmarc` TXT records, across a process
+pool; every zone goes through the same policy and risk evaluation as a dry run and lands in
+the usual report.
+"""
+import functools
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dns_logic import DRY_RUN_STATUS, evaluate_zone, select_policy_records
+from cloudflare_client import DnsRecord
+
+logger = logging.getLogger(__name__)
+
+BIND_SUFFIXES = (".txt", ".zone", ".bind", ".db")
+JSON_SUFFIXES = (".json", ".jsonl", ".ndjson")
+RECORD_CLASSES = {"IN", "CH", "HS", "CS"}
+TTL_UNITS = set("smhdwSMHDW")
+
+def _is_ttl(token):
+    return token[:1].isdigit() and all(c.isdigit() or c in TTL_UNITS for c in token)
+
+def _is_policy_record(name, content):
+    # Everything select_policy_records could pick, whatever the apex turns out to be
+    return name.startswith("_dmarc.") or "v=spf1" in content
+
+def _tokens(text):
+    """Split one (parenthesis-joined) zone file entry into words; quoted strings come back as ('"', text)."""
+    tokens, i, n = [], 0, len(text)
+    while i < n:
+        c = text[i]
+        if c in " \t()":
+            i += 1
+        elif c == '"':
+            i += 1
+            chunk = []
+            while i < n and text[i] != '"':
+                if text[i] == "\\" and i + 1 < n:
+                    if text[i + 1:i + 4].isdigit():
+                        chunk.append(chr(int(text[i + 1:i + 4])))
+                        i += 4
+                        continue
+                    chunk.append(text[i + 1])
+                    i += 2
+                    continue
+                chunk.append(text[i])
+                i += 1
+            tokens.append(('"', "".join(chunk)))
+            i += 1
+        else:
+            start = i
+            while i < n and text[i] not in ' \t()"':
+                i += 1
+            tokens.append(text[start:i])
+    return tokens
+
+def _strip_comment(line):
+    """Drop a `;` comment (outside quotes); returns (text, open parentheses balance change)."""
+    quoted, depth = False, 0
+    for i, c in enumerate(line):
+        if c == '"' and (i == 0 or line[i - 1] != "\\"):
+            quoted = not quoted
+        elif not quoted:
+            if c == ";":
+                return line[:i], depth
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth -= 1
+    return line, depth
+
+def _entries(lines):
+    """Logical zone file entries (multi-line parentheses joined), each with whether it starts indented."""
+    pending, depth, indented = [], 0, False
+    for line in lines:
+        text, delta = _strip_comment(line.rstrip("\r\n"))
+        if not pending:
+            if not text.strip():
+                continue
+            indented = text[:1] in " \t"
+        pending.append(text)
+        depth += delta
+        if depth <= 0:
+            yield indented, " ".join(pending)
+            pending, depth = [], 0
+    if pending:
+        yield indented, " ".join(pending)
+
+def parse_bind(lines, origin=None):
+    """
+    Stream a BIND zone file: returns (apex, policy TXT records). The apex is the SOA owner,
+    else the first $ORIGIN, else Cloudflare's `;; Domain:` header, else `origin`.
+    """
+    apex = header_domain = first_origin = None
+    owner = None
+    records = []
+
+    def absolute(name):
+        if name == "@":
+            return origin or ""
+        if name.endswith("."):
+            return name[:-1]
+        return f"{name}.{origin}" if origin else name
+
+    def header_lines():
+        nonlocal header_domain
+        for line in lines:
+            if header_domain is None and line.startswith(";; Domain:"):
+                header_domain = line.split(":", 1)[1].strip().rstrip(".")
+            yield line
+
+    for indented, entry in _entries(header_lines()):
+        tokens = _tokens(entry)
+        if not tokens:
+            continue
+        first = tokens[0]
+        if first == "$ORIGIN" and len(tokens) > 1:
+            origin = tokens[1].rstrip(".")
+            first_origin = first_origin or origin
+            continue
+        if isinstance(first, str) and first.startswith("$"):
+            continue
+        if not indented:
+            owner = absolute(first)
+            tokens = tokens[1:]
+        # Optional TTL and class, in either order, before the type
+        while tokens and isinstance(tokens[0], str) and (_is_ttl(tokens[0]) or tokens[0].upper() in RECORD_CLASSES):
+            tokens = tokens[1:]
+        if not tokens or not isinstance(tokens[0], str) or owner is None:
+            continue
+        record_type = tokens[0].upper()
+        if record_type == "SOA" and apex is None:
+            apex = owner
+        elif record_type == "TXT":
+            parts = tokens[1:]
+            # Quoted character-strings are concatenated as-is (like the API's content); bare words keep their spaces
+            if all(isinstance(t, tuple) for t in parts):
+                content = "".join(t[1] for t in parts)
+            else:
+                content = " ".join(t[1] if isinstance(t, tuple) else t for t in parts)
+            if _is_policy_record(owner.lower(), content):
+                records.append(DnsRecord("", "TXT", owner, content))
+    return (apex or first_origin or header_domain or origin or "").lower(), records
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    """Objects of a top-level JSON array, decoded one at a time from `f` (a text file)."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while not buffer:
+        chunk = f.read(chunk_size)
+        buffer = chunk.lstrip()
+        if not chunk:
+            break
+    if not buffer.startswith("["):
+        raise ValueError("not a JSON array")
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if buffer.startswith("]"):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise
+            more = f.read(chunk_size)
+            eof = not more
+            buffer += more
+            continue
+        yield obj
+        buffer = buffer[end:]
+        if len(buffer) < chunk_size and not eof:
+            more = f.read(chunk_size)
+            eof = not more
+            buffer += more
+
+def iter_json_records(path):
+    """dns_records objects in a JSON export (array, API response envelope or JSON lines)."""
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        start = f.read(1)
+        while start and start.isspace():
+            start = f.read(1)
+        f.seek(0)
+        if start == "[":
+            yield from _iter_json_array(f)
+        else:
+            # A single API response (one zone's records): small enough to load whole
+            data = json.load(f)
+            yield from data.get("result") or []
+
+def _stem_domain(path):
+    name = os.path.basename(path)
+    for suffix in BIND_SUFFIXES + JSON_SUFFIXES:
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name.lower().rstrip(".")
+
+def parse_export(path):
+    """[(domain, zone_id, policy TXT records)] for every zone in one export file."""
+    if path.lower().endswith(JSON_SUFFIXES):
+        zones = {}
+        for r in iter_json_records(path):
+            key = (r.get("zone_name") or _stem_domain(path)).lower(), r.get("zone_id") or ""
+            entry = zones.setdefault(key, [])
+            if r.get("type") == "TXT" and _is_policy_record(r.get("name", "").lower(), r.get("content", "")):
+                entry.append(DnsRecord.from_api(r))
+        return [(domain, zone_id, records) for (domain, zone_id), records in zones.items()]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        domain, records = parse_bind(f, origin=_stem_domain(path))
+    return [(domain, "", records)]
+
+def audit_file(path, create_missing_dmarc=True):
+    """Report rows (without the mapped user) for the zones in one export; runs in a pool worker."""
+    try:
+        zones = parse_export(path)
+    except Exception as e:
+        return [{
+            "domain": _stem_domain(path), "risk": f"Export Parse Error ({type(e).__name__}: {e})",
+            "previous spf": "Error", "new spf[updated]": "N/A",
+            "previous dmarc": "Error", "new dmarc[updated]": "N/A",
+            "spf status": "Skipped (Parse Error)", "dmarc status": "Skipped (Parse Error)", "zone_id": "",
+        }]
+    rows = []
+    for domain, zone_id, records in zones:
+        spf_records, dmarc_records = select_policy_records(domain, records)
+        fields, spf_action, dmarc_action = evaluate_zone(domain, spf_records, dmarc_records, create_missing_dmarc)
+        if spf_action:
+            fields['spf status'] = DRY_RUN_STATUS[spf_action]
+        if dmarc_action:
+            fields['dmarc status'] = DRY_RUN_STATUS[dmarc_action]
+        rows.append({"domain": domain, **fields, "zone_id": zone_id})
+    return rows
+
+def find_exports(directory):
+    """Export files under `directory` (recursively), in a stable order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(BIND_SUFFIXES + JSON_SUFFIXES):
+                yield os.path.join(root, name)
+
+def audit_exports(directory, report, user_mapping=None, workers=None, limit=None, create_missing_dmarc=True,
+                  batch_size=100, on_row=None):
+    """
+    Evaluate every export under `directory` into `report` (a ReportWriter); returns the number of rows.
+    Files are handed to the pool in chunks, and user mappings are resolved one batch of rows at a time.
+    """
+    started = time.perf_counter()
+    paths = find_exports(directory)
+    if limit:
+        # Every file holds at least one zone
+        paths = itertools.islice(paths, limit)
+    handled = 0
+    batch = []
+
+    def flush():
+        if user_mapping:
+            user_mapping.prefetch([row['domain'] for row in batch])
+        for row in batch:
+            row['mapped user'] = user_mapping.get(row['domain']) if user_mapping else "N/A (No MongoDB)"
+            report.write(row)
+            if on_row:
+                on_row(row)
+        batch.clear()
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        rows_per_file = pool.map(functools.partial(audit_file, create_missing_dmarc=create_missing_dmarc), paths, chunksize=64)
+        for rows in rows_per_file:
+            for row in rows:
+                batch.append(row)
+                handled += 1
+                if len(batch) >= batch_size:
+                    flush()
+                if limit and handled >= limit:
+                    break
+            if limit and handled >= limit:
+                logger.info(f"🛑 Reached total limit of {limit} domains.")
+                break
+    flush()
+    elapsed = time.perf_counter() - started
+    logger.info(f"📴 Offline audit: {handled} zones from {directory} in {elapsed:.1f}s "
+                f"({handled / elapsed if elapsed else 0:.0f} zones/s)")
+    return handled
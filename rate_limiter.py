@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cloudflare's structured header, e.g. `ratelimit: "default";r=42;t=17` (r=remaining, t=seconds to reset)
+_STRUCTURED_RATELIMIT = re.compile(r'\br=(\d+).*?\bt=(\d+)')
+
+def parse_retry_after(value):
+    """Retry-After is seconds in practice for the Cloudflare API; anything unparsable is ignored."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def parse_rate_limit_headers(headers):
+    """Returns (remaining, reset_seconds) from whichever rate-limit headers are present, or (None, None)."""
+    structured = headers.get('Ratelimit') or headers.get('ratelimit')
+    if structured:
+        m = _STRUCTURED_RATELIMIT.search(structured)
+        if m:
+            return int(m.group(1)), float(m.group(2))
+
+    remaining = headers.get('X-RateLimit-Remaining') or headers.get('RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset') or headers.get('RateLimit-Reset')
+    try:
+        remaining = int(remaining) if remaining is not None else None
+    except ValueError:
+        remaining = None
+    reset = parse_retry_after(reset) if reset is not None else None
+    return remaining, reset
+
+class TokenBucket:
+    """
+    Shared request pacer for one API token.
+    Refills at `utilization` x (limit / window) requests per second, holds at most `burst`
+    tokens, and can be paused outright when the API answers with Retry-After.
+    """
+    def __init__(self, limit, window, utilization=0.95, burst=10):
+        self.rate = (limit / float(window)) * utilization
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = None
+
+        # Counters
+        self.tokens_spent = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    async def acquire(self):
+        # Lazily created so the lock binds to the running loop (Python < 3.10)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        started = time.monotonic()
+        # One waiter at a time keeps callers FIFO and stops a thundering herd after a pause
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+            self.tokens_spent += 1
+            self.wait_seconds += time.monotonic() - started
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (from Retry-After or an exhausted budget)."""
+        until = time.monotonic() + seconds
+        if until > self.paused_until:
+            self.paused_until = until
+            logger.warning(f"⏸️ Rate limit reached, pausing all requests for {seconds:.1f}s")
+        self.tokens = 0
+
+    def observe(self, status, headers):
+        """Feed every response back so the local bucket never runs ahead of the server's view."""
+        if status == 429:
+            self.throttled += 1
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            self.pause(retry_after if retry_after is not None else 1.0 / self.rate)
+            return
+
+        remaining, reset = parse_rate_limit_headers(headers)
+        if remaining is None:
+            return
+        if remaining <= 0 and reset:
+            self.pause(reset)
+        elif remaining < self.tokens:
+            self.tokens = float(remaining)
+
+    def stats(self):
+        return {
+            "tokens_spent": self.tokens_spent,
+            "wait_seconds": round(self.wait_seconds, 2),
+            "throttled": self.throttled,
+            "rate_per_sec": round(self.rate, 3),
+        }
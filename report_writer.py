@@ -0,0 +1,136 @@
+import csv
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = [
+    'domain', 'mapped user', 'risk', 'previous spf', 'new spf[updated]', 'spf lookups', 'spf void lookups',
+    'previous dmarc', 'new dmarc[updated]', 'spf status', 'dmarc status', 'zone_id'
+]
+MAX_COLUMN_WIDTH = 60
+
+class ReportWriter:
+    """
+    Streaming report sink.
+    Each row is appended to a CSV checkpoint next to the report as soon as it completes (so a
+    crash never loses finished rows) and only the running column widths are kept in memory.
+    `close()` builds the Excel file once, in openpyxl write-only mode, from the checkpoint.
+    With `append=True` an existing checkpoint is continued (resumed runs) instead of replaced.
+    """
+    def __init__(self, report_path, columns=None, flush_every=100, append=False):
+        self.report_path = report_path
+        self.columns = columns or REPORT_COLUMNS
+        self.checkpoint_path = os.path.splitext(report_path)[0] + ".csv"
+        self.flush_every = flush_every
+        self.rows = 0
+        self.widths = [len(c) for c in self.columns]
+        if append and os.path.exists(self.checkpoint_path):
+            self._load_existing()
+            self._file = open(self.checkpoint_path, mode='a', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+        else:
+            self._file = open(self.checkpoint_path, mode='w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+
+    def _load_existing(self):
+        # A crash can leave half a row at the end; cut back to the last complete line
+        with open(self.checkpoint_path, mode='rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+        with open(self.checkpoint_path, mode='r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header and header != self.columns:
+                # Written by an older version: keep its layout so appended rows line up
+                self.columns = header
+                self.widths = [len(c) for c in self.columns]
+            for values in reader:
+                self.rows += 1
+                for i, v in enumerate(values[:len(self.widths)]):
+                    if len(v) > self.widths[i]:
+                        self.widths[i] = len(v)
+        logger.info(f"📂 Continuing report checkpoint {self.checkpoint_path} ({self.rows} rows)")
+
+    def flush(self):
+        self._file.flush()
+
+    def write(self, row):
+        values = ["" if row.get(c) is None else str(row.get(c)) for c in self.columns]
+        self._writer.writerow(values)
+        for i, v in enumerate(values):
+            if len(v) > self.widths[i]:
+                self.widths[i] = len(v)
+        self.rows += 1
+        if self.rows % self.flush_every == 0:
+            self._file.flush()
+            logger.info(f"💾 Report checkpoint: {self.rows} rows -> {self.checkpoint_path}")
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if not self.rows:
+            logger.info("No results to report.")
+            return
+        try:
+            build_excel(self.checkpoint_path, self.report_path, self.widths)
+            logger.info(f"📊 Detailed report generated: {self.report_path}")
+        except Exception as e:
+            logger.error(f"Error generating Excel report: {e}")
+
+def build_excel(csv_path, report_path, widths):
+    """Stream a report CSV into a write-only workbook, sizing columns from precomputed widths."""
+    # openpyxl (and the numpy it pulls in) is only needed once the report is built
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Update Report')
+    # Write-only sheets need dimensions set before any row is written
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+    bold = Font(bold=True)
+    with open(csv_path, mode='r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        header_cells = []
+        for name in header:
+            cell = WriteOnlyCell(ws, value=name)
+            cell.font = bold
+            header_cells.append(cell)
+        ws.append(header_cells)
+        for values in reader:
+            ws.append(values)
+    wb.save(report_path)
+
+def merge_reports(paths, report_path):
+    """
+    Combine per-shard reports (their CSV checkpoints; `.xlsx` paths are mapped to them) into one
+    report. Rows keep shard order; a domain reported by more than one shard is kept once.
+    Missing inputs are skipped with a warning. Returns the number of merged rows.
+    """
+    writer = ReportWriter(report_path)
+    seen = set()
+    try:
+        for path in paths:
+            csv_path = os.path.splitext(path)[0] + ".csv"
+            if not os.path.exists(csv_path):
+                logger.warning(f"⚠️ No report checkpoint at {csv_path}, skipping")
+                continue
+            with open(csv_path, mode='r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    key = (row.get('domain') or "").lower()
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    writer.write(row)
+    finally:
+        writer.close()
+    logger.info(f"🧩 Merged {writer.rows} rows from {len(paths)} reports into {report_path}")
+    return writer.rows
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(Exception):
+    """A call ran out of its total time budget (attempts plus backoff) before succeeding."""
+
+class AmbiguousWrite(Exception):
+    """A non-idempotent call failed in a way that doesn't tell whether the server applied it."""
+
+class RequestRejected(Exception):
+    """The API refused the request itself (a 4xx other than 429): sending it again can't help."""
+
+def backoff_delay(attempt, base=1.0, cap=30.0, retry_after=None):
+    """Full-jitter exponential backoff; a server-provided Retry-After is a floor, not replaced by jitter."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+class CircuitBreaker:
+    """
+    Account-wide circuit breaker over server-side failures (5xx, timeouts, connection errors).
+
+    Closed: calls flow; when at least `min_calls` outcomes in the last `window` seconds include
+    more than `error_rate` failures, it opens. Open: `wait()` holds every new dispatch for
+    `open_seconds` (doubling on repeated trips, up to `max_open_seconds`). Half-open: a single
+    probe call goes out; success closes the breaker, failure re-opens it. 429s are not counted
+    here, the rate limiter already pauses for those.
+    """
+    def __init__(self, error_rate=0.5, min_calls=20, window=30.0, open_seconds=15.0, max_open_seconds=300.0):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = "closed"
+        self.opened_until = 0.0
+        self.trips = 0
+        self._outcomes = deque() # (time, failed)
+        self._probe_in_flight = False
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    async def wait(self):
+        """
+        Block while the breaker is open; in half-open state only one caller (the probe) passes.
+        Returns True for the probe, which must report back through `record()` or `abandon_probe()`.
+        """
+        while True:
+            now = time.monotonic()
+            if self.state == "closed":
+                return False
+            if self.state == "open":
+                if now < self.opened_until:
+                    await asyncio.sleep(self.opened_until - now)
+                    continue
+                self.state = "half_open"
+                logger.info("🔌 Circuit breaker half-open, sending a probe request")
+            if not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            await asyncio.sleep(0.5)
+
+    def abandon_probe(self):
+        """The probe ended without a verdict (e.g. cancelled); let the next caller probe."""
+        self._probe_in_flight = False
+
+    def record(self, failed, probe=False):
+        now = time.monotonic()
+        if probe:
+            self._probe_in_flight = False
+            if failed:
+                self._open(now)
+            else:
+                self.state = "closed"
+                self.trips = 0
+                self._outcomes.clear()
+                logger.info("🔌 Circuit breaker closed, resuming normal dispatch")
+            return
+
+        self._outcomes.append((now, failed))
+        self._trim(now)
+        if self.state != "closed" or len(self._outcomes) < self.min_calls:
+            return
+        failures = sum(1 for _, f in self._outcomes if f)
+        if failures / len(self._outcomes) > self.error_rate:
+            self._open(now)
+
+    def _open(self, now):
+        self.trips += 1
+        pause = min(self.max_open_seconds, self.open_seconds * (2 ** (self.trips - 1)))
+        self.state = "open"
+        self.opened_until = now + pause
+        self._outcomes.clear()
+        metrics.inc("circuit_breaker_trips_total")
+        logger.error(f"🔌 Circuit breaker OPEN: error rate above {self.error_rate:.0%}, pausing all API calls for {pause:.0f}s")
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+def _label(item):
+    """Domain (and zone id) of a pipeline item: a zone dict or anything carrying one in `.zone`."""
+    zone = item if isinstance(item, dict) else getattr(item, 'zone', None) or {}
+    return f"{zone.get('name')} ({zone.get('id')})" if zone else repr(item)
+
+class ZoneScheduler:
+    """
+    Runs a coroutine handler over a stream of zones with a fixed number of workers.
+    Zones are pulled from an (async) iterable into a bounded queue, so a new zone starts as
+    soon as any worker frees up - there is no barrier at page boundaries.
+    A zone whose handler raises goes to `on_error(zone, error)`; a row it returns is delivered like any other.
+    """
+    def __init__(self, concurrency, queue_size=None, name="zones"):
+        self.concurrency = concurrency
+        self.queue_size = queue_size or concurrency * 2
+        self.name = name
+        self.busy = 0
+
+    async def run(self, zones, handler, on_result=None, on_error=None):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        metrics.gauge_fn("queue_depth", queue.qsize, queue=self.name)
+        metrics.gauge_fn("workers_busy", lambda: self.busy, pool=self.name)
+        metrics.set("workers_total", self.concurrency, pool=self.name)
+
+        async def producer():
+            try:
+                if hasattr(zones, '__aiter__'):
+                    async for zone in zones:
+                        await queue.put(zone)
+                else:
+                    for zone in zones:
+                        await queue.put(zone)
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(_DONE)
+
+        async def worker():
+            while True:
+                zone = await queue.get()
+                if zone is _DONE:
+                    return
+                self.busy += 1
+                started = time.perf_counter()
+                try:
+                    res = await handler(zone)
+                except Exception as e:
+                    logger.error(f"❌ Unhandled error processing {zone.get('name')}: {e}")
+                    res = on_error(zone, e) if on_error else None
+                finally:
+                    self.busy -= 1
+                    metrics.inc("worker_busy_seconds_total", time.perf_counter() - started, pool=self.name)
+                if res and on_result:
+                    on_result(res)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(producer(), *workers)
+        finally:
+            for w in workers:
+                w.cancel()
+
+class Stage(NamedTuple):
+    """
+    One step of a StagedPipeline: `handler(item)` returns what goes on to the next stage (None
+    drops the item). With `batch` > 1 the handler gets a list of up to `batch` queued items and
+    returns a list.
+    """
+    name: str
+    handler: object
+    concurrency: int
+    batch: int = 1
+
+class StagedPipeline:
+    """
+    Items from a source (async) iterable flow through `stages`, each with its own workers and a
+    bounded input queue. A full queue blocks the stage feeding it (backpressure), so memory stays
+    bounded however long the source is, and a slow stage never takes workers from a fast one.
+    Per stage, items handled, busy workers and queue depth are exported as metrics (and logged
+    every `progress_interval` seconds); the last stage's output goes to `on_result`. An item whose
+    handler raises goes to `on_error(item, error)` (each item of a failed batch), and a row it
+    returns goes to `on_result`, so the failure still reaches the report.
+    """
+    def __init__(self, stages, queue_size=None, progress_interval=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.progress_interval = progress_interval
+        self.busy = {stage.name: 0 for stage in stages}
+        self.handled = {stage.name: 0 for stage in stages}
+
+    async def run(self, source, on_result=None, on_error=None):
+        queues = [asyncio.Queue(maxsize=self.queue_size or stage.concurrency * stage.batch * 2) for stage in self.stages]
+        for stage, queue in zip(self.stages, queues):
+            metrics.gauge_fn("queue_depth", queue.qsize, queue=stage.name)
+            metrics.gauge_fn("workers_busy", lambda name=stage.name: self.busy[name], pool=stage.name)
+            metrics.set("workers_total", stage.concurrency, pool=stage.name)
+
+        async def close(i):
+            # Every worker of stage i gets its own end marker
+            for _ in range(self.stages[i].concurrency):
+                await queues[i].put(_DONE)
+
+        async def feed():
+            try:
+                if hasattr(source, '__aiter__'):
+                    async for item in source:
+                        await queues[0].put(item)
+                else:
+                    for item in source:
+                        await queues[0].put(item)
+            finally:
+                await close(0)
+
+        async def worker(i):
+            stage, queue = self.stages[i], queues[i]
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+                items, finished = [item], False
+                while len(items) < stage.batch and not queue.empty():
+                    item = queue.get_nowait()
+                    if item is _DONE:
+                        finished = True
+                        break
+                    items.append(item)
+
+                self.busy[stage.name] += 1
+                started = time.perf_counter()
+                try:
+                    out = await stage.handler(items if stage.batch > 1 else items[0])
+                except Exception as e:
+                    out = [] if stage.batch > 1 else None
+                    for item in items:
+                        logger.error(f"❌ Unhandled error in the {stage.name} stage for {_label(item)}: {e}")
+                        row = on_error(item, e) if on_error else None
+                        if row is not None and on_result:
+                            on_result(row)
+                finally:
+                    self.busy[stage.name] -= 1
+                    metrics.inc("worker_busy_seconds_total", time.perf_counter() - started, pool=stage.name)
+                self.handled[stage.name] += len(items)
+                metrics.inc("stage_items_total", len(items), stage=stage.name)
+
+                for result in (out or []) if stage.batch > 1 else [out]:
+                    if result is None:
+                        continue
+                    if i + 1 < len(self.stages):
+                        await queues[i + 1].put(result)
+                    elif on_result:
+                        on_result(result)
+                if finished:
+                    return
+
+        async def run_stage(i):
+            await asyncio.gather(*(worker(i) for _ in range(self.stages[i].concurrency)))
+            if i + 1 < len(self.stages):
+                await close(i + 1)
+
+        tasks = [asyncio.ensure_future(feed())] + [asyncio.ensure_future(run_stage(i)) for i in range(len(self.stages))]
+        progress = asyncio.ensure_future(self._report(queues)) if self.progress_interval else None
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks + [progress]:
+                if task:
+                    task.cancel()
+
+    async def _report(self, queues):
+        last = dict(self.handled)
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            parts = []
+            for stage, queue in zip(self.stages, queues):
+                rate = (self.handled[stage.name] - last[stage.name]) / self.progress_interval
+                parts.append(f"{stage.name} {rate:.1f}/s q={queue.qsize()} busy={self.busy[stage.name]}/{stage.concurrency}")
+            last = dict(self.handled)
+            logger.info("📊 Pipeline: " + " | ".join(parts))
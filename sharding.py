@@ -0,0 +1,99 @@
+"""
+Deterministic zone sharding (`--shard i/N`) and the local multi-process launcher (`--shards N`).
+
+A zone belongs to shard `crc32(zone_id) % N + 1`, so any number of processes or hosts can page
+the same account independently and still split it without overlap or coordination. Each shard
+keeps its own state database and report; `merge_reports` combines the per-shard reports.
+"""
+import logging
+import os
+import subprocess
+import sys
+import zlib
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+class Shard(NamedTuple):
+    index: int # 1-based
+    count: int
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    @property
+    def suffix(self):
+        return f".shard-{self.index}-of-{self.count}"
+
+    def owns(self, zone_id):
+        return zlib.crc32(zone_id.encode("utf-8")) % self.count + 1 == self.index
+
+def parse_shard(spec):
+    """'2/8' -> Shard(2, 8); usable as an argparse `type`."""
+    try:
+        index, count = (int(p) for p in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"invalid shard '{spec}', expected i/N (e.g. 1/4)")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"invalid shard '{spec}', index must be between 1 and N")
+    return Shard(index, count)
+
+def shard_path(path, shard):
+    """`reports/run.xlsx` -> `reports/run.shard-2-of-8.xlsx` (unchanged when not sharding)."""
+    if not shard:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}{shard.suffix}{ext}"
+
+def shard_reports(report_path, count):
+    """Report paths the shards of a `count`-way run write for a shared `--report-name`."""
+    return [shard_path(report_path, Shard(i, count)) for i in range(1, count + 1)]
+
+def _strip_option(argv, name, takes_value=True):
+    out, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg == name:
+            skip = takes_value
+            continue
+        if arg.startswith(name + "="):
+            continue
+        out.append(arg)
+    return out
+
+def run_local_shards(count, argv, report_path):
+    """
+    Run `count` shards of this command as local processes (one interpreter and connection pool
+    each) and wait for all of them. Every child gets its own log file; returns the shard report
+    paths and the shards that exited non-zero.
+    """
+    child_argv = _strip_option(_strip_option(argv, "--shards"), "--report-name")
+    script = os.path.abspath(sys.argv[0])
+    procs = []
+    for i in range(1, count + 1):
+        shard = Shard(i, count)
+        env = dict(os.environ)
+        log_path = env.get("LOG_FILE_PATH", "automation.log")
+        env["LOG_FILE_PATH"] = shard_path(log_path, shard)
+        if env.get("LOG_JSON_PATH"):
+            env["LOG_JSON_PATH"] = shard_path(env["LOG_JSON_PATH"], shard)
+        # Per-shard metrics so the children don't fight over one port / textfile
+        if env.get("METRICS_PORT"):
+            env["METRICS_PORT"] = str(int(env["METRICS_PORT"]) + i - 1)
+        if env.get("METRICS_TEXTFILE"):
+            env["METRICS_TEXTFILE"] = shard_path(env["METRICS_TEXTFILE"], shard)
+        cmd = [sys.executable, script, *child_argv, "--shard", str(shard), "--report-name", report_path]
+        logger.info(f"🧩 Starting shard {shard} (log: {env['LOG_FILE_PATH']})")
+        procs.append((shard, subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)))
+
+    failed = []
+    for shard, proc in procs:
+        code = proc.wait()
+        if code != 0:
+            failed.append(shard)
+            logger.error(f"❌ Shard {shard} exited with code {code}")
+    if failed:
+        logger.error(f"❌ Shards failed: {', '.join(map(str, failed))} - re-run them with --shard to complete the report")
+    return shard_reports(report_path, count), failed
@@ -0,0 +1,265 @@
+"""
+SPF include-chain analysis (RFC 7208 section 4.6.4): how many DNS-querying terms an SPF record
+costs once its include:/redirect= chain is expanded (at most 10 are allowed) and how many of
+those lookups came back empty ("void lookups", at most 2).
+
+Names are resolved through a pluggable async resolver, `query(name, rtype)` -> (answers, ttl):
+DohResolver asks a DNS-over-HTTPS JSON endpoint (Cloudflare's public resolver by default, or
+mock_cloudflare.py's /dns-query), StaticResolver answers from a dict. One SpfAnalyzer is shared
+by every zone of a run and remembers each DNS answer and each expanded include until its TTL
+runs out, so the few provider includes thousands of zones have in common are resolved once.
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+from typing import NamedTuple
+import aiohttp
+from metrics import metrics
+from resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+SPF_LOOKUP_LIMIT = 10
+SPF_VOID_LIMIT = 2
+# Include chains deeper than this are cut off (real evaluators give up long before, at 10 lookups)
+MAX_INCLUDE_DEPTH = 10
+# Terms that cost a DNS lookup; `redirect=` does too, unless the record has an `all` mechanism
+LOOKUP_MECHANISMS = {"include", "a", "mx", "ptr", "exists"}
+# Answers are kept at least this long, failures (timeouts, SERVFAIL) this long
+MIN_CACHE_TTL = 60
+FAILURE_TTL = 30
+NEGATIVE_TTL = 300
+# Errors that depend on the chain an include was reached from; such results are never cached
+CHAIN_ERRORS = ("PermError: include loop", "PermError: includes nested")
+
+DNS_TYPES = {"A": 1, "MX": 15, "TXT": 16}
+TXT_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+class DnsLookupError(Exception):
+    """No usable answer (timeout, SERVFAIL, ...), as opposed to an empty one."""
+
+class SpfResult(NamedTuple):
+    lookups: int
+    voids: int
+    error: str # None when the whole chain could be expanded
+    ttl: float # how long the result holds: the smallest TTL met in the chain
+
+    def report_fields(self):
+        lookups, voids = str(self.lookups), str(self.voids)
+        if self.error:
+            lookups = f"{self.lookups} ({self.error})"
+        elif self.lookups > SPF_LOOKUP_LIMIT:
+            lookups = f"{self.lookups} (PermError: over {SPF_LOOKUP_LIMIT})"
+        if self.voids > SPF_VOID_LIMIT:
+            voids = f"{self.voids} (PermError: over {SPF_VOID_LIMIT})"
+        return {"spf lookups": lookups, "spf void lookups": voids}
+
+NOT_ANALYZED = {"spf lookups": "N/A", "spf void lookups": "N/A"}
+
+def _txt_value(data):
+    """A TXT answer's character-strings ("a" "b" -> ab), as DoH JSON presents them."""
+    strings = TXT_STRING.findall(data)
+    if not strings:
+        return data
+    return "".join(re.sub(r'\\(.)', r'\1', s) for s in strings)
+
+def _is_spf(value):
+    return value[:6].lower() == "v=spf1" and (len(value) == 6 or value[6] == " ")
+
+def parse_terms(record, domain):
+    """(name, target) for every mechanism / modifier of an SPF record; target defaults to `domain`."""
+    terms = []
+    for term in record.split()[1:]:
+        term = term.lower()
+        name, sep, value = term.partition("=")
+        if sep and re.fullmatch(r"[a-z][a-z0-9_.-]*", name):
+            terms.append((name, value.rstrip(".")))
+            continue
+        term = term.lstrip("+-~?")
+        name, _, value = term.partition(":")
+        name = name.split("/", 1)[0]
+        target = value.split("/", 1)[0] if value else domain
+        terms.append((name, target.rstrip(".")))
+    return terms
+
+class DohResolver:
+    """DNS-over-HTTPS JSON API (`?name=&type=`, `Accept: application/dns-json`)."""
+    def __init__(self, url, timeout=5, concurrency=20, retries=2):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = None
+
+    async def open(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers={"Accept": "application/dns-json"}, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def query(self, name, rtype):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.semaphore, self.session.get(self.url, params={"name": name, "type": rtype}) as resp:
+                    resp.raise_for_status()
+                    data = await resp.json(content_type=None)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                if attempt == self.retries:
+                    raise DnsLookupError(f"{name} {rtype}: {type(e).__name__}") from e
+                await asyncio.sleep(backoff_delay(attempt, base=0.2, cap=2.0))
+
+        status = data.get("Status")
+        if status not in (0, 3): # NOERROR / NXDOMAIN
+            raise DnsLookupError(f"{name} {rtype}: rcode {status}")
+        answers = [a for a in data.get("Answer") or [] if a.get("type") == DNS_TYPES[rtype]]
+        if not answers:
+            authority = data.get("Authority") or []
+            return [], min((a.get("TTL", NEGATIVE_TTL) for a in authority), default=NEGATIVE_TTL)
+        if rtype == "TXT":
+            values = [_txt_value(a["data"]) for a in answers]
+        elif rtype == "MX":
+            values = [a["data"].split()[-1].rstrip(".") for a in answers]
+        else:
+            values = [a["data"] for a in answers]
+        return values, min(a.get("TTL", 0) for a in answers)
+
+class StaticResolver:
+    """In-memory resolver for tests and benchmarks: {(name, rtype): [values]}; unknown names answer empty."""
+    def __init__(self, records, ttl=300, latency=0.0):
+        self.records = {(name.lower(), rtype): values for (name, rtype), values in records.items()}
+        self.ttl = ttl
+        self.latency = latency
+        self.queries = 0
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def query(self, name, rtype):
+        self.queries += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return list(self.records.get((name, rtype), [])), self.ttl
+
+class SpfAnalyzer:
+    """
+    Expands SPF records over `resolver`, with one TTL-aware cache for the whole run.
+    Concurrent lookups of the same name share one query; expanded includes are cached whole
+    (except loops and over-deep chains, which depend on the chain they were reached from).
+    """
+    def __init__(self, resolver, min_ttl=MIN_CACHE_TTL):
+        self.resolver = resolver
+        self.min_ttl = min_ttl
+        self._answers = {} # (name, rtype) -> (expires, answers, or a DnsLookupError)
+        self._pending = {} # (name, rtype) -> in-flight query
+        self._includes = {} # domain -> (expires, SpfResult)
+        self.queries = 0
+        self.cache_hits = 0
+        self.include_hits = 0
+
+    async def open(self):
+        await self.resolver.open()
+
+    async def close(self):
+        await self.resolver.close()
+
+    async def analyze(self, domain, record):
+        """SpfResult for the SPF `record` published at `domain`."""
+        return await self._check(domain.lower(), record, (domain.lower(),))
+
+    async def _query(self, name, rtype):
+        """(answers, seconds they stay valid); raises DnsLookupError."""
+        key = (name, rtype)
+        cached = self._answers.get(key)
+        now = time.monotonic()
+        if cached and cached[0] > now:
+            self.cache_hits += 1
+            metrics.inc("spf_dns_cache_hits_total")
+            if isinstance(cached[1], DnsLookupError):
+                raise cached[1]
+            return cached[1], cached[0] - now
+        pending = self._pending.get(key)
+        if pending is None:
+            self.queries += 1
+            metrics.inc("spf_dns_queries_total", type=rtype)
+            pending = self._pending[key] = asyncio.ensure_future(self._resolve(key))
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            self.cache_hits += 1
+            metrics.inc("spf_dns_cache_hits_total")
+        # Shielded: one cancelled zone must not cancel a query other zones are waiting on
+        return await asyncio.shield(pending)
+
+    async def _resolve(self, key):
+        try:
+            with metrics.timer("spf_dns_query_seconds"):
+                answers, ttl = await self.resolver.query(*key)
+        except DnsLookupError as e:
+            self._answers[key] = (time.monotonic() + FAILURE_TTL, e)
+            raise
+        ttl = max(ttl, self.min_ttl)
+        self._answers[key] = (time.monotonic() + ttl, answers)
+        return answers, ttl
+
+    async def _expand(self, domain, chain):
+        """Cost of `include:domain` / `redirect=domain`: the record there, expanded."""
+        cached = self._includes.get(domain)
+        if cached and cached[0] > time.monotonic():
+            self.include_hits += 1
+            return cached[1]
+        if domain in chain:
+            return SpfResult(0, 0, f"{CHAIN_ERRORS[0]} at {domain}", math.inf)
+        if len(chain) > MAX_INCLUDE_DEPTH:
+            return SpfResult(0, 0, f"{CHAIN_ERRORS[1]} over {MAX_INCLUDE_DEPTH} deep", math.inf)
+        try:
+            answers, ttl = await self._query(domain, "TXT")
+        except DnsLookupError as e:
+            return SpfResult(0, 0, f"TempError: {e}", 0)
+        spf = [a for a in answers if _is_spf(a)]
+        if len(spf) != 1:
+            error = f"PermError: {'no' if not spf else 'multiple'} SPF records at {domain}"
+            result = SpfResult(0, 0 if answers else 1, error, ttl)
+        else:
+            result = await self._check(domain, spf[0], chain + (domain,))
+            result = result._replace(ttl=min(result.ttl, ttl))
+        if not (result.error or "").startswith(CHAIN_ERRORS):
+            self._includes[domain] = (time.monotonic() + result.ttl, result)
+        return result
+
+    async def _term_cost(self, name, target, chain):
+        if "%" in target:
+            # Macros depend on the message being checked; the lookup counts, its result can't be known
+            return SpfResult(1, 0, None, math.inf)
+        if name in ("include", "redirect"):
+            sub = await self._expand(target, chain)
+            return sub._replace(lookups=sub.lookups + 1)
+        if name == "ptr":
+            return SpfResult(1, 0, None, math.inf)
+        try:
+            answers, ttl = await self._query(target, "MX" if name == "mx" else "A")
+        except DnsLookupError as e:
+            return SpfResult(1, 0, f"TempError: {e}", 0)
+        return SpfResult(1, 0 if answers else 1, None, ttl)
+
+    async def _check(self, domain, record, chain):
+        terms = parse_terms(record, domain)
+        has_all = any(name == "all" for name, _ in terms)
+        costly = [(name, target) for name, target in terms
+                  if name in LOOKUP_MECHANISMS or (name == "redirect" and not has_all)]
+        costs = await asyncio.gather(*(self._term_cost(name, target, chain) for name, target in costly))
+        return SpfResult(
+            sum(c.lookups for c in costs), sum(c.voids for c in costs),
+            next((c.error for c in costs if c.error), None), min((c.ttl for c in costs), default=math.inf),
+        )
+
+    def stats(self):
+        return {"dns_queries": self.queries, "dns_cache_hits": self.cache_hits, "include_cache_hits": self.include_hits}
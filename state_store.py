@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domain_state (
+    domain              TEXT PRIMARY KEY,
+    zone_id             TEXT,
+    done                INTEGER NOT NULL DEFAULT 0,
+    spf_status          TEXT,
+    dmarc_status        TEXT,
+    spf_record_id       TEXT,
+    dmarc_record_id     TEXT,
+    spf_seen_hash       TEXT,
+    spf_written_hash    TEXT,
+    dmarc_seen_hash     TEXT,
+    dmarc_written_hash  TEXT,
+    first_seen_at       REAL,
+    updated_at          REAL
+);
+CREATE INDEX IF NOT EXISTS idx_domain_state_spf_status ON domain_state (spf_status);
+CREATE INDEX IF NOT EXISTS idx_domain_state_dmarc_status ON domain_state (dmarc_status);
+CREATE TABLE IF NOT EXISTS zone_scan (
+    zone_id             TEXT PRIMARY KEY,
+    domain              TEXT,
+    zone_modified_on    TEXT,
+    fingerprint         TEXT,
+    dry_run             INTEGER,
+    result_json         TEXT,
+    scanned_at          REAL,
+    policy_version      TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+UPSERT = """
+INSERT INTO domain_state (domain, zone_id, done, spf_status, dmarc_status, spf_record_id, dmarc_record_id,
+                          spf_seen_hash, spf_written_hash, dmarc_seen_hash, dmarc_written_hash,
+                          first_seen_at, updated_at)
+VALUES (:domain, :zone_id, :done, :spf_status, :dmarc_status, :spf_record_id, :dmarc_record_id,
+        :spf_seen_hash, :spf_written_hash, :dmarc_seen_hash, :dmarc_written_hash, :now, :now)
+ON CONFLICT(domain) DO UPDATE SET
+    zone_id = excluded.zone_id,
+    done = MAX(domain_state.done, excluded.done),
+    spf_status = excluded.spf_status,
+    dmarc_status = excluded.dmarc_status,
+    spf_record_id = COALESCE(excluded.spf_record_id, domain_state.spf_record_id),
+    dmarc_record_id = COALESCE(excluded.dmarc_record_id, domain_state.dmarc_record_id),
+    spf_seen_hash = excluded.spf_seen_hash,
+    spf_written_hash = COALESCE(excluded.spf_written_hash, domain_state.spf_written_hash),
+    dmarc_seen_hash = excluded.dmarc_seen_hash,
+    dmarc_written_hash = COALESCE(excluded.dmarc_written_hash, domain_state.dmarc_written_hash),
+    updated_at = excluded.updated_at
+"""
+
+UPSERT_SCAN = """
+INSERT OR REPLACE INTO zone_scan (zone_id, domain, zone_modified_on, fingerprint, dry_run, result_json, scanned_at,
+                                  policy_version)
+VALUES (:zone_id, :domain, :zone_modified_on, :fingerprint, :dry_run, :result_json, :scanned_at, :policy_version)
+"""
+
+WRITTEN_STATUSES = ("Updated", "Created", "Updated (Verification Failed - API Timeout)")
+
+def content_hash(value):
+    if not value or value in ("Missing", "Error", "N/A"):
+        return None
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+class StateStore:
+    """
+    Per-domain tracking state in an embedded SQLite database (WAL mode).
+    Lookups are indexed point/IN queries, so nothing is loaded into memory up front; results are
+    buffered and written `flush_size` rows per transaction.
+    """
+    def __init__(self, path, flush_size=50):
+        self.path = path
+        self.flush_size = flush_size
+        self._pending = []
+        self._pending_scans = []
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Databases from before policy versions were recorded: their scans (NULL) never match
+        if "policy_version" not in {row[1] for row in self.conn.execute("PRAGMA table_info(zone_scan)")}:
+            self.conn.execute("ALTER TABLE zone_scan ADD COLUMN policy_version TEXT")
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def import_csv(self, csv_path):
+        """One-time import of the legacy processed_domains.csv; later calls are no-ops."""
+        if self._get_meta("csv_imported") or not os.path.exists(csv_path):
+            return 0
+        with open(csv_path, mode='r', encoding='utf-8') as f:
+            domains = {row['domain'].strip().lower() for row in csv.DictReader(f) if row.get('domain')}
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO domain_state (domain, done, spf_status, dmarc_status, first_seen_at, updated_at) "
+                "VALUES (?, 1, 'Imported', 'Imported', ?, ?) ON CONFLICT(domain) DO UPDATE SET done = 1",
+                [(d, now, now) for d in domains]
+            )
+            self._set_meta("csv_imported", csv_path)
+        logger.info(f"📥 Imported {len(domains)} processed domains from {csv_path}")
+        return len(domains)
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def __contains__(self, domain):
+        """`domain in store` is True once the domain has been fully handled."""
+        row = self.conn.execute("SELECT done FROM domain_state WHERE domain = ?", (domain.lower(),)).fetchone()
+        return bool(row and row[0])
+
+    def done_among(self, domains):
+        """The subset of `domains` (lowercased) that are already done, in one indexed query."""
+        keys = list({d.lower() for d in domains})
+        if not keys:
+            return set()
+        placeholders = ",".join("?" * len(keys))
+        rows = self.conn.execute(
+            f"SELECT domain FROM domain_state WHERE done = 1 AND domain IN ({placeholders})", keys
+        )
+        return {r[0] for r in rows}
+
+    def with_status(self, status):
+        """(domain, zone_id) for every domain whose SPF or DMARC status is `status`, e.g. 'Update Failed'."""
+        return self.conn.execute(
+            "SELECT domain, zone_id FROM domain_state WHERE spf_status = ? "
+            "UNION SELECT domain, zone_id FROM domain_state WHERE dmarc_status = ?",
+            (status, status)
+        ).fetchall()
+
+    def record(self, res, done):
+        spf_written = res.get('spf status') in WRITTEN_STATUSES
+        dmarc_written = res.get('dmarc status') in WRITTEN_STATUSES
+        self._pending.append({
+            "domain": res['domain'].lower(),
+            "zone_id": res.get('zone_id'),
+            "done": 1 if done else 0,
+            "spf_status": res.get('spf status'),
+            "dmarc_status": res.get('dmarc status'),
+            "spf_record_id": res.get('spf_record_id'),
+            "dmarc_record_id": res.get('dmarc_record_id'),
+            "spf_seen_hash": content_hash(res.get('previous spf')),
+            "spf_written_hash": content_hash(res.get('new spf[updated]')) if spf_written else None,
+            "dmarc_seen_hash": content_hash(res.get('previous dmarc')),
+            "dmarc_written_hash": content_hash(res.get('new dmarc[updated]')) if dmarc_written else None,
+            "now": time.time(),
+        })
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+
+    def get_scan(self, zone_id):
+        """Last scan of a zone as a dict (result row decoded), or None."""
+        row = self.conn.execute(
+            "SELECT zone_modified_on, fingerprint, dry_run, result_json, scanned_at, policy_version "
+            "FROM zone_scan WHERE zone_id = ?",
+            (zone_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"zone_modified_on": row[0], "fingerprint": row[1], "dry_run": bool(row[2]),
+                "result": json.loads(row[3]), "scanned_at": row[4], "policy_version": row[5]}
+
+    def record_scan(self, zone_id, domain, zone_modified_on, fingerprint, dry_run, result, policy_version=None):
+        self._pending_scans.append({
+            "zone_id": zone_id, "domain": domain.lower(), "zone_modified_on": zone_modified_on,
+            "fingerprint": fingerprint, "dry_run": 1 if dry_run else 0,
+            "result_json": json.dumps(result), "scanned_at": time.time(), "policy_version": policy_version,
+        })
+        if len(self._pending_scans) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending and not self._pending_scans:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany(UPSERT, self._pending)
+                self.conn.executemany(UPSERT_SCAN, self._pending_scans)
+            self._pending = []
+            self._pending_scans = []
+        except sqlite3.Error as e:
+            logger.error(f"Error saving domain state ({len(self._pending) + len(self._pending_scans)} rows): {e}")
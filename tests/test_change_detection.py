@@ -0,0 +1,59 @@
+import pytest
+import change_detection
+from change_detection import ChangeDetector, fingerprint, policy_version
+from cloudflare_client import DnsRecord
+from state_store import StateStore
+
+ZONE = {"id": "z1", "name": "x.test", "modified_on": "2024-01-01T00:00:00Z"}
+ROW = {"domain": "x.test", "spf status": "Updated", "dmarc status": "No Change Needed", "mapped user": "old"}
+POLICY = policy_version(create_missing_dmarc=True)
+
+@pytest.fixture
+def state(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"), flush_size=1)
+    yield store
+    store.close()
+
+def detector(state, **kwargs):
+    return ChangeDetector(state, dry_run=False, **dict({"policy": POLICY}, **kwargs))
+
+def test_fingerprint_ignores_order_and_name_case():
+    a = DnsRecord("1", "TXT", "X.test", "v=spf1 -all")
+    b = DnsRecord("2", "TXT", "x.test", "v=spf1 a -all")
+    d = DnsRecord("3", "TXT", "_dmarc.x.test", "v=DMARC1; p=none")
+    assert fingerprint([a, b], [d]) == fingerprint([b, a._replace(name="x.test")], [d])
+    assert fingerprint([a], [d]) != fingerprint([b], [d])
+
+def test_policy_version_depends_on_settings():
+    assert policy_version(create_missing_dmarc=True) != policy_version(create_missing_dmarc=False)
+
+def test_reuses_an_unchanged_zone(state):
+    detector(state).remember("z1", "x.test", ZONE["modified_on"], "fp", ROW)
+    changes = detector(state)
+    row = changes.after_fetch(ZONE, "fp", "new user")
+    assert row == dict(ROW, **{"mapped user": "new user", "reused": True})
+    assert changes.stats() == {"reused_unfetched": 0, "reused_unchanged": 1}
+    assert changes.after_fetch(ZONE, "other", "new user") is None
+
+def test_never_reuses_across_policy_mode_or_age(state, monkeypatch):
+    detector(state).remember("z1", "x.test", ZONE["modified_on"], "fp", ROW)
+    assert detector(state, policy=policy_version(create_missing_dmarc=False)).after_fetch(ZONE, "fp", "u") is None
+    assert ChangeDetector(state, dry_run=True, policy=POLICY).after_fetch(ZONE, "fp", "u") is None
+    assert detector(state, enabled=False).after_fetch(ZONE, "fp", "u") is None
+    now = change_detection.time.time()
+    monkeypatch.setattr(change_detection.time, "time", lambda: now + 2 * 3600)
+    assert detector(state, max_age_hours=1).after_fetch(ZONE, "fp", "u") is None
+
+def test_does_not_remember_rows_to_retry(state):
+    detector(state).remember("z1", "x.test", ZONE["modified_on"], "fp", dict(ROW, **{"spf status": "Update Failed (500)"}))
+    detector(state).remember("z2", "y.test", ZONE["modified_on"], None, ROW)
+    assert state.get_scan("z1") is None
+    assert state.get_scan("z2") is None
+
+def test_modified_on_shortcut_is_opt_in(state):
+    detector(state).remember("z1", "x.test", ZONE["modified_on"], "fp", ROW)
+    assert detector(state).before_fetch(ZONE, "u") is None
+    trusting = detector(state, trust_modified_on=True)
+    assert trusting.before_fetch(ZONE, "u")["reused"] is True
+    assert trusting.before_fetch(dict(ZONE, modified_on="2024-02-01T00:00:00Z"), "u") is None
+    assert trusting.stats()["reused_unfetched"] == 1
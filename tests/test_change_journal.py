@@ -0,0 +1,60 @@
+import asyncio
+from cloudflare_client import DnsRecord
+from change_journal import ChangeJournal, _inverse, _merge_changes, read_run
+
+class FakeClient:
+    def __init__(self, records):
+        self.records = records # id -> DnsRecord
+
+    async def get_dns_record(self, zone_id, record_id):
+        return self.records.get(record_id)
+
+    async def find_dns_records(self, zone_id, type, name, content):
+        return [r for r in self.records.values() if (r.type, r.name, r.content) == (type, name, content)]
+
+def inverse(records, change, created=()):
+    return asyncio.run(_inverse(FakeClient(records), "z1", change, set(created)))
+
+UPDATE = {"op": "update", "record_id": "r1", "type": "TXT", "name": "x.test", "before": "v=spf1 -all", "after": "v=spf1 ~all"}
+CREATE = {"op": "create", "type": "TXT", "name": "_dmarc.x.test", "after": "v=DMARC1; p=reject"}
+DELETE = {"op": "delete", "record_id": "r2", "type": "TXT", "name": "x.test", "before": "v=spf1 a -all"}
+
+def test_merge_changes_keeps_first_before_and_last_after():
+    second = dict(UPDATE, before="v=spf1 ~all", after="v=spf1 a ~all")
+    assert _merge_changes([UPDATE, CREATE, second]) == [dict(UPDATE, after="v=spf1 a ~all"), CREATE]
+
+def test_inverse_of_an_update():
+    undo, skipped = inverse({"r1": DnsRecord("r1", "TXT", "x.test", "v=spf1 ~all")}, UPDATE)
+    assert skipped is None
+    assert undo == {"op": "update", "record_id": "r1", "type": "TXT", "name": "x.test",
+                    "before": "v=spf1 ~all", "after": "v=spf1 -all"}
+
+def test_inverse_of_an_update_skips_records_not_holding_the_run_write():
+    assert inverse({}, UPDATE) == (None, "Skipped (Could Not Read Record)")
+    assert inverse({"r1": DnsRecord("r1", "TXT", "x.test", "v=spf1 -all")}, UPDATE) == (None, "Skipped (Already Reverted)")
+    assert inverse({"r1": DnsRecord("r1", "TXT", "x.test", "v=spf1 mx ~all")}, UPDATE) == (None, "Skipped (Changed Since)")
+
+def test_inverse_of_a_create_only_deletes_the_created_record():
+    records = {"old": DnsRecord("old", "TXT", "_dmarc.x.test", "v=DMARC1; p=reject"),
+               "new": DnsRecord("new", "TXT", "_dmarc.x.test", "v=DMARC1; p=reject")}
+    undo, skipped = inverse(records, CREATE, created=["new"])
+    assert (undo["op"], undo["record_id"], skipped) == ("delete", "new", None)
+    assert inverse({"old": records["old"]}, CREATE, created=["new"]) == (None, "Skipped (Not Found)")
+
+def test_inverse_of_a_delete():
+    undo, skipped = inverse({}, DELETE)
+    assert undo == {"op": "create", "type": "TXT", "name": "x.test", "after": "v=spf1 a -all"}
+    assert inverse({"r3": DnsRecord("r3", "TXT", "x.test", "v=spf1 a -all")}, DELETE) == (None, "Skipped (Already Re-created)")
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ChangeJournal(path, "run-1")
+    journal.intent("z1", "x.test", [UPDATE, CREATE])
+    journal.outcome("z1", True, ["new"])
+    journal.close()
+    other = ChangeJournal(path, "run-2")
+    other.intent("z2", "y.test", [DELETE])
+    other.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"run": "run-1", "event": "int') # torn last line
+    assert read_run([path], "run-1") == {"z1": {"domain": "x.test", "changes": [UPDATE, CREATE], "created": ["new"]}}
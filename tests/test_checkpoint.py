@@ -0,0 +1,75 @@
+import os
+from checkpoint import RunCheckpoint, checkpoint_path_for, latest_checkpoint
+
+def touch(path, mtime):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{}")
+    os.utime(path, (mtime, mtime))
+
+def test_latest_checkpoint_ignores_shard_checkpoints_without_a_suffix(tmp_path):
+    touch(tmp_path / "run_a.checkpoint.json", 100)
+    touch(tmp_path / "run_b.shard-1-of-2.checkpoint.json", 200)
+    touch(tmp_path / "run_b.shard-2-of-2.checkpoint.json", 300)
+    assert latest_checkpoint(str(tmp_path)) == str(tmp_path / "run_a.checkpoint.json")
+
+def test_latest_checkpoint_picks_the_newest_of_its_shard(tmp_path):
+    touch(tmp_path / "run_a.shard-2-of-2.checkpoint.json", 100)
+    touch(tmp_path / "run_b.shard-2-of-2.checkpoint.json", 200)
+    touch(tmp_path / "run_b.shard-1-of-2.checkpoint.json", 300)
+    touch(tmp_path / "run_c.checkpoint.json", 400)
+    assert latest_checkpoint(str(tmp_path), ".shard-2-of-2") == str(tmp_path / "run_b.shard-2-of-2.checkpoint.json")
+
+def test_latest_checkpoint_without_any(tmp_path):
+    assert latest_checkpoint(str(tmp_path)) is None
+
+def test_checkpoint_path_for():
+    assert checkpoint_path_for("reports/run.xlsx") == "reports/run.checkpoint.json"
+
+class FakeReport:
+    def __init__(self, checkpoint_path):
+        self.checkpoint_path = checkpoint_path
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+def zones(*ids):
+    return [{"id": i} for i in ids]
+
+def test_cursor_only_moves_past_fully_finished_batches(tmp_path):
+    report = FakeReport(str(tmp_path / "run.csv"))
+    checkpoint = RunCheckpoint(str(tmp_path / "run.checkpoint.json"), report, {"dry_run": True})
+    assert checkpoint.begin_batch(None, "c1", zones("a", "b")) == zones("a", "b")
+    checkpoint.begin_batch("c1", "c2", zones("c"))
+    checkpoint.zone_done("c")
+    assert checkpoint.cursor is None
+    checkpoint.zone_done("a")
+    assert checkpoint.cursor is None
+    checkpoint.zone_done("b")
+    assert checkpoint.cursor == "c2"
+    assert report.flushes == 5
+
+def test_save_and_load_round_trip(tmp_path):
+    report = FakeReport(str(tmp_path / "run.csv"))
+    with open(report.checkpoint_path, "w", encoding="utf-8") as f:
+        f.write("domain,zone_id\na.test,a\nb.test,\n")
+    path = str(tmp_path / "run.checkpoint.json")
+    checkpoint = RunCheckpoint(path, report, {"dry_run": False}, completed={"a"})
+    assert checkpoint.begin_batch("c0", "c1", zones("a", "b")) == zones("b")
+    checkpoint.write_started("b", "b.test", [{"id": "r1"}], [])
+
+    loaded = RunCheckpoint.load(path, report)
+    assert RunCheckpoint.read_settings(path) == {"dry_run": False}
+    assert (loaded.cursor, loaded.completed) == ("c0", {"a"})
+    assert loaded.in_flight["b"]["patches"] == [{"id": "r1"}]
+
+    loaded.write_finished("b")
+    assert loaded.in_flight["b"]["applied"] is True
+    loaded.finish()
+    assert not os.path.exists(path)
+
+def test_a_batch_already_done_moves_the_cursor_on(tmp_path):
+    checkpoint = RunCheckpoint(str(tmp_path / "run.checkpoint.json"), FakeReport(str(tmp_path / "run.csv")), {},
+                               completed={"a"})
+    assert checkpoint.begin_batch("c0", "c1", zones("a")) == []
+    assert checkpoint.cursor == "c1"
@@ -0,0 +1,61 @@
+import asyncio
+import socket
+import pytest
+import mock_cloudflare
+from cloudflare_client import CloudflareClient
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def half_open(client):
+    client.breaker.state = "half_open"
+    client.breaker.trips = 1
+
+def test_probe_cancelled_while_waiting_on_the_limiter_is_given_back():
+    async def run():
+        client = CloudflareClient("test-token")
+        half_open(client)
+        blocked = asyncio.Event()
+
+        async def acquire():
+            blocked.set()
+            await asyncio.sleep(3600)
+
+        client.limiter.acquire = acquire
+        call = asyncio.ensure_future(client._request("GET", f"{client.base_url}/zones"))
+        await blocked.wait()
+        assert client.breaker._probe_in_flight
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        return client.breaker
+
+    breaker = asyncio.run(run())
+    assert not breaker._probe_in_flight
+    assert breaker.state == "half_open"
+
+@pytest.mark.parametrize("throttle_rate, state", [(1.0, "half_open"), (0.0, "closed")])
+def test_throttled_probe_does_not_close_the_breaker(throttle_rate, state):
+    async def run():
+        port = free_port()
+        runner = await mock_cloudflare.start_mock(
+            mock_cloudflare.MockCloudflare(3, throttle_rate=throttle_rate, retry_after=0), port=port)
+        client = CloudflareClient("test-token")
+        client.base_url = f"http://127.0.0.1:{port}/client/v4"
+        await client.open()
+        try:
+            half_open(client)
+            try:
+                await client._request("GET", f"{client.base_url}/zones")
+            except Exception:
+                pass
+            return client.breaker
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    breaker = asyncio.run(run())
+    assert breaker.state == state
+    assert not breaker._probe_in_flight
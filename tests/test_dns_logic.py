@@ -0,0 +1,74 @@
+import pytest
+from cloudflare_client import DnsRecord
+from dns_logic import (DmarcTags, ensure_mailto, evaluate_records, evaluate_zone, generate_updated_dmarc,
+                       generate_updated_spf, select_policy_records)
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Missing", "v=spf1 a mx ~all"),
+    ("", "v=spf1 a mx ~all"),
+    ("v=spf1 include:_spf.google.com -all", "v=spf1 include:_spf.google.com ~all"),
+    (" v=spf1 a ?all ", "v=spf1 a ~all"),
+    ("v=spf1 mx ~all", "v=spf1 mx ~all"),
+])
+def test_generate_updated_spf(raw, expected):
+    assert generate_updated_spf(raw) == expected
+
+def test_ensure_mailto():
+    assert ensure_mailto("a@x.test, mailto:b@x.test,") == "mailto:a@x.test, mailto:b@x.test"
+
+def test_dmarc_tags():
+    tags = DmarcTags.parse("v=DMARC1; p=quarantine; pct=100; rua=a@x.test; ruf=mailto:b@x.test")
+    assert tags == DmarcTags("a@x.test", "mailto:b@x.test", True, True)
+    assert DmarcTags.parse("v=DMARC1; p=none").strict is False
+
+def test_generate_updated_dmarc():
+    assert generate_updated_dmarc("Missing", "x.test") == \
+        "v=DMARC1; p=reject; sp=reject; pct=100; rua=mailto:dmarc-reports@x.test; adkim=r; aspf=r;"
+    # Already strict and well-formed: kept as-is
+    strict = "v=DMARC1; p=reject; rua=mailto:r@x.test"
+    assert generate_updated_dmarc(strict, "x.test") == strict
+    # Strict but with a syntax error: rewritten with the addresses fixed
+    assert generate_updated_dmarc("v=DMARC1; p=reject; rua=r@x.test; ruf=f@x.test", "x.test") == \
+        "v=DMARC1; p=reject; sp=reject; pct=100; rua=mailto:r@x.test; ruf=mailto:f@x.test; adkim=r; aspf=r;"
+
+def test_evaluate_records_matches_single_calls():
+    items = [("v=spf1 -all", "Missing", "a.test"), ("v=spf1 -all", "Missing", "b.test")]
+    assert evaluate_records(items) == [(generate_updated_spf(s), generate_updated_dmarc(d, dom)) for s, d, dom in items]
+
+def test_select_policy_records():
+    records = [
+        DnsRecord("1", "TXT", "Example.com", "v=spf1 -all"),
+        DnsRecord("2", "TXT", "sub.example.com", "v=spf1 -all"),
+        DnsRecord("3", "TXT", "_dmarc.example.com", "v=DMARC1; p=none"),
+        DnsRecord("4", "CNAME", "_dmarc.example.com", "elsewhere.test"),
+        DnsRecord("5", "TXT", "example.com", "site-verification=1"),
+    ]
+    spf, dmarc = select_policy_records("example.com", records)
+    assert [r.id for r in spf] == ["1"]
+    assert [r.id for r in dmarc] == ["3"]
+
+def spf(content):
+    return DnsRecord("s", "TXT", "x.test", content)
+
+def dmarc(content):
+    return DnsRecord("d", "TXT", "_dmarc.x.test", content)
+
+def test_evaluate_zone_updates_and_creates():
+    fields, spf_action, dmarc_action = evaluate_zone("x.test", [spf("v=spf1 -all")], [])
+    assert (spf_action, dmarc_action) == ("update", "create")
+    assert fields["risk"] == "Missing DMARC"
+    assert evaluate_zone("x.test", [spf("v=spf1 -all")], [], create_missing_dmarc=False)[2] is None
+
+def test_evaluate_zone_skips_risky_changes():
+    fields, spf_action, dmarc_action = evaluate_zone(
+        "x.test", [spf("v=spf1 -all"), spf("v=spf1 a -all")], [dmarc("v=DMARC1; p=none"), dmarc("v=DMARC1; p=none")])
+    assert (spf_action, dmarc_action) == (None, None)
+    assert fields["risk"] == "Multiple SPF (2), Multiple DMARC (2)"
+    assert fields["spf status"] == "Skipped (Multiple SPF (2))"
+    assert fields["dmarc status"] == "Skipped (Multiple DMARC (2))"
+
+def test_evaluate_zone_no_change_needed():
+    fields, spf_action, dmarc_action = evaluate_zone(
+        "x.test", [spf("v=spf1 a ~all")], [dmarc("v=DMARC1; p=reject; rua=mailto:r@x.test")])
+    assert (spf_action, dmarc_action) == (None, None)
+    assert fields["spf status"] == fields["dmarc status"] == "No Change Needed"
@@ -0,0 +1,73 @@
+import io
+import json
+import pytest
+from offline_audit import _iter_json_array, audit_file, parse_bind, parse_export
+
+ZONE = """;; Domain:     example.com.
+;; Exported:   2024-01-01
+$ORIGIN example.com.
+$TTL 3600
+@\t3600\tIN\tSOA\tns1.example.com. admin.example.com. (
+\t\t2024010101 ; serial
+\t\t7200 3600 1209600 3600 )
+example.com.\t300\tIN\tTXT\t"v=spf1 include:_spf.google.com " "-all" ; split in two strings
+_dmarc\tIN\t300\tTXT\t"v=DMARC1; p=none; rua=reports@example.com"
+www\t1\tIN\tTXT\t"google-site-verification=abc"
+\tIN\tTXT\t"v=spf1 a ~all"
+"""
+
+def test_parse_bind_keeps_only_policy_records():
+    apex, records = parse_bind(io.StringIO(ZONE))
+    assert apex == "example.com"
+    assert [(r.name, r.content) for r in records] == [
+        ("example.com", "v=spf1 include:_spf.google.com -all"),
+        ("_dmarc.example.com", "v=DMARC1; p=none; rua=reports@example.com"),
+        # Indented entry inherits the previous owner
+        ("www.example.com", "v=spf1 a ~all"),
+    ]
+
+def test_parse_bind_falls_back_to_header_then_origin():
+    lines = [";; Domain: header.test.\n", "@ IN TXT \"v=spf1 -all\"\n"]
+    apex, records = parse_bind(lines, origin="file.test")
+    assert apex == "header.test"
+    assert records[0].name == "file.test"
+    assert parse_bind(["@ IN TXT \"v=spf1 -all\"\n"], origin="file.test")[0] == "file.test"
+
+def test_parse_bind_unescapes_and_ignores_semicolons_in_quotes():
+    apex, records = parse_bind(['_dmarc.a.test. TXT "v=DMARC1\\059 p=reject; rua=mailto:x@a.test"\n'])
+    assert records[0].content == "v=DMARC1; p=reject; rua=mailto:x@a.test"
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_json_array_across_chunk_boundaries(chunk_size):
+    objects = [{"id": str(i), "content": "v=spf1 [x] {y} \"q\" ~all"} for i in range(5)]
+    text = "  \n" + json.dumps(objects, indent=2)
+    assert list(_iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == objects
+
+def test_iter_json_array_empty_and_invalid():
+    assert list(_iter_json_array(io.StringIO(" [ ] "))) == []
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO('{"result": []}')))
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO('[{"id": 1}, {"id": '), chunk_size=4))
+
+def test_parse_export_groups_json_records_by_zone(tmp_path):
+    path = tmp_path / "dump.json"
+    path.write_text(json.dumps([
+        {"id": "1", "zone_id": "z1", "zone_name": "a.test", "type": "TXT", "name": "a.test", "content": "v=spf1 -all"},
+        {"id": "2", "zone_id": "z1", "zone_name": "a.test", "type": "A", "name": "a.test", "content": "192.0.2.1"},
+        {"id": "3", "zone_id": "z2", "zone_name": "b.test", "type": "MX", "name": "b.test", "content": "mx.b.test"},
+    ]))
+    zones = {domain: (zone_id, [r.id for r in records]) for domain, zone_id, records in parse_export(str(path))}
+    assert zones == {"a.test": ("z1", ["1"]), "b.test": ("z2", [])}
+
+def test_audit_file_rows(tmp_path):
+    (tmp_path / "example.com.txt").write_text(ZONE)
+    (tmp_path / "broken.json").write_text("[{")
+    [row] = audit_file(str(tmp_path / "example.com.txt"))
+    assert row["domain"] == "example.com"
+    assert row["new spf[updated]"] == "v=spf1 include:_spf.google.com ~all"
+    assert row["spf status"] == "Dry Run: Would Update"
+    assert row["dmarc status"] == "Dry Run: Would Update"
+    [error] = audit_file(str(tmp_path / "broken.json"))
+    assert error["domain"] == "broken"
+    assert error["risk"].startswith("Export Parse Error")
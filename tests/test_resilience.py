@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+import rate_limiter
+import resilience
+from rate_limiter import TokenBucket, parse_rate_limit_headers, parse_retry_after
+from resilience import CircuitBreaker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert parse_retry_after(None) is None
+
+def test_parse_rate_limit_headers():
+    assert parse_rate_limit_headers({"Ratelimit": '"default";r=42;t=17'}) == (42, 17.0)
+    assert parse_rate_limit_headers({"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": "30"}) == (5, 30.0)
+    assert parse_rate_limit_headers({"X-RateLimit-Remaining": "lots"}) == (None, None)
+    assert parse_rate_limit_headers({}) == (None, None)
+
+def test_bucket_refills_at_the_paced_rate_up_to_burst(clock):
+    bucket = TokenBucket(1200, 300, utilization=0.5, burst=4)
+    assert bucket.rate == 2.0
+    bucket.tokens = 0
+    clock.now += 1
+    bucket._refill(clock.now)
+    assert bucket.tokens == 2.0
+    clock.now += 60
+    bucket._refill(clock.now)
+    assert bucket.tokens == 4.0
+
+def test_bucket_follows_the_server_view(clock):
+    bucket = TokenBucket(1200, 300, burst=10)
+    bucket.observe(200, {"X-RateLimit-Remaining": "3"})
+    assert bucket.tokens == 3.0
+    bucket.observe(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "12"})
+    assert (bucket.tokens, bucket.paused_until) == (0, clock.now + 12)
+    bucket.observe(429, {"Retry-After": "30"})
+    assert bucket.paused_until == clock.now + 30
+    # A shorter pause never cuts a longer one short
+    bucket.pause(5)
+    assert bucket.paused_until == clock.now + 30
+    assert bucket.stats()["throttled"] == 1
+
+def test_bucket_acquire_spends_burst_without_waiting():
+    bucket = TokenBucket(1200, 300, burst=3)
+
+    async def run():
+        for _ in range(3):
+            await asyncio.wait_for(bucket.acquire(), 0.1)
+
+    asyncio.run(run())
+    assert bucket.stats()["tokens_spent"] == 3
+    assert bucket.tokens < 1
+
+def test_breaker_opens_on_error_rate_and_backs_off(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=4, window=30, open_seconds=10, max_open_seconds=15)
+    for failed in (True, False, True):
+        breaker.record(failed)
+    assert breaker.state == "closed" # below min_calls
+    breaker.record(True)
+    assert (breaker.state, breaker.opened_until) == ("open", clock.now + 10)
+
+    clock.now += 10
+    assert asyncio.run(breaker.wait()) is True
+    assert breaker.state == "half_open"
+    breaker.record(True, probe=True)
+    # Doubled, capped at max_open_seconds
+    assert (breaker.state, breaker.opened_until) == ("open", clock.now + 15)
+
+    clock.now += 15
+    assert asyncio.run(breaker.wait()) is True
+    breaker.record(False, probe=True)
+    assert (breaker.state, breaker.trips) == ("closed", 0)
+    assert asyncio.run(breaker.wait()) is False
+
+def test_breaker_forgets_outcomes_outside_the_window(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=3, window=30)
+    breaker.record(True)
+    breaker.record(True)
+    clock.now += 31
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+def test_abandoned_probe_lets_the_next_caller_probe(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=1)
+    breaker.record(True)
+    clock.now += 1
+    assert asyncio.run(breaker.wait()) is True
+    breaker.abandon_probe()
+    assert asyncio.run(breaker.wait()) is True
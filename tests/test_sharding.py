@@ -0,0 +1,22 @@
+import sys
+from sharding import Shard, parse_shard, run_local_shards, shard_path
+
+def test_shard_path():
+    assert shard_path("reports/run.xlsx", Shard(2, 8)) == "reports/run.shard-2-of-8.xlsx"
+    assert shard_path("reports/run.xlsx", None) == "reports/run.xlsx"
+
+def test_shards_split_zones_between_them():
+    shards = [parse_shard(f"{i}/3") for i in range(1, 4)]
+    for zone_id in (f"zone-{n:04d}" for n in range(200)):
+        assert sum(shard.owns(zone_id) for shard in shards) == 1
+
+def test_run_local_shards_reports_failed_children(tmp_path, monkeypatch):
+    # Stand-in for main.py: shard 2 crashes
+    script = tmp_path / "child.py"
+    script.write_text("import sys\nsys.exit(3 if sys.argv[sys.argv.index('--shard') + 1].startswith('2/') else 0)\n")
+    monkeypatch.setattr(sys, "argv", [str(script)])
+    monkeypatch.setenv("LOG_FILE_PATH", str(tmp_path / "automation.log"))
+
+    reports, failed = run_local_shards(3, ["--shards", "3"], str(tmp_path / "run.xlsx"))
+    assert [str(shard) for shard in failed] == ["2/3"]
+    assert reports == [str(tmp_path / f"run.shard-{i}-of-3.xlsx") for i in range(1, 4)]
@@ -0,0 +1,105 @@
+import asyncio
+import spf_analysis
+from spf_analysis import DnsLookupError, SpfAnalyzer, StaticResolver
+
+RECORDS = {
+    ("example.com", "A"): ["192.0.2.1"],
+    ("_spf.provider.net", "TXT"): ["v=spf1 ip4:198.51.100.0/24 include:inner.provider.net -all"],
+    ("inner.provider.net", "TXT"): ["some-verification=abc", "v=spf1 a:mail.provider.net -all"],
+    ("mail.provider.net", "A"): ["198.51.100.7"],
+    ("loop-a.example", "TXT"): ["v=spf1 include:loop-b.example -all"],
+    ("loop-b.example", "TXT"): ["v=spf1 include:loop-a.example -all"],
+}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+def analyze(record, domain="example.com", resolver=None, **kwargs):
+    analyzer = SpfAnalyzer(resolver or StaticResolver(RECORDS), **kwargs)
+    return asyncio.run(analyzer.analyze(domain, record)), analyzer
+
+def test_counts_lookups_through_nested_includes():
+    # a + mx + include(_spf) + include(inner) + a:mail; ip4 and all are free
+    result, _ = analyze("v=spf1 a mx include:_spf.provider.net ~all")
+    assert (result.lookups, result.voids, result.error) == (5, 1, None)
+    assert result.report_fields() == {"spf lookups": "5", "spf void lookups": "1"}
+
+def test_flags_more_than_ten_lookups():
+    record = "v=spf1 " + " ".join(f"a:host{i}.example.com" for i in range(11)) + " ~all"
+    result, _ = analyze(record)
+    assert result.lookups == 11
+    assert result.report_fields()["spf lookups"] == "11 (PermError: over 10)"
+
+def test_counts_void_lookups():
+    result, _ = analyze("v=spf1 a:nx1.example.com mx:nx2.example.com a:nx3.example.com a ~all")
+    assert (result.lookups, result.voids) == (4, 3)
+    assert result.report_fields()["spf void lookups"] == "3 (PermError: over 2)"
+
+def test_include_without_spf_record_is_a_void_permerror():
+    result, _ = analyze("v=spf1 include:nothing.example.net ~all")
+    assert result.lookups == 1 and result.voids == 1
+    assert result.error.startswith("PermError: no SPF records at nothing.example.net")
+
+def test_include_loop_is_reported_and_not_cached():
+    result, analyzer = analyze("v=spf1 include:loop-a.example -all")
+    assert result.error.startswith("PermError: include loop")
+    assert "loop-a.example" not in analyzer._includes
+    assert "loop-b.example" not in analyzer._includes
+
+def test_self_include_is_a_loop():
+    result, _ = analyze("v=spf1 include:example.com -all")
+    assert result.error == "PermError: include loop at example.com"
+
+def test_redirect_is_ignored_when_all_is_present():
+    result, _ = analyze("v=spf1 a redirect=_spf.provider.net -all")
+    assert (result.lookups, result.error) == (1, None)
+
+def test_redirect_is_followed_without_all():
+    result, _ = analyze("v=spf1 redirect=_spf.provider.net")
+    # redirect + include(inner) + a:mail
+    assert (result.lookups, result.voids, result.error) == (3, 0, None)
+
+def test_answers_and_includes_expire_with_their_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(spf_analysis, "time", clock)
+    resolver = StaticResolver(RECORDS, ttl=60)
+    analyzer = SpfAnalyzer(resolver, min_ttl=0)
+    record = "v=spf1 a include:_spf.provider.net ~all"
+
+    first = asyncio.run(analyzer.analyze("example.com", record))
+    queries = resolver.queries
+    clock.now += 59
+    # Served from the cache, valid for what is left of the 60s
+    assert asyncio.run(analyzer.analyze("example.com", record)) == first._replace(ttl=1)
+    assert resolver.queries == queries
+    assert analyzer.include_hits == 1
+
+    clock.now += 2
+    asyncio.run(analyzer.analyze("example.com", record))
+    assert resolver.queries == 2 * queries
+
+def test_concurrent_zones_share_one_query_per_name():
+    resolver = StaticResolver(RECORDS, latency=0.01)
+    analyzer = SpfAnalyzer(resolver)
+
+    async def run():
+        return await asyncio.gather(*(
+            analyzer.analyze(f"zone{i}.example", "v=spf1 include:_spf.provider.net ~all") for i in range(50)))
+
+    results = asyncio.run(run())
+    assert {r.lookups for r in results} == {3}
+    # _spf TXT, inner TXT, mail A
+    assert resolver.queries == 3
+
+def test_resolver_failure_is_a_temperror():
+    class FailingResolver(StaticResolver):
+        async def query(self, name, rtype):
+            raise DnsLookupError(f"{name} {rtype}: rcode 2")
+
+    result, _ = analyze("v=spf1 include:_spf.provider.net ~all", resolver=FailingResolver({}))
+    assert result.error == "TempError: _spf.provider.net TXT: rcode 2"
+    assert result.report_fields()["spf lookups"] == "1 (TempError: _spf.provider.net TXT: rcode 2)"
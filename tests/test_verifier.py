@@ -0,0 +1,47 @@
+import asyncio
+from cloudflare_client import DnsRecord
+from verifier import Verifier, VerifyCheck
+
+class FakeClient:
+    def __init__(self, content):
+        self.content = content
+        self.reads = 0
+
+    async def get_dns_record(self, zone_id, record_id):
+        self.reads += 1
+        return DnsRecord(id=record_id, type="TXT", name="example.com", content=self.content)
+
+def run_verifier(client, on_done, attempts=2, queue_size=4, zones=1):
+    async def run():
+        verifier = Verifier(client, on_done, settle_delay=0, attempts=attempts, concurrency=2, queue_size=queue_size)
+        verifier.start()
+        for i in range(zones):
+            row = {"domain": f"zone{i}.example", "spf status": "Pending Verification"}
+            await verifier.submit(row["domain"], f"z{i}", row, [VerifyCheck("spf status", "r1", "v=spf1 ~all", "SPF")])
+        await verifier.join()
+        return verifier
+    return asyncio.run(run())
+
+def test_verified_rows_are_delivered_once():
+    rows = []
+    verifier = run_verifier(FakeClient("v=spf1 ~all"), rows.append, zones=10)
+    assert [r["spf status"] for r in rows] == ["Updated"] * 10
+    assert verifier._slots._value == 4
+
+def test_unchanged_content_fails_after_every_attempt():
+    rows, client = [], FakeClient("v=spf1 -all")
+    run_verifier(client, rows.append, attempts=3)
+    assert client.reads == 3
+    assert rows[0]["spf status"] == "Update Failed (Verification Failed)"
+
+def test_failing_on_done_is_not_a_verification_failure():
+    calls = []
+
+    def on_done(row):
+        calls.append(dict(row))
+        raise OSError("disk full")
+
+    verifier = run_verifier(FakeClient("v=spf1 ~all"), on_done, zones=3)
+    # Called once per zone with the real status, and every backlog slot given back exactly once
+    assert [c["spf status"] for c in calls] == ["Updated"] * 3
+    assert verifier._slots._value == 4
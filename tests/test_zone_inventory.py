@@ -0,0 +1,44 @@
+import asyncio
+import socket
+import time
+import mock_cloudflare
+from cloudflare_client import CloudflareClient
+from state_store import StateStore
+from zone_inventory import ZoneInventory
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def refresh_runs(tmp_path, mock, runs):
+    """Zone counts fetched by `runs` successive refreshes, and the inventory."""
+    async def run():
+        port = free_port()
+        runner = await mock_cloudflare.start_mock(mock, port=port)
+        client = CloudflareClient("test-token")
+        client.base_url = f"http://127.0.0.1:{port}/client/v4"
+        await client.open()
+        inventory = ZoneInventory(StateStore(str(tmp_path / "state.db")))
+        try:
+            return [await inventory.refresh(client) for _ in range(runs)], inventory
+        finally:
+            await client.close()
+            await runner.cleanup()
+    return asyncio.run(run())
+
+def test_delta_refresh_only_fetches_changed_zones(tmp_path):
+    mock = mock_cloudflare.MockCloudflare(45)
+    fetched, inventory = refresh_runs(tmp_path, mock, 2)
+    assert fetched == [45, 0]
+    assert len(inventory) == 45
+
+def test_rejected_ordering_falls_back_to_a_full_refresh_without_retrying(tmp_path, caplog):
+    mock = mock_cloudflare.MockCloudflare(45, reject_zone_order=True)
+    started = time.monotonic()
+    fetched, inventory = refresh_runs(tmp_path, mock, 3)
+    assert fetched == [45, 45, 45]
+    assert inventory.delta_unavailable == {CloudflareClient("test-token").token_id}
+    # One rejected request, no 3 x 5s page retries
+    assert time.monotonic() - started < 5
+    assert sum("Delta refresh unavailable" in r.getMessage() for r in caplog.records) == 1
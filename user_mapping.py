@@ -0,0 +1,78 @@
+import logging
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Case-insensitive collation: lets `$in` match "Example.com" against "example.com" and can be
+# served by an index on `domain` created with the same collation.
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+PROJECTION = {"_id": 0, "domain": 1, "user": 1, "contactDetails.email": 1}
+
+def _normalize(domain):
+    return str(domain).strip().lower()
+
+def resolve_user(doc):
+    """Same precedence as the old per-domain lookup: user, then first contact email."""
+    try:
+        user = doc.get("user")
+        if user: return str(user)
+        contacts = doc.get("contactDetails", [])
+        if contacts and isinstance(contacts, list) and len(contacts) > 0:
+            return str(contacts[0].get("email", "Unknown Email"))
+        return "Domain Found (No User Info)"
+    except Exception:
+        return "Error"
+
+class UserMapping:
+    """
+    Per-run domain -> user cache backed by `vercel.dfyinfrasetups`.
+    Either load the whole (projected) collection once with `load_all`, or resolve a page of
+    domains at a time with `prefetch`; `get` is then a pure dict lookup.
+    """
+    def __init__(self, mongo_client):
+        self.mongo_client = mongo_client
+        self.cache = {}
+        self.loaded_all = False
+
+    def _collection(self):
+        return self.mongo_client[config.DB_NAME][config.COLLECTION_NAME]
+
+    def load_all(self):
+        if self.mongo_client is None:
+            return
+        try:
+            for doc in self._collection().find({}, PROJECTION):
+                if doc.get("domain"):
+                    # First document wins, like find_one did
+                    self.cache.setdefault(_normalize(doc["domain"]), resolve_user(doc))
+            self.loaded_all = True
+            logger.info(f"👥 Loaded {len(self.cache)} domain mappings from MongoDB")
+        except Exception as e:
+            logger.error(f"❌ Failed to load user mappings: {e}")
+
+    def prefetch(self, domains):
+        """Resolve every not-yet-cached domain in `domains` with a single query."""
+        if self.mongo_client is None or self.loaded_all:
+            return
+        missing = list({_normalize(d) for d in domains} - self.cache.keys())
+        if not missing:
+            return
+        try:
+            found = {}
+            cursor = self._collection().find({"domain": {"$in": missing}}, PROJECTION, collation=CASE_INSENSITIVE)
+            for doc in cursor:
+                found.setdefault(_normalize(doc.get("domain", "")), resolve_user(doc))
+            for key in missing:
+                self.cache[key] = found.get(key, "Not Found")
+        except Exception as e:
+            logger.error(f"Error fetching user mappings for {len(missing)} domains: {e}")
+            for key in missing:
+                self.cache[key] = "Error"
+
+    def get(self, domain):
+        if self.mongo_client is None:
+            return "N/A (No MongoDB)"
+        key = _normalize(domain)
+        if key not in self.cache and not self.loaded_all:
+            self.prefetch([key])
+        return self.cache.get(key, "Not Found")
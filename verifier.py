@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+from config import config
+from metrics import metrics
+from logging_setup import log_context, zone_logger
+
+logger = logging.getLogger(__name__)
+
+class VerifyCheck(NamedTuple):
+    """One written record to confirm: `status_key` in the result row gets the final status."""
+    status_key: str
+    record_id: str
+    expected_content: str
+    label: str
+    verified_status: str = "Updated"
+
+class _Job(NamedTuple):
+    ready_at: float
+    attempt: int
+    domain: str
+    zone_id: str
+    row: dict
+    checks: list
+
+class Verifier:
+    """
+    Background post-update verification.
+    Workers submit the checks for a zone right after their writes and move on; this stage waits
+    `settle_delay`, re-reads the written records (one policy listing when a zone has several
+    checks, a single-record GET otherwise), retries up to `attempts` times, writes the final
+    statuses into the result row and hands the row to `on_done`.
+    At most `queue_size` zones are waiting on or in verification; `submit` blocks once that many
+    are, so writes can't run arbitrarily far ahead of it.
+    """
+    def __init__(self, client, on_done, settle_delay=None, attempts=None, concurrency=None, queue_size=None):
+        self.client = client
+        self.on_done = on_done
+        self.settle_delay = config.VERIFY_SETTLE_DELAY if settle_delay is None else settle_delay
+        self.attempts = attempts or config.VERIFY_ATTEMPTS
+        self.concurrency = concurrency or config.VERIFY_CONCURRENCY
+        self.queue_size = queue_size or config.VERIFY_QUEUE_SIZE
+        self.queue = None
+        self._slots = None
+        self._workers = []
+
+    def start(self):
+        # Retries go back on the queue from the workers, so the bound is on zones admitted rather than
+        # on the queue itself (a worker blocked re-queueing into a full queue could never drain it)
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.queue_size)
+        metrics.gauge_fn("queue_depth", self.queue.qsize, queue="verify")
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+
+    async def submit(self, domain, zone_id, row, checks):
+        await self._slots.acquire()
+        self.queue.put_nowait(_Job(time.monotonic() + self.settle_delay, 1, domain, zone_id, row, list(checks)))
+
+    async def join(self):
+        """Wait for every submitted check to reach a final status, then stop the workers."""
+        await self.queue.join()
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _fetch(self, job):
+        """Current content by record id, or None if the API call failed."""
+        if len(job.checks) == 1:
+            record = await self.client.get_dns_record(job.zone_id, job.checks[0].record_id)
+            return None if record is None else {record.id: record.content}
+        records = await self.client.get_policy_records(job.zone_id, job.domain)
+        return None if records is None else {r.id: r.content for r in records}
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                try:
+                    with log_context(zone_id=job.zone_id, domain=job.domain, stage="verify"):
+                        finished = await self._verify(job)
+                except Exception as e:
+                    logger.error(f"❌ Verification error for {job.domain}: {e}")
+                    for check in job.checks:
+                        job.row[check.status_key] = "Updated (Verification Failed - API Timeout)"
+                    finished = True
+                if finished:
+                    self._finish(job)
+            finally:
+                self.queue.task_done()
+
+    async def _verify(self, job):
+        """True once the job's checks are final, False when it went back on the queue for a retry."""
+        delay = job.ready_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        with metrics.timer("stage_seconds", stage="verify"):
+            current = await self._fetch(job)
+        pending = []
+        for check in job.checks:
+            if current is not None and current.get(check.record_id) == check.expected_content:
+                job.row[check.status_key] = check.verified_status
+                zone_logger.info("✅ %s Verified and Tagged for %s", check.label, job.domain)
+            else:
+                pending.append(check)
+                zone_logger.warning("⚠️ %s Verification attempt %d failed for %s...", check.label, job.attempt, job.domain)
+
+        if pending and job.attempt < self.attempts:
+            self.queue.put_nowait(job._replace(
+                ready_at=time.monotonic() + self.settle_delay, attempt=job.attempt + 1, checks=pending
+            ))
+            return False
+
+        for check in pending:
+            metrics.inc("verify_failures_total")
+            if current is None:
+                job.row[check.status_key] = "Updated (Verification Failed - API Timeout)"
+                zone_logger.warning("⚠️ %s Verification skipped for %s due to API Timeout.", check.label, job.domain)
+            else:
+                job.row[check.status_key] = "Update Failed (Verification Failed)"
+                zone_logger.error("❌ %s Verification FAILED for %s - Content unchanged after update.", check.label, job.domain)
+        return True
+
+    def _finish(self, job):
+        """Deliver a finished row exactly once; a failing `on_done` is not a verification failure."""
+        try:
+            self.on_done(job.row)
+        except Exception as e:
+            logger.error(f"❌ Could not record the verified result for {job.domain}: {e}")
+        finally:
+            self._slots.release()
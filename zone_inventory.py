@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from resilience import RequestRejected
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zone_inventory (
+    zone_id      TEXT PRIMARY KEY,
+    name         TEXT NOT NULL,
+    status       TEXT,
+    modified_on  TEXT,
+    seen_at      REAL,
+    token        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_zone_inventory_name ON zone_inventory (name);
+"""
+
+UPSERT = """
+INSERT OR REPLACE INTO zone_inventory (zone_id, name, status, modified_on, seen_at, token)
+VALUES (:id, :name, :status, :modified_on, :seen_at, :token)
+"""
+
+# Newest first, so a delta refresh can stop at the first zone older than the watermark
+DELTA_PARAMS = {"order": "modified_on", "direction": "desc"}
+
+class ZoneInventory:
+    """
+    Local copy of the account's zone list (id, name, status, modified_on), kept next to the
+    domain state in the same SQLite database so pending work is one join away.
+
+    `refresh()` pages all of /zones only the first time and every `full_refresh_hours` (which
+    is also when deleted zones are dropped); in between it asks for zones newest-first and stops
+    at the first one not newer than the last seen `modified_on`. If the API ignores the ordering
+    or the zone count doesn't add up, the refresh falls back to a full listing rather than
+    missing zones.
+
+    Every zone remembers which API token listed it (`token_of`); with a ClientPool each token's
+    zones are refreshed concurrently, with their own watermark and full-refresh schedule.
+    """
+    def __init__(self, state, full_refresh_hours=24):
+        self.conn = state.conn
+        self.full_refresh_hours = full_refresh_hours
+        # Tokens whose /zones refused the newest-first ordering this run: no delta refresh for them
+        self.delta_unavailable = set()
+        self.conn.executescript(SCHEMA)
+        # Inventories created before tokens were tracked
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(zone_inventory)")}
+        if "token" not in columns:
+            self.conn.execute("ALTER TABLE zone_inventory ADD COLUMN token TEXT")
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _save(self, zones, now, token):
+        self.conn.executemany(UPSERT, [
+            {"id": z['id'], "name": z['name'].lower(), "status": z.get('status'),
+             "modified_on": z.get('modified_on') or "", "seen_at": now, "token": token}
+            for z in zones
+        ])
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM zone_inventory").fetchone()[0]
+
+    def _count(self, token):
+        return self.conn.execute("SELECT COUNT(*) FROM zone_inventory WHERE token = ?", (token,)).fetchone()[0]
+
+    def token_of(self, zone_id):
+        row = self.conn.execute("SELECT token FROM zone_inventory WHERE zone_id = ?", (zone_id,)).fetchone()
+        return row[0] if row else None
+
+    def _needs_full(self, token):
+        full_at = self._meta(f"inventory_full_at:{token}")
+        return not full_at or time.time() - float(full_at) > self.full_refresh_hours * 3600
+
+    async def refresh(self, client, full=False):
+        """Bring the inventory up to date for every token of `client`; returns the number of zones fetched."""
+        fetched = await asyncio.gather(*(self._refresh_token(member, full) for member in client.members))
+        return sum(fetched)
+
+    async def _refresh_token(self, client, full):
+        if full or self._needs_full(client.token_id) or client.token_id in self.delta_unavailable:
+            return await self._full_refresh(client)
+        try:
+            fetched = await self._delta_refresh(client)
+        except RequestRejected as e:
+            self.delta_unavailable.add(client.token_id)
+            logger.warning(f"⚠️ Delta refresh unavailable for token {client.token_id}: /zones rejected "
+                           f"{DELTA_PARAMS} ({e}); doing a full inventory refresh instead.")
+            return await self._full_refresh(client)
+        if fetched is None:
+            logger.warning(f"⚠️ Delta zone listing not usable for token {client.token_id}; falling back to a full inventory refresh.")
+            return await self._full_refresh(client)
+        return fetched
+
+    async def _full_refresh(self, client):
+        token = client.token_id
+        started = time.time()
+        fetched = 0
+        watermark = ""
+        async for page, zones, result_info in client.iter_zone_pages():
+            with self.conn:
+                self._save(zones, started, token)
+            fetched += len(zones)
+            watermark = max([watermark] + [z.get('modified_on') or "" for z in zones])
+            logger.info(f"🗂️ Inventory page {page}/{result_info.get('total_pages', '?')} ({fetched} zones, token {token})")
+            if page >= result_info.get('total_pages', 0):
+                break
+        else:
+            # Pagination stopped early (failed page): keep what we have, don't prune or mark complete
+            logger.warning(f"⚠️ Inventory listing incomplete for token {token}; a full refresh will be retried on the next run.")
+            return fetched
+
+        with self.conn:
+            # Rows without a token predate token tracking; a full listing re-tags every live one
+            removed = self.conn.execute(
+                "DELETE FROM zone_inventory WHERE (token = ? OR token IS NULL) AND seen_at < ?", (token, started)
+            ).rowcount
+            self._set_meta(f"inventory_full_at:{token}", str(started))
+            self._set_meta(f"inventory_watermark:{token}", watermark)
+        logger.info(f"🗂️ Full inventory refresh: {fetched} zones ({removed} removed, token {token})")
+        return fetched
+
+    async def _delta_refresh(self, client):
+        """
+        Zones modified since the token's watermark. Returns None (caller does a full refresh) when
+        the listing failed, wasn't newest-first, or the token's zone count no longer matches ours.
+        """
+        token = client.token_id
+        watermark = self._meta(f"inventory_watermark:{token}") or ""
+        now = time.time()
+        fetched = 0
+        newest = watermark
+        previous = None
+        total_count = None
+        async for page, zones, result_info in client.iter_zone_pages(params=DELTA_PARAMS):
+            if total_count is None:
+                total_count = result_info.get('total_count')
+            stamps = [z.get('modified_on') or "" for z in zones]
+            # The whole page must be newest-first (and continue the previous page) to trust the cut-off
+            if stamps != sorted(stamps, reverse=True) or (previous is not None and stamps[0] > previous):
+                return None
+            previous = stamps[-1]
+            changed = [z for z, stamp in zip(zones, stamps) if stamp > watermark]
+            with self.conn:
+                self._save(changed, now, token)
+            fetched += len(changed)
+            newest = max([newest] + stamps[:len(changed)])
+            if len(changed) < len(zones):
+                break
+        if total_count is None:
+            return None
+        if total_count != self._count(token):
+            logger.info(f"🗂️ Token {token} reaches {total_count} zones, inventory has {self._count(token)} (zones removed?)")
+            return None
+        with self.conn:
+            self._set_meta(f"inventory_watermark:{token}", newest)
+        logger.info(f"🗂️ Delta inventory refresh: {fetched} zones changed since {watermark or 'the last full listing'} (token {token})")
+        return fetched
+
+    def zones(self):
+        """Every inventoried zone, by name."""
+        for r in self.conn.execute("SELECT zone_id, name, status, modified_on FROM zone_inventory ORDER BY name"):
+            yield {"id": r[0], "name": r[1], "status": r[2], "modified_on": r[3]}
+
+    def pending_pages(self, shard=None, page_size=50, after=""):
+        """
+        (after, next_after, zones): zones not yet done in the state store, by name, `page_size` at
+        a time. Keyset pagination, so domains finishing mid-run never shift later pages; passing a
+        batch's `after` back in lists from that batch again.
+        """
+        while True:
+            rows = self.conn.execute(
+                "SELECT z.zone_id, z.name, z.status, z.modified_on FROM zone_inventory z "
+                "LEFT JOIN domain_state d ON d.domain = z.name "
+                "WHERE z.name > ? AND COALESCE(d.done, 0) = 0 ORDER BY z.name LIMIT ?",
+                (after, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            zones = [{"id": r[0], "name": r[1], "status": r[2], "modified_on": r[3]} for r in rows]
+            if shard:
+                zones = [z for z in zones if shard.owns(z['id'])]
+            if zones:
+                yield after, rows[-1][1], zones
+            after = rows[-1][1]
+
+    def pending_count(self):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM zone_inventory z LEFT JOIN domain_state d ON d.domain = z.name "
+            "WHERE COALESCE(d.done, 0) = 0"
+        ).fetchone()[0]